@@ -1,12 +1,53 @@
+import asyncio
+import json
+import time
 import openai
 from config import get_settings
 from models.snort import SnortAlert, AlertAnalysis
-from typing import List, Dict, Any
+from ai.cache import analysis_key, get_analysis_cache
+from ai.clustering import AlertCluster, alert_signature, cluster_alerts, signature_digest
+from ai.governor import alert_lane, estimate_tokens, get_governor, request_tokens
+from ai.triage import AnalysisTier, TriagePolicy, summarize_alert
+from typing import List, Dict, Any, Optional
 import logging
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Bump when the prompt changes so cached analyses of the old prompt stop matching
+PROMPT_VERSION = "1"
+
+# Member alert IDs stored with each clustered analysis
+MAX_RELATED_ALERTS = 20
+
+BATCH_INSTRUCTIONS = """
+        You will receive several numbered alerts. Respond with only a JSON array
+        holding one object per alert, in any order:
+        {"id": <alert number>, "analysis": "<analysis>", "recommendations": ["<recommendation>", ...], "confidence_score": <0-1>}"""
+
+def pack_batches(lines: List[str], fixed_tokens: int, token_budget: int,
+                 output_tokens: int, max_alerts: int) -> List[List[int]]:
+    """
+    Split prompt lines into request batches, returned as lists of line indices.
+
+    A batch grows while its prompt (``fixed_tokens`` plus its lines) and the
+    ``output_tokens`` reserved for each answer still fit in ``token_budget``,
+    up to ``max_alerts`` lines. A line too large for any batch goes alone.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = fixed_tokens
+    for index, line in enumerate(lines):
+        cost = estimate_tokens(line) + output_tokens
+        if current and (used + cost > token_budget or len(current) >= max_alerts):
+            batches.append(current)
+            current, used = [], fixed_tokens
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
 class AlertAnalyzer:
     def __init__(self):
         openai.api_key = settings.openai_api_key
@@ -16,56 +57,395 @@ class AlertAnalyzer:
         2. Specific recommendations for addressing the issue
         3. A confidence score (0-1) for your analysis
         4. Any related patterns or context that might be relevant"""
+        self.cache = get_analysis_cache()
+        self.batch_max_alerts = settings.analysis_batch_max_alerts
+        self.batch_token_budget = settings.analysis_batch_token_budget
+        self.batch_output_tokens = settings.analysis_batch_output_tokens
+        self.governor = get_governor()
+        self.triage = TriagePolicy.from_settings(settings)
+        # Clusters being analyzed right now, shared by overlapping batches
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.metrics = {
+            "batches": 0,
+            "alerts": 0,
+            "clusters": 0,
+            "coalesced": 0,
+            "requests": 0,
+            "batch_requests": 0,
+            "alerts_requested": 0,
+            "fallbacks": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        }
 
-    async def analyze_alert(self, alert: SnortAlert) -> AlertAnalysis:
-        """Analyze a Snort alert using OpenAI"""
+    async def analyze_alerts(self, alerts: List[SnortAlert]) -> List[AlertAnalysis]:
+        """
+        Analyze a batch of alerts, one model call per cluster of similar alerts.
+
+        Alerts are grouped by normalized signature (see ``ai.clustering``);
+        only each cluster's representative is analyzed and its analysis is
+        attached to every member. The triage policy picks the tier for each
+        cluster (see ``ai.triage``); representatives routed to a model and not
+        cached are packed into multi-alert requests (see :meth:`_request_batch`).
+        Results are returned in input order.
+        """
+        clusters = cluster_alerts(alerts)
+        self.metrics["batches"] += 1
+        self.metrics["alerts"] += len(alerts)
+        self.metrics["clusters"] += len(clusters)
+
+        results: Dict[str, Any] = {}
+        reasons: Dict[str, str] = {}
+        routed: List[AlertCluster] = []
+        routed_tiers: List[AnalysisTier] = []
+        for cluster in clusters:
+            pending = self._in_flight.get(cluster.digest)
+            if pending is not None:
+                self.metrics["coalesced"] += 1
+                results[cluster.digest] = pending
+                continue
+            tier, reasons[cluster.digest] = self.triage.route(
+                cluster.representative, cluster.digest, len(cluster.members))
+            # Registered before the cache lookup yields, so overlapping batches join it
+            self._in_flight[cluster.digest] = asyncio.get_running_loop().create_future()
+            routed.append(cluster)
+            routed_tiers.append(tier)
+
+        owned: List[AlertCluster] = []
+        tiers: List[AnalysisTier] = []
+        try:
+            local_analyses = await asyncio.gather(*(
+                self._local_analysis(cluster.representative, tier) for cluster, tier in zip(routed, routed_tiers)))
+            for cluster, tier, local in zip(routed, routed_tiers, local_analyses):
+                if local is not None:
+                    self._in_flight.pop(cluster.digest).set_result(local)
+                    results[cluster.digest] = local
+                    continue
+                owned.append(cluster)
+                tiers.append(tier)
+            analyses = await self._analyze_uncached([cluster.representative for cluster in owned], tiers)
+        except BaseException:
+            for cluster in routed:
+                pending = self._in_flight.pop(cluster.digest, None)
+                if pending is not None:
+                    pending.cancel()
+            raise
+        for cluster, analysis in zip(owned, analyses):
+            self._in_flight.pop(cluster.digest).set_result(analysis)
+            results[cluster.digest] = analysis
+
+        by_alert = {}
+        for cluster in clusters:
+            analysis = results[cluster.digest]
+            if isinstance(analysis, asyncio.Future):
+                analysis = await self._join(analysis, cluster.representative)
+            for member in cluster.members:
+                by_alert[id(member)] = self._attach(analysis, cluster, member, reasons.get(cluster.digest))
+        return [by_alert[id(alert)] for alert in alerts]
+
+    async def _join(self, pending: asyncio.Future, alert: SnortAlert) -> AlertAnalysis:
+        """Wait for another batch's analysis of the same cluster; analyze alone if it was abandoned"""
         try:
-            prompt = f"""
-            Alert Details:
-            - Type: {alert.alert_type}
-            - Priority: {alert.priority}
-            - Protocol: {alert.protocol}
-            - Source: {alert.source_ip}:{alert.source_port}
-            - Destination: {alert.destination_ip}:{alert.destination_port}
-            - Message: {alert.message}
-            - Classification: {alert.classification}
-            - Signature ID: {alert.signature_id}
-            - Raw Alert: {alert.raw_alert}
-
-            Please provide a detailed analysis of this alert.
-            """
-
-            response = await openai.ChatCompletion.acreate(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-
-            analysis_text = response.choices[0].message.content
-
-            # Extract recommendations and confidence score from the analysis
-            recommendations = self._extract_recommendations(analysis_text)
-            confidence_score = self._extract_confidence_score(analysis_text)
-
-            return AlertAnalysis(
-                alert=alert,
-                analysis=analysis_text,
-                recommendations=recommendations,
-                confidence_score=confidence_score
-            )
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            return await self.analyze_alert(alert)
+
+    def _attach(self, analysis: AlertAnalysis, cluster: AlertCluster, member: SnortAlert,
+                reason: Optional[str] = None) -> AlertAnalysis:
+        """Copy a cluster's analysis onto one of its members"""
+        related = [alert.alert_id for alert in cluster.members if alert is not member and alert.alert_id]
+        return analysis.copy(update={
+            "alert": member,
+            "related_alerts": related[:MAX_RELATED_ALERTS] or None,
+            "context": {
+                **self._with_reason(analysis, reason),
+                "cluster": {
+                    "signature": cluster.digest,
+                    "size": len(cluster.members),
+                    "representative": cluster.representative.alert_id
+                }
+            }
+        })
+
+    def _with_reason(self, analysis: AlertAnalysis, reason: Optional[str]) -> Dict[str, Any]:
+        """The analysis context with the routing reason added to its triage entry"""
+        context = dict(analysis.context or {})
+        if reason:
+            context["triage"] = {**context.get("triage", {}), "reason": reason}
+        return context
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Batch, clustering, request, cache and triage counters.
+
+        ``reduction`` is alerts per model request and ``tokens_per_alert`` the
+        average tokens spent on each alert sent to the model.
+        """
+        tokens = self.metrics["prompt_tokens"] + self.metrics["completion_tokens"]
+        return {
+            **self.metrics,
+            "cache": self.cache.stats(),
+            "triage": self.triage.stats(),
+            "in_flight": len(self._in_flight),
+            "reduction": self.metrics["alerts"] / self.metrics["requests"] if self.metrics["requests"] else 0.0,
+            "tokens_per_alert": tokens / self.metrics["alerts_requested"] if self.metrics["alerts_requested"] else 0.0
+        }
+
+    async def analyze_alert(self, alert: SnortAlert) -> AlertAnalysis:
+        """Analyze a Snort alert with the tier the triage policy picks, reusing earlier analyses"""
+        tier, reason = self.triage.route(alert, signature_digest(alert_signature(alert)))
+        analysis = await self._local_analysis(alert, tier) or await self._analyze_single(alert, tier)
+        return analysis.copy(update={"context": self._with_reason(analysis, reason)})
+
+    async def escalate(self, alert: SnortAlert) -> AlertAnalysis:
+        """Analyze an alert with the large model, whatever its priority or how often it was seen"""
+        tier, reason = self.triage.escalate()
+        analysis = await self._local_analysis(alert, tier) or await self._analyze_single(alert, tier)
+        return analysis.copy(update={"context": self._with_reason(analysis, reason)})
+
+    def _tier_context(self, tier: AnalysisTier) -> Dict[str, Any]:
+        return {"triage": {"tier": tier.name, "model": tier.model}}
+
+    async def _local_analysis(self, alert: SnortAlert, tier: AnalysisTier) -> Optional[AlertAnalysis]:
+        """Analysis available without a request: the rule-based summary or a cached one"""
+        if tier.model is None:
+            return self._summarize(alert, tier)
+        return await self._from_cache(alert, tier)
+
+    def _summarize(self, alert: SnortAlert, tier: AnalysisTier) -> AlertAnalysis:
+        started = time.perf_counter()
+        analysis, recommendations, confidence_score = summarize_alert(alert)
+        self.triage.record_request(tier, time.perf_counter() - started)
+        return AlertAnalysis(
+            alert=alert,
+            analysis=analysis,
+            recommendations=recommendations,
+            confidence_score=confidence_score,
+            context=self._tier_context(tier)
+        )
+
+    def _cache_key(self, alert: SnortAlert, tier: AnalysisTier) -> str:
+        return analysis_key(alert, "analyzer", tier.model, PROMPT_VERSION)
+
+    async def _from_cache(self, alert: SnortAlert, tier: AnalysisTier) -> Optional[AlertAnalysis]:
+        """Cached analysis by ``tier`` or a stronger tier (a large-model answer serves a small-tier alert)"""
+        for candidate in self.triage.reusable_tiers(tier):
+            cached = await self.cache.aget(self._cache_key(alert, candidate))
+            if cached is not None:
+                self.triage.record_cached(tier)
+                return AlertAnalysis(alert=alert, **cached, context={"cached": True, **self._tier_context(candidate)})
+        return None
 
+    async def _remember(self, analysis: AlertAnalysis, tier: AnalysisTier):
+        await self.cache.aput(self._cache_key(analysis.alert, tier), {
+            "analysis": analysis.analysis,
+            "recommendations": analysis.recommendations,
+            "confidence_score": analysis.confidence_score
+        })
+
+    def _error_analysis(self, alert: SnortAlert, tier: AnalysisTier, error: Exception) -> AlertAnalysis:
+        """Placeholder for a failed analysis; ``context["error"]`` keeps it out of storage"""
+        return AlertAnalysis(
+            alert=alert,
+            analysis="Error analyzing alert",
+            recommendations=["Check system logs for more details"],
+            confidence_score=0.0,
+            context={"error": str(error), **self._tier_context(tier)}
+        )
+
+    async def _analyze_single(self, alert: SnortAlert, tier: AnalysisTier) -> AlertAnalysis:
+        """One request for one alert; failures become an error analysis that is not cached"""
+        try:
+            analysis = await self._request_analysis(alert, tier)
         except Exception as e:
             logger.error(f"Error analyzing alert with OpenAI: {str(e)}")
-            return AlertAnalysis(
-                alert=alert,
-                analysis="Error analyzing alert",
-                recommendations=["Check system logs for more details"],
-                confidence_score=0.0
-            )
+            return self._error_analysis(alert, tier, e)
+        await self._remember(analysis, tier)
+        return analysis
+
+    async def _analyze_uncached(self, alerts: List[SnortAlert], tiers: List[AnalysisTier]) -> List[AlertAnalysis]:
+        """Analyze alerts known to miss the cache, packing each tier's into as few requests as fit"""
+        if not alerts:
+            return []
+        lines = [self._alert_line(alert) for alert in alerts]
+        fixed_tokens = estimate_tokens(self.system_prompt + BATCH_INSTRUCTIONS)
+        batches = []
+        for tier in dict.fromkeys(tiers):
+            positions = [index for index, alert_tier in enumerate(tiers) if alert_tier == tier]
+            for batch in pack_batches([lines[index] for index in positions], fixed_tokens,
+                                      self.batch_token_budget, self.batch_output_tokens, self.batch_max_alerts):
+                batches.append((tier, [positions[index] for index in batch]))
+
+        async def run(tier: AnalysisTier, indices: List[int]) -> List[AlertAnalysis]:
+            if len(indices) == 1:
+                return [await self._analyze_single(alerts[indices[0]], tier)]
+            return await self._analyze_batch([alerts[i] for i in indices], [lines[i] for i in indices], tier)
+
+        results = await asyncio.gather(*(run(tier, indices) for tier, indices in batches))
+        analyses: List[Optional[AlertAnalysis]] = [None] * len(alerts)
+        for (_, indices), batch_results in zip(batches, results):
+            for index, analysis in zip(indices, batch_results):
+                analyses[index] = analysis
+        return analyses
+
+    async def _analyze_batch(self, alerts: List[SnortAlert], lines: List[str],
+                             tier: AnalysisTier) -> List[AlertAnalysis]:
+        """One request for several alerts; alerts missing from the answer are retried alone"""
+        try:
+            items = await self._request_batch(alerts, lines, tier)
+        except Exception as e:
+            logger.error(f"Error analyzing alert batch with OpenAI: {str(e)}")
+            items = {}
+
+        analyses: List[Optional[AlertAnalysis]] = []
+        retry = []
+        for number, alert in enumerate(alerts):
+            analysis = self._batch_item(alert, items.get(number), tier)
+            if analysis is None:
+                retry.append(number)
+            else:
+                await self._remember(analysis, tier)
+            analyses.append(analysis)
+
+        if retry:
+            self.metrics["fallbacks"] += len(retry)
+            singles = await asyncio.gather(*(self._analyze_single(alerts[number], tier) for number in retry))
+            for number, analysis in zip(retry, singles):
+                analyses[number] = analysis
+        return analyses
+
+    def _alert_line(self, alert: SnortAlert) -> str:
+        """Compact one-line description of an alert for batch prompts (the raw line adds nothing)"""
+        return (
+            f"type={alert.alert_type} priority={alert.priority} protocol={alert.protocol} "
+            f"source={alert.source_ip}:{alert.source_port} destination={alert.destination_ip}:{alert.destination_port} "
+            f"classification={alert.classification} signature={alert.signature_id} message={alert.message}"
+        )
+
+    async def _request_batch(self, alerts: List[SnortAlert], lines: List[str],
+                             tier: AnalysisTier) -> Dict[int, Dict[str, Any]]:
+        """Ask OpenAI about several alerts at once; returns the answer items by alert number"""
+        content = await self._complete(
+            [
+                {"role": "system", "content": self.system_prompt + BATCH_INSTRUCTIONS},
+                {"role": "user", "content": "Alerts:\n" + "\n".join(
+                    f"[{number}] {line}" for number, line in enumerate(lines))}
+            ],
+            max_tokens=self.batch_output_tokens * len(alerts),
+            priority=min(alert_lane(alert.priority) for alert in alerts),
+            tier=tier,
+            alerts=len(alerts)
+        )
+        self.metrics["batch_requests"] += 1
+
+        text = content.strip()
+        if text.startswith("```"):
+            # Drop a markdown code fence around the array
+            text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Batch analysis response is not a JSON array")
+        answers = {}
+        for item in items:
+            try:
+                answers[int(item["id"])] = item
+            except (TypeError, KeyError, ValueError):
+                continue
+        return answers
+
+    def _batch_item(self, alert: SnortAlert, item: Optional[Dict[str, Any]],
+                    tier: AnalysisTier) -> Optional[AlertAnalysis]:
+        """Turn one answer item into an analysis, or None if it is unusable"""
+        if not item or not isinstance(item.get("analysis"), str) or not item["analysis"].strip():
+            return None
+        recommendations = item.get("recommendations")
+        if isinstance(recommendations, str):
+            recommendations = [recommendations]
+        if not isinstance(recommendations, list) or not recommendations:
+            recommendations = ["No specific recommendations available"]
+        try:
+            confidence_score = float(item.get("confidence_score", 0.5))
+        except (TypeError, ValueError):
+            confidence_score = 0.5
+        if confidence_score > 1:
+            # Percentages despite the instructions
+            confidence_score /= 100
+        return AlertAnalysis(
+            alert=alert,
+            analysis=item["analysis"],
+            recommendations=[str(recommendation) for recommendation in recommendations],
+            confidence_score=min(max(confidence_score, 0.0), 1.0),
+            context=self._tier_context(tier)
+        )
+
+    async def _complete(self, messages: List[Dict[str, str]], max_tokens: int,
+                        priority: int, tier: AnalysisTier, alerts: int = 1) -> str:
+        """Run one chat completion with the tier's model through the shared rate limit governor"""
+        self.metrics["requests"] += 1
+        self.metrics["alerts_requested"] += alerts
+        timing = {}
+
+        async def call():
+            # Time the request itself, not the wait for admission
+            started = time.perf_counter()
+            try:
+                return await openai.ChatCompletion.acreate(
+                    model=tier.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens
+                )
+            finally:
+                timing["latency"] = time.perf_counter() - started
+
+        response = await self.governor.run(call, tokens=request_tokens(messages, max_tokens), priority=priority)
+        usage = response.get("usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        self.metrics["prompt_tokens"] += prompt_tokens
+        self.metrics["completion_tokens"] += completion_tokens
+        self.triage.record_request(tier, timing["latency"], prompt_tokens, completion_tokens)
+        return response.choices[0].message.content
+
+    async def _request_analysis(self, alert: SnortAlert, tier: AnalysisTier) -> AlertAnalysis:
+        """Ask the tier's model about one alert"""
+        prompt = f"""
+        Alert Details:
+        - Type: {alert.alert_type}
+        - Priority: {alert.priority}
+        - Protocol: {alert.protocol}
+        - Source: {alert.source_ip}:{alert.source_port}
+        - Destination: {alert.destination_ip}:{alert.destination_port}
+        - Message: {alert.message}
+        - Classification: {alert.classification}
+        - Signature ID: {alert.signature_id}
+        - Raw Alert: {alert.raw_alert}
+
+        Please provide a detailed analysis of this alert.
+        """
+
+        analysis_text = await self._complete(
+            [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=tier.max_tokens,
+            priority=alert_lane(alert.priority),
+            tier=tier
+        )
+
+        # Extract recommendations and confidence score from the analysis
+        recommendations = self._extract_recommendations(analysis_text)
+        confidence_score = self._extract_confidence_score(analysis_text)
+
+        return AlertAnalysis(
+            alert=alert,
+            analysis=analysis_text,
+            recommendations=recommendations,
+            confidence_score=confidence_score,
+            context=self._tier_context(tier)
+        )
 
     def _extract_recommendations(self, analysis_text: str) -> List[str]:
         """Extract recommendations from the analysis text"""
@@ -86,4 +466,4 @@ class AlertAnalyzer:
                 return float(score_text)
             return 0.5  # Default confidence score
         except:
-            return 0.5  # Default confidence score if extraction fails 
\ No newline at end of file
+            return 0.5  # Default confidence score if extraction fails
\ No newline at end of file
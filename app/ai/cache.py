@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from ai.clustering import message_template
+from config import get_settings
+from models.snort import SnortAlert
+
+logger = logging.getLogger(__name__)
+
+# Alert types whose message is a question typed by a user (the CLI chat), not
+# a rule message: the addresses and numbers in it are the question
+FREE_TEXT_ALERT_TYPES = frozenset({"GENERAL_QUERY"})
+
+def analysis_key(alert: SnortAlert, namespace: str, model: str, version: str) -> str:
+    """
+    Content address of an analysis request.
+
+    Built from the prompt fields that describe the alert itself; addresses,
+    ports and timestamps are left out (and masked inside the message) so
+    repeats of the same alert from other hosts share one entry. Free-text
+    queries (``FREE_TEXT_ALERT_TYPES``) are keyed on their exact message.
+    ``model`` and the caller's prompt ``version`` are part of the key, so
+    changing either stops old entries from matching.
+    """
+    message = alert.message if alert.alert_type in FREE_TEXT_ALERT_TYPES else message_template(alert.message)
+    fields = (
+        namespace, model, version,
+        alert.alert_type, alert.signature_id, alert.priority,
+        alert.protocol.upper(), alert.classification, message
+    )
+    canonical = json.dumps(fields, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache of analysis results: an in-memory LRU in front of SQLite.
+
+    Values are JSON-serializable dicts. Lookups check memory first, then
+    disk, promoting disk hits into memory. Entries older than ``ttl`` are
+    misses on both tiers. The database is opened on first use; if it cannot
+    be, the cache keeps working from memory only. Coroutines use
+    :meth:`aget` and :meth:`aput`, which run the SQLite tier off the loop.
+
+    Args:
+        path: SQLite file for the persistent tier; empty for memory only
+        ttl: Seconds an analysis is reused
+        max_entries: Entries kept in the memory tier
+    """
+
+    def __init__(self, path: str = "", ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        self.path = os.path.expanduser(path) if path else ""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        # The sync and async analyzers may share one cache across threads;
+        # the memory tier has its own lock so lookups on the event loop never
+        # wait for SQLite I/O running in a worker thread
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "expired": 0,
+            "evictions": 0,
+            "disk_errors": 0
+        }
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None or self._db_failed or not self.path:
+            return self._db
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            # WAL with NORMAL sync: writes do not fsync on every commit
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            db.execute("DELETE FROM analyses WHERE stored_at < ?", (time.time() - self.ttl,))
+            self._db = db
+        except (OSError, sqlite3.Error) as e:
+            self._db_failed = True
+            self._count("disk_errors")
+            logger.error(f"Error opening analysis cache {self.path}, using memory only: {str(e)}")
+        return self._db
+
+    def _persistent(self) -> bool:
+        return bool(self.path) and not self._db_failed
+
+    def _count(self, metric: str):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def _memory_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return entry[1]
+            del self._memory[key]
+            self.metrics["expired"] += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        """Read ``key`` from SQLite and promote it into memory (blocking)"""
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return None
+            try:
+                row = db.execute("SELECT stored_at, value FROM analyses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self._count("disk_errors")
+                logger.error(f"Error reading analysis cache: {str(e)}")
+                return None
+        if row is None:
+            return None
+        if now - row[0] >= self.ttl:
+            self._count("expired")
+            return None
+        value = json.loads(row[1])
+        with self._lock:
+            self._remember(key, row[0], value)
+            self.metrics["disk_hits"] += 1
+        return value
+
+    def _memory_put(self, key: str, now: float, value: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, now, value)
+            self.metrics["stores"] += 1
+
+    def _disk_put(self, key: str, now: float, value: Dict[str, Any]):
+        """Write ``key`` to SQLite (blocking)"""
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO analyses (key, stored_at, value) VALUES (?, ?, ?)",
+                    (key, now, json.dumps(value, default=str))
+                )
+            except sqlite3.Error as e:
+                self._count("disk_errors")
+                logger.error(f"Error writing analysis cache: {str(e)}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached value for ``key``, or None"""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._persistent():
+            value = self._disk_get(key, now)
+        if value is None:
+            self._count("misses")
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store ``value`` in both tiers"""
+        now = time.time()
+        self._memory_put(key, now, value)
+        if self._persistent():
+            self._disk_put(key, now, value)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """:meth:`get` for coroutines: memory is checked on the loop, SQLite in a worker thread"""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._persistent():
+            value = await asyncio.to_thread(self._disk_get, key, now)
+        if value is None:
+            self._count("misses")
+        return value
+
+    async def aput(self, key: str, value: Dict[str, Any]):
+        """:meth:`put` for coroutines: memory is updated on the loop, SQLite in a worker thread"""
+        now = time.time()
+        self._memory_put(key, now, value)
+        if self._persistent():
+            await asyncio.to_thread(self._disk_put, key, now, value)
+
+    def _remember(self, key: str, stored_at: float, value: Dict[str, Any]):
+        """Insert into the memory tier; the caller holds ``_lock``"""
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.metrics["memory_hits"] + self.metrics["disk_hits"]
+        lookups = hits + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "memory_entries": len(self._memory),
+            "persistent": self._db is not None,
+            "hit_ratio": hits / lookups if lookups else 0.0
+        }
+
+@lru_cache()
+def get_analysis_cache() -> AnalysisCache:
+    """Process-wide cache shared by every analyzer"""
+    settings = get_settings()
+    return AnalysisCache(
+        settings.analysis_cache_file,
+        ttl=settings.analysis_cache_ttl,
+        max_entries=settings.analysis_cache_max_entries
+    )
@@ -0,0 +1,75 @@
+import hashlib
+import re
+from typing import Any, Dict, List, NamedTuple, Tuple
+from models.snort import SnortAlert
+
+# Variable parts of alert messages, replaced in this order
+IPV4_PATTERN = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b')
+IPV6_PATTERN = re.compile(r'\b(?:[0-9a-fA-F]{1,4}:){2,7}[0-9a-fA-F]{1,4}\b')
+HEX_PATTERN = re.compile(r'\b0x[0-9a-fA-F]+\b')
+NUMBER_PATTERN = re.compile(r'\d+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def message_template(message: str) -> str:
+    """
+    Reduce an alert message to its template.
+
+    Addresses, hex values and numbers are replaced by placeholders so that
+    ``Portscan from 10.0.0.7 (42 ports)`` and ``Portscan from 10.0.0.9 (17
+    ports)`` share one template.
+    """
+    template = IPV4_PATTERN.sub('<ip>', message)
+    template = IPV6_PATTERN.sub('<ip>', template)
+    template = HEX_PATTERN.sub('<hex>', template)
+    template = NUMBER_PATTERN.sub('<n>', template)
+    return WHITESPACE_PATTERN.sub(' ', template).strip()
+
+def service_port(alert: SnortAlert) -> int:
+    """
+    The port identifying the service, whichever direction the packet went.
+
+    Clients use high ephemeral ports, so the lower of the two ports is the
+    service in both requests and replies. ICMP alerts have no ports (0).
+    """
+    return min(alert.source_port, alert.destination_port)
+
+def alert_signature(alert: SnortAlert) -> Tuple[Any, ...]:
+    """Normalized signature: alerts sharing it get the same analysis"""
+    return (
+        alert.alert_type,
+        message_template(alert.message),
+        alert.classification,
+        alert.protocol.upper(),
+        service_port(alert)
+    )
+
+def signature_digest(signature: Tuple[Any, ...]) -> str:
+    """Short stable identifier for a signature, for logs and stored context"""
+    canonical = "\x1f".join(str(part) for part in signature)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()
+
+class AlertCluster(NamedTuple):
+    """Alerts sharing a signature and the member chosen to be analyzed"""
+    signature: Tuple[Any, ...]
+    representative: SnortAlert
+    members: List[SnortAlert]
+
+    @property
+    def digest(self) -> str:
+        return signature_digest(self.signature)
+
+def cluster_alerts(alerts: List[SnortAlert]) -> List[AlertCluster]:
+    """
+    Group alerts by :func:`alert_signature`, in order of first appearance.
+
+    The representative of each cluster is its most severe member (lowest
+    priority number, alerts without a priority last), the earliest one on
+    ties.
+    """
+    groups: Dict[Tuple[Any, ...], List[SnortAlert]] = {}
+    for alert in alerts:
+        groups.setdefault(alert_signature(alert), []).append(alert)
+    return [
+        AlertCluster(signature, min(members, key=lambda alert: (alert.priority <= 0, alert.priority)), members)
+        for signature, members in groups.items()
+    ]
@@ -0,0 +1,313 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import openai
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Lane for interactive requests (AI assistant, CLI): ahead of every alert lane
+INTERACTIVE_PRIORITY = 0
+# Lane for alerts without a priority (the parser records none as 0)
+UNKNOWN_PRIORITY_LANE = 3
+
+# Errors worth retrying; rate limits also pause every other caller
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain
+)
+
+# Longest the first waiter sleeps while the buckets refill or a pause runs out
+POLL_INTERVAL = 0.25
+
+def alert_lane(priority: int) -> int:
+    """Lane of an alert's requests: its priority, never the interactive lane"""
+    return priority if priority > 0 else UNKNOWN_PRIORITY_LANE
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English and log text (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def request_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Tokens a chat request can consume: its prompt plus the completion it allows"""
+    return sum(estimate_tokens(message["content"]) for message in messages) + max_tokens
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a ``Retry-After`` header on an OpenAI error, if there is one"""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class RateLimitGovernor:
+    """
+    Client-side admission control for OpenAI requests.
+
+    A request is admitted once both token buckets (requests and tokens per
+    minute, refilling continuously) have room for it and fewer than
+    ``max_concurrency`` requests are running. Waiting requests are admitted
+    strictly by priority lane (lower number first), then in arrival order,
+    so priority-1 alerts overtake a backlog of low-priority ones and
+    interactive requests (``INTERACTIVE_PRIORITY``) overtake every alert.
+    Only the first waiter watches the clock; the others sleep until they
+    reach the front of the line, and a freed concurrency slot wakes it. A
+    429 pauses every caller for its ``Retry-After`` (or an exponential
+    backoff) before the request is retried from its original place in line.
+
+    The governor is shared by threads and event loops: :meth:`run` is for
+    coroutines, :meth:`run_sync` for blocking callers.
+
+    Args:
+        requests_per_minute: Request limit of the OpenAI account
+        tokens_per_minute: Token limit of the OpenAI account
+        max_concurrency: Requests running at once
+        max_retries: Retries of a rate-limited or transient failure
+        initial_backoff: First backoff in seconds when no Retry-After is given
+        max_backoff: Longest backoff in seconds
+    """
+
+    def __init__(self, requests_per_minute: int = 500, tokens_per_minute: int = 40000,
+                 max_concurrency: int = 4, max_retries: int = 5,
+                 initial_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._running = 0
+        self._waiting: List[Tuple[int, int]] = []
+        # Wakes the waiter holding a ticket, from any thread
+        self._wakeups: Dict[Tuple[int, int], Callable[[], None]] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "admitted": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failures": 0,
+            "peak_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    def _refill(self, now: float):
+        elapsed = now - self._refilled_at
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._refilled_at = now
+
+    def _enter(self, priority: int, wakeup: Callable[[], None],
+               ticket: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+        ticket = ticket or (priority, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+            self._wakeups[ticket] = wakeup
+            self.metrics["peak_queue_depth"] = max(self.metrics["peak_queue_depth"], len(self._waiting))
+        return ticket
+
+    def _leave(self, ticket: Tuple[int, int]):
+        with self._lock:
+            self._wakeups.pop(ticket, None)
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._wake_first()
+
+    def _wake_first(self):
+        """Wake the waiter first in line; the caller holds ``_lock``"""
+        if self._waiting:
+            self._wakeups[self._waiting[0]]()
+
+    def _try_admit(self, ticket: Tuple[int, int], tokens: int) -> Optional[float]:
+        """
+        Admit ``ticket`` if it is first in line and fits: 0.0 once admitted,
+        otherwise seconds to wait before asking again, or None to wait until
+        woken (behind another waiter, or every concurrency slot taken)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return min(self._paused_until - now, POLL_INTERVAL)
+            if self._waiting[0] != ticket or self._running >= self.max_concurrency:
+                return None
+            # A request larger than the whole bucket waits for a full one
+            tokens = min(tokens, self.tokens_per_minute)
+            deficit = max((1 - self._requests) * 60 / self.requests_per_minute,
+                          (tokens - self._tokens) * 60 / self.tokens_per_minute)
+            if deficit > 0:
+                return min(deficit, POLL_INTERVAL)
+            self._requests -= 1
+            self._tokens -= tokens
+            self._running += 1
+            heapq.heappop(self._waiting)
+            del self._wakeups[ticket]
+            self.metrics["admitted"] += 1
+            self._wake_first()
+            return 0.0
+
+    def _admitted(self, started: float):
+        waited = time.monotonic() - started
+        self.metrics["total_wait_seconds"] += waited
+        self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], waited)
+
+    def _release(self, reserved: int, response: Any = None):
+        """Free the concurrency slot and return tokens reserved but not used"""
+        usage = response.get("usage") if isinstance(response, dict) else None
+        with self._lock:
+            self._running -= 1
+            if usage and "total_tokens" in usage:
+                self._tokens = min(self.tokens_per_minute, self._tokens + reserved - usage["total_tokens"])
+            self._wake_first()
+
+    def pause(self, seconds: float):
+        """Hold every request back for ``seconds``"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: int, priority: int = 3,
+                      ticket: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+        """
+        Wait for admission of a request that may use ``tokens`` tokens.
+
+        Returns the request's ticket; passing it back when retrying the
+        request keeps its original place in line.
+        """
+        loop, woken = asyncio.get_running_loop(), asyncio.Event()
+        ticket = self._enter(priority, lambda: loop.call_soon_threadsafe(woken.set), ticket)
+        started = time.monotonic()
+        try:
+            while True:
+                woken.clear()
+                delay = self._try_admit(ticket, tokens)
+                if delay == 0.0:
+                    break
+                try:
+                    await asyncio.wait_for(woken.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._leave(ticket)
+            raise
+        self._admitted(started)
+        return ticket
+
+    def acquire_sync(self, tokens: int, priority: int = 3,
+                     ticket: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+        """Blocking version of :meth:`acquire`"""
+        woken = threading.Event()
+        ticket, started = self._enter(priority, woken.set, ticket), time.monotonic()
+        try:
+            while True:
+                woken.clear()
+                delay = self._try_admit(ticket, tokens)
+                if delay == 0.0:
+                    break
+                woken.wait(delay)
+        except BaseException:
+            self._leave(ticket)
+            raise
+        self._admitted(started)
+        return ticket
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """Delay before retrying ``error``; rate limits pause everyone for it"""
+        self.metrics["retries"] += 1
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.max_backoff, self.initial_backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if isinstance(error, openai.error.RateLimitError):
+            self.metrics["throttled"] += 1
+            self.pause(delay)
+            return 0.0
+        return delay
+
+    async def run(self, call: Callable[[], Awaitable[Any]], tokens: int, priority: int = 3) -> Any:
+        """
+        Run an OpenAI call under the limits, retrying rate limits and
+        transient errors; a retry keeps the request's place in line
+        """
+        ticket = None
+        for attempt in range(self.max_retries + 1):
+            ticket = await self.acquire(tokens, priority, ticket)
+            try:
+                response = await call()
+            except RETRYABLE_ERRORS as e:
+                self._release(tokens)
+                if attempt == self.max_retries:
+                    self.metrics["failures"] += 1
+                    raise
+                logger.warning(f"OpenAI request failed, retrying: {str(e)}")
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            except BaseException:
+                self._release(tokens)
+                raise
+            self._release(tokens, response)
+            return response
+
+    def run_sync(self, call: Callable[[], Any], tokens: int, priority: int = 3) -> Any:
+        """Blocking version of :meth:`run`"""
+        ticket = None
+        for attempt in range(self.max_retries + 1):
+            ticket = self.acquire_sync(tokens, priority, ticket)
+            try:
+                response = call()
+            except RETRYABLE_ERRORS as e:
+                self._release(tokens)
+                if attempt == self.max_retries:
+                    self.metrics["failures"] += 1
+                    raise
+                logger.warning(f"OpenAI request failed, retrying: {str(e)}")
+                time.sleep(self._backoff(e, attempt))
+                continue
+            except BaseException:
+                self._release(tokens)
+                raise
+            self._release(tokens, response)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Admission counters, queue depth by priority lane and remaining capacity"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            lanes: Dict[int, int] = {}
+            for priority, _ in self._waiting:
+                lanes[priority] = lanes.get(priority, 0) + 1
+            return {
+                **self.metrics,
+                "queue_depth": len(self._waiting),
+                "lanes": lanes,
+                "running": self._running,
+                "available_requests": int(self._requests),
+                "available_tokens": int(self._tokens),
+                "paused_seconds": max(0.0, self._paused_until - now)
+            }
+
+@lru_cache()
+def get_governor() -> RateLimitGovernor:
+    """Process-wide governor shared by every OpenAI caller"""
+    settings = get_settings()
+    return RateLimitGovernor(
+        requests_per_minute=settings.openai_requests_per_minute,
+        tokens_per_minute=settings.openai_tokens_per_minute,
+        max_concurrency=settings.openai_max_concurrency,
+        max_retries=settings.openai_max_retries
+    )
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from models.snort import SnortAlert
+
+class AnalysisTier(NamedTuple):
+    """A way of analyzing alerts: an OpenAI model, or the local summary when ``model`` is None"""
+    name: str
+    model: Optional[str]
+    max_tokens: int
+
+# USD per 1K prompt and completion tokens, for the cost recorded per tier
+MODEL_PRICES = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015)
+}
+
+# Signatures remembered to tell novel alerts from well-known ones
+SIGNATURE_HISTORY_SIZE = 10000
+
+# Recommendations of the rule-based tier, by Snort classification
+CLASSIFICATION_RECOMMENDATIONS = {
+    "Snort Error": [
+        "Check the Snort process logs and configuration around the time of the alert",
+        "Verify that preprocessor memory and stream limits fit the traffic volume"
+    ],
+    "Attempted Information Leak": [
+        "Confirm whether the source is an authorized scanner",
+        "Restrict the exposed service to the networks that need it"
+    ],
+    "Detection of a Network Scan": [
+        "Confirm whether the source is an authorized scanner",
+        "Block or rate-limit the source if the scan is unexpected"
+    ],
+    "Potentially Bad Traffic": [
+        "Review recent traffic between the source and destination",
+        "Tune or suppress the rule if the traffic is known to be benign"
+    ],
+    "Misc activity": [
+        "Tune or suppress the rule if the traffic is known to be benign"
+    ]
+}
+DEFAULT_RECOMMENDATIONS = [
+    "Review the alert against recent activity from the same source",
+    "Escalate the alert for a model analysis if it looks unusual"
+]
+
+def request_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a request; 0 for models without a known price"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+def summarize_alert(alert: SnortAlert) -> Tuple[str, List[str], float]:
+    """Rule-based analysis of a well-known, low-priority alert: text, recommendations and confidence"""
+    classification = alert.classification or "Unclassified"
+    analysis = (
+        f"{alert.message} ({classification}, priority {alert.priority}) "
+        f"from {alert.source_ip}:{alert.source_port} to {alert.destination_ip}:{alert.destination_port} "
+        f"over {alert.protocol}. This low-priority signature has been seen before, so it was "
+        f"summarized by rules without a model; escalate it for a full analysis."
+    )
+    recommendations = CLASSIFICATION_RECOMMENDATIONS.get(alert.classification, DEFAULT_RECOMMENDATIONS)
+    return analysis, list(recommendations), 0.3
+
+class TriagePolicy:
+    """
+    Chooses how each alert is analyzed and accounts for what it costs.
+
+    - ``large`` (the expensive model): alerts with priority at or above
+      ``large_max_priority`` (1 is the most severe), alerts whose signature has
+      not been seen before, and escalations
+    - ``rules`` (local summary, no model): well-known alerts with priority
+      ``rules_min_priority`` or lower
+    - ``small`` (the cheap model): every other well-known alert, including
+      those without a priority (the parser's 0), whose severity is unknown
+
+    Seen signatures are remembered in memory only, up to
+    ``SIGNATURE_HISTORY_SIZE``: each process (or Lambda instance) starts
+    with an empty history, so a signature's first alert after a restart or a
+    cold start is novel again and goes to the large tier. Its analysis is
+    usually still in the analysis cache, which is checked first.
+
+    Args:
+        large_model: Model of the ``large`` tier
+        small_model: Model of the ``small`` tier
+        large_max_priority: Least severe priority always sent to the large model
+        rules_min_priority: Most severe priority summarized by rules once well known
+        large_max_tokens: Completion limit of a single large-tier request
+        small_max_tokens: Completion limit of a single small-tier request
+    """
+
+    def __init__(self, large_model: str = "gpt-4", small_model: str = "gpt-3.5-turbo",
+                 large_max_priority: int = 1, rules_min_priority: int = 3,
+                 large_max_tokens: int = 1000, small_max_tokens: int = 500):
+        self.large = AnalysisTier("large", large_model, large_max_tokens)
+        self.small = AnalysisTier("small", small_model, small_max_tokens)
+        self.rules = AnalysisTier("rules", None, 0)
+        self.large_max_priority = large_max_priority
+        self.rules_min_priority = rules_min_priority
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self.decisions = {"priority": 0, "novel": 0, "known": 0, "escalated": 0}
+        self.tier_metrics = {
+            tier.name: {
+                "clusters": 0,
+                "alerts": 0,
+                "cached": 0,
+                "requests": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+                "latency_seconds": 0.0,
+                "max_latency_seconds": 0.0
+            }
+            for tier in (self.large, self.small, self.rules)
+        }
+
+    @classmethod
+    def from_settings(cls, settings) -> "TriagePolicy":
+        """Build from the application settings"""
+        return cls(
+            large_model=settings.triage_large_model,
+            small_model=settings.triage_small_model,
+            large_max_priority=settings.triage_large_max_priority,
+            rules_min_priority=settings.triage_rules_min_priority
+        )
+
+    def _observe(self, signature: str, count: int) -> bool:
+        """Count sightings of a signature; True if it had not been seen before"""
+        novel = signature not in self._seen
+        self._seen[signature] = self._seen.get(signature, 0) + count
+        self._seen.move_to_end(signature)
+        while len(self._seen) > SIGNATURE_HISTORY_SIZE:
+            self._seen.popitem(last=False)
+        return novel
+
+    def route(self, alert: SnortAlert, signature: str, members: int = 1) -> Tuple[AnalysisTier, str]:
+        """Tier for a cluster of ``members`` alerts represented by ``alert``, and the reason"""
+        novel = self._observe(signature, members)
+        # Priority 0 means the line had none: it says nothing about severity
+        known_priority = alert.priority > 0
+        if known_priority and alert.priority <= self.large_max_priority:
+            tier, reason = self.large, "priority"
+        elif novel:
+            tier, reason = self.large, "novel"
+        elif known_priority and alert.priority >= self.rules_min_priority:
+            tier, reason = self.rules, "known"
+        else:
+            tier, reason = self.small, "known"
+        self._count(tier, reason, members)
+        return tier, reason
+
+    def escalate(self, members: int = 1) -> Tuple[AnalysisTier, str]:
+        """Tier for an on-demand escalation"""
+        self._count(self.large, "escalated", members)
+        return self.large, "escalated"
+
+    def reusable_tiers(self, tier: AnalysisTier) -> List[AnalysisTier]:
+        """Model tiers whose cached analyses can stand in for ``tier``: it and any stronger one, strongest first"""
+        if tier == self.small:
+            return [self.large, self.small]
+        if tier == self.large:
+            return [self.large]
+        return []
+
+    def _count(self, tier: AnalysisTier, reason: str, members: int):
+        self.decisions[reason] += 1
+        self.tier_metrics[tier.name]["clusters"] += 1
+        self.tier_metrics[tier.name]["alerts"] += members
+
+    def record_cached(self, tier: AnalysisTier):
+        self.tier_metrics[tier.name]["cached"] += 1
+
+    def record_request(self, tier: AnalysisTier, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """Account for one model request, or one local summary, of ``tier``"""
+        metrics = self.tier_metrics[tier.name]
+        metrics["requests"] += 1
+        metrics["prompt_tokens"] += prompt_tokens
+        metrics["completion_tokens"] += completion_tokens
+        metrics["cost_usd"] += request_cost(tier.model, prompt_tokens, completion_tokens)
+        metrics["latency_seconds"] += latency
+        metrics["max_latency_seconds"] = max(metrics["max_latency_seconds"], latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing decisions and per-tier volume, cost and latency"""
+        tiers = {}
+        for tier in (self.large, self.small, self.rules):
+            metrics = self.tier_metrics[tier.name]
+            tiers[tier.name] = {
+                **metrics,
+                "model": tier.model,
+                "average_latency_seconds": metrics["latency_seconds"] / metrics["requests"] if metrics["requests"] else 0.0
+            }
+        return {
+            "decisions": dict(self.decisions),
+            "tiers": tiers,
+            "known_signatures": len(self._seen)
+        }
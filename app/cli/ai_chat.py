@@ -4,6 +4,7 @@ from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.prompt import Prompt
 from models.snort import SnortAlert
+from ai.governor import INTERACTIVE_PRIORITY
 from services.ai import analyze_alert
 from datetime import datetime
 
@@ -49,8 +50,8 @@ def chat(model: str):
             # Create an alert object from the query
             alert = create_alert_from_text(query)
             
-            # Get AI analysis
-            analysis = analyze_alert(alert, model)
+            # Get AI analysis, in the interactive lane ahead of queued alerts
+            analysis = analyze_alert(alert, model, priority=INTERACTIVE_PRIORITY)
             
             # Display the response
             console.print("\n[bold blue]AI Response:[/bold blue]")
@@ -33,14 +33,78 @@ if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
 class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # Alert analysis tiers: priority <= TRIAGE_LARGE_MAX_PRIORITY and first-seen alerts go to
+    # the large model; repeats go to the small model, or from TRIAGE_RULES_MIN_PRIORITY down
+    # to a rule-based summary
+    triage_large_model: str = os.getenv("TRIAGE_LARGE_MODEL", "gpt-4")
+    triage_small_model: str = os.getenv("TRIAGE_SMALL_MODEL", "gpt-3.5-turbo")
+    triage_large_max_priority: int = int(os.getenv("TRIAGE_LARGE_MAX_PRIORITY", "1"))
+    triage_rules_min_priority: int = int(os.getenv("TRIAGE_RULES_MIN_PRIORITY", "3"))
+    # Client-side limits shared by every OpenAI call; set them to the account's limits
+    openai_requests_per_minute: int = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+    openai_tokens_per_minute: int = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "40000"))
+    openai_max_concurrency: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+    # Retries of rate-limited (429) and transient failures before giving up
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+    # Alerts packed into one OpenAI request, bounded by the prompt plus the completion
+    # tokens reserved per alert fitting the token budget; 1 disables batching
+    analysis_batch_max_alerts: int = int(os.getenv("ANALYSIS_BATCH_MAX_ALERTS", "20"))
+    analysis_batch_token_budget: int = int(os.getenv("ANALYSIS_BATCH_TOKEN_BUDGET", "7000"))
+    analysis_batch_output_tokens: int = int(os.getenv("ANALYSIS_BATCH_OUTPUT_TOKENS", "300"))
+    # Analyses are reused for repeats of an alert (ignoring addresses and ports) for
+    # ANALYSIS_CACHE_TTL seconds; an empty ANALYSIS_CACHE_FILE keeps them in memory only
+    analysis_cache_file: str = os.getenv("ANALYSIS_CACHE_FILE", "~/.snortai/analysis-cache.sqlite3")
+    analysis_cache_ttl: float = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+    analysis_cache_max_entries: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
     
     # Elasticsearch Configuration
     elasticsearch_url: str = os.getenv("ELASTICSEARCH_URL", "")
     elasticsearch_api_key: str = os.getenv("ELASTICSEARCH_API_KEY", "")
     elasticsearch_index: str = os.getenv("ELASTICSEARCH_INDEX", "snort-alerts")
+    # Alerts go to <index>-YYYY.MM.DD (daily) or <index>-YYYY.MM.DD.HH (hourly) by alert timestamp
+    elasticsearch_index_granularity: str = os.getenv("ELASTICSEARCH_INDEX_GRANULARITY", "daily")
+    # Alert indices older than this are deleted; 0 keeps them forever
+    elasticsearch_retention_days: int = int(os.getenv("ELASTICSEARCH_RETENTION_DAYS", "30"))
+    # search-rich (full-text everything) or ingest-lean (smaller, match-only text)
+    elasticsearch_mapping_profile: str = os.getenv("ELASTICSEARCH_MAPPING_PROFILE", "search-rich")
+    elasticsearch_connections_per_node: int = int(os.getenv("ELASTICSEARCH_CONNECTIONS_PER_NODE", "25"))
+    elasticsearch_max_retries: int = int(os.getenv("ELASTICSEARCH_MAX_RETRIES", "3"))
+    # Per-call timeouts in seconds
+    elasticsearch_request_timeout: float = float(os.getenv("ELASTICSEARCH_REQUEST_TIMEOUT", "10"))
+    elasticsearch_search_timeout: float = float(os.getenv("ELASTICSEARCH_SEARCH_TIMEOUT", "5"))
+    # How long an /api/alerts cursor stays valid between page requests
+    elasticsearch_pit_keep_alive: str = os.getenv("ELASTICSEARCH_PIT_KEEP_ALIVE", "2m")
+    # Largest page /api/alerts will return
+    api_max_page_size: int = int(os.getenv("API_MAX_PAGE_SIZE", "500"))
+    # /api/stats and first /api/alerts pages are cached in-process for API_CACHE_TTL
+    # seconds, and reloaded after new alerts are flushed once older than API_CACHE_MIN_AGE
+    api_cache_ttl: float = float(os.getenv("API_CACHE_TTL", "30"))
+    api_cache_min_age: float = float(os.getenv("API_CACHE_MIN_AGE", "1"))
+    api_cache_max_entries: int = int(os.getenv("API_CACHE_MAX_ENTRIES", "256"))
+    # Live alerts are buffered and flushed with the bulk API at whichever limit is hit first
+    elasticsearch_bulk_max_docs: int = int(os.getenv("ELASTICSEARCH_BULK_MAX_DOCS", "500"))
+    elasticsearch_bulk_max_bytes: int = int(os.getenv("ELASTICSEARCH_BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+    elasticsearch_bulk_max_latency_ms: int = int(os.getenv("ELASTICSEARCH_BULK_MAX_LATENCY_MS", "200"))
+    elasticsearch_bulk_max_retries: int = int(os.getenv("ELASTICSEARCH_BULK_MAX_RETRIES", "3"))
     
     # Snort Configuration
     snort_alert_file: str = os.getenv("SNORT_ALERT_FILE", "/var/log/snort/alert")
+    # Where the alert file tailer persists its (inode, offset) position; empty disables it
+    snort_checkpoint_file: str = os.getenv("SNORT_CHECKPOINT_FILE", "~/.snortai/alert.checkpoint")
+    
+    # Alert Pipeline Configuration
+    pipeline_enabled: bool = os.getenv("PIPELINE_ENABLED", "True").lower() == "true"
+    pipeline_queue_size: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "1000"))
+    pipeline_analysis_workers: int = int(os.getenv("PIPELINE_ANALYSIS_WORKERS", "4"))
+    pipeline_storage_workers: int = int(os.getenv("PIPELINE_STORAGE_WORKERS", "2"))
+    pipeline_broadcast_workers: int = int(os.getenv("PIPELINE_BROADCAST_WORKERS", "1"))
+    # Queued alerts an analysis worker takes at once and clusters before analysis
+    pipeline_analysis_batch_size: int = int(os.getenv("PIPELINE_ANALYSIS_BATCH_SIZE", "100"))
+    # Concurrent alerts when a batch is processed inline (PIPELINE_ENABLED=false)
+    alert_concurrency: int = int(os.getenv("ALERT_CONCURRENCY", "8"))
+    # One of: block, drop_newest, drop_oldest, spill
+    pipeline_overflow_policy: str = os.getenv("PIPELINE_OVERFLOW_POLICY", "block")
+    pipeline_spill_file: str = os.getenv("PIPELINE_SPILL_FILE", "~/.snortai/alert-spill.jsonl")
     
     # Application Configuration
     app_name: str = "SnortAI"
@@ -0,0 +1,532 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from elasticsearch import ApiError, AsyncElasticsearch, ConnectionError as TransportConnectionError, ConnectionTimeout
+
+logger = logging.getLogger(__name__)
+
+# Bulk item statuses worth retrying: throttling and transient node trouble
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# A ``create`` for an ID that already exists: the alert was indexed before
+CONFLICT_STATUS = 409
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def serialize_document(document: Dict[str, Any]) -> bytes:
+    """Serialize a document to a single NDJSON line"""
+    return json.dumps(document, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+def bulk_entry(index_name: str, document: Dict[str, Any], doc_id: Optional[str] = None) -> bytes:
+    """
+    Serialize the action and source lines for one document.
+
+    Documents with an ID (``doc_id`` or their own ``alert_id``) are written
+    with ``create``, so replaying them is a no-op; others fall back to
+    ``index`` with an auto-generated ID.
+    """
+    doc_id = doc_id or document.get("alert_id")
+    if doc_id:
+        action = {"create": {"_index": index_name, "_id": doc_id}}
+    else:
+        action = {"index": {"_index": index_name}}
+    return json.dumps(action, separators=(',', ':')).encode('utf-8') + b"\n" + serialize_document(document)
+
+def index_resolver(index: Union[str, Callable[[Dict[str, Any]], str]]) -> Callable[[Dict[str, Any]], str]:
+    """Accept a fixed index name or a function choosing the index per document"""
+    if callable(index):
+        return index
+    return lambda document: index
+
+def retryable_request_error(error: Exception) -> bool:
+    """True for a whole bulk request failing in a way a resend may fix: throttling, node trouble, the network"""
+    if isinstance(error, ApiError):
+        return error.meta.status in RETRYABLE_STATUSES
+    return isinstance(error, (TransportConnectionError, ConnectionTimeout))
+
+def failed_items(response: Dict[str, Any]) -> List[Tuple[int, int, Any]]:
+    """Return ``(position, status, error)`` for every failed item of a bulk response"""
+    if not response.get("errors"):
+        return []
+    failures = []
+    for position, item in enumerate(response["items"]):
+        result = next(iter(item.values()))
+        if result.get("status", 200) >= 300:
+            failures.append((position, result.get("status"), result.get("error")))
+    return failures
+
+class BulkAlertWriter:
+    """
+    Buffers documents and writes them with the bulk API in the background.
+
+    A flush happens as soon as the buffer holds ``max_docs`` documents or
+    ``max_bytes`` of NDJSON, or ``max_latency`` seconds after the first
+    buffered document, whichever comes first. Items rejected with a retryable
+    status are resent on their own, and whole requests that are throttled,
+    fail on a node or lose the connection are resent, with exponential
+    backoff; conflicts on ``create`` are counted as duplicates and other
+    failures are logged and counted. Documents still failing that way once
+    the retries run out go back to the front of the buffer and the writer
+    backs off before its next flush, so an outage delays documents instead
+    of losing them; only at shutdown are they given up. Callers are only
+    slowed down once four times ``max_docs`` are waiting on a flush. Listeners registered with
+    :meth:`add_flush_listener` are called after every flush that wrote
+    documents, e.g. to invalidate cached query results; those registered with
+    :meth:`add_ack_listener` get the IDs of documents whose outcome is final,
+    e.g. to move a tail checkpoint past them.
+
+    Args:
+        client: Shared async Elasticsearch client
+        index: Index written to, or a function choosing it per document
+        max_docs: Flush threshold in documents
+        max_bytes: Flush threshold in serialized bytes
+        max_latency: Longest a document waits in the buffer, in seconds
+        max_retries: Retries per flush of a rejected item or failed request
+            before it is requeued
+        initial_backoff: First retry delay in seconds, doubled on every retry
+        max_backoff: Upper bound on the retry delay in seconds
+    """
+
+    def __init__(self, client: AsyncElasticsearch, index: Union[str, Callable[[Dict[str, Any]], str]],
+                 max_docs: int = 500, max_bytes: int = 5 * 1024 * 1024, max_latency: float = 0.2,
+                 max_retries: int = 3, initial_backoff: float = 0.1, max_backoff: float = 5.0):
+        self.client = client
+        self.index_for = index_resolver(index)
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._failed_flushes = 0
+
+        self._buffer: List[bytes] = []
+        self._buffer_ids: List[Optional[str]] = []
+        self._buffer_bytes = 0
+        self._first_buffered_at: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._flush_listeners: List[Callable[[int], Any]] = []
+        self._ack_listeners: List[Callable[[List[str]], Any]] = []
+        self.metrics = {
+            "documents_buffered": 0,
+            "documents_written": 0,
+            "documents_failed": 0,
+            "documents_duplicate": 0,
+            "item_retries": 0,
+            "request_retries": 0,
+            "documents_requeued": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "bytes_written": 0,
+            "flush_reasons": {"docs": 0, "bytes": 0, "latency": 0, "shutdown": 0},
+            "last_flush_docs": 0,
+            "last_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def add_flush_listener(self, listener: Callable[[int], Any]):
+        """Call ``listener(written)`` after each flush that wrote at least one document"""
+        self._flush_listeners.append(listener)
+
+    def add_ack_listener(self, listener: Callable[[List[str]], Any]):
+        """
+        Call ``listener(doc_ids)`` after each flush with the IDs it settled.
+
+        A document is settled once it was written, found to exist already, or
+        rejected (on its own or with its whole request) in a way retrying
+        cannot fix. Documents still failing with a retryable error are
+        requeued rather than acknowledged; those given up at shutdown are never
+        acknowledged, so a tail checkpoint stays before them and they are read
+        again after a restart.
+        """
+        self._ack_listeners.append(listener)
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, document: Dict[str, Any], doc_id: Optional[str] = None):
+        """Buffer a document for the next bulk request"""
+        self._ensure_started()
+        while not self._room.is_set():
+            await self._room.wait()
+        doc_id = doc_id or document.get("alert_id")
+        line = bulk_entry(self.index_for(document), document, doc_id)
+        self._buffer.append(line)
+        self._buffer_ids.append(doc_id)
+        self._buffer_bytes += len(line)
+        self.metrics["documents_buffered"] += 1
+        if self._first_buffered_at is None:
+            self._first_buffered_at = time.monotonic()
+            self._wakeup.set()
+        if len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes:
+            self._wakeup.set()
+        if len(self._buffer) >= self.max_docs * 4:
+            self._room.clear()
+
+    def _flush_reason(self) -> Optional[str]:
+        if not self._buffer:
+            return None
+        if len(self._buffer) >= self.max_docs:
+            return "docs"
+        if self._buffer_bytes >= self.max_bytes:
+            return "bytes"
+        if time.monotonic() - self._first_buffered_at >= self.max_latency:
+            return "latency"
+        return None
+
+    async def _run(self):
+        while True:
+            reason = self._flush_reason()
+            if reason is None and self._stopping:
+                if not self._buffer:
+                    return
+                reason = "shutdown"
+            if reason is None:
+                self._wakeup.clear()
+                timeout = None
+                if self._first_buffered_at is not None:
+                    timeout = max(0.0, self._first_buffered_at + self.max_latency - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._flush(reason)
+
+    def _take_batch(self) -> Tuple[List[bytes], List[Optional[str]]]:
+        """Remove up to one flush worth of documents, and their IDs, from the buffer"""
+        count, size = 0, 0
+        for line in self._buffer[:self.max_docs]:
+            if count and size + len(line) > self.max_bytes:
+                break
+            count += 1
+            size += len(line)
+        batch, ids = self._buffer[:count], self._buffer_ids[:count]
+        del self._buffer[:count]
+        del self._buffer_ids[:count]
+        self._buffer_bytes -= size
+        self._first_buffered_at = time.monotonic() if self._buffer else None
+        if len(self._buffer) < self.max_docs * 4:
+            self._room.set()
+        return batch, ids
+
+    def _requeue(self, lines: List[bytes], ids: List[Optional[str]]) -> int:
+        """Put documents that could not be sent back at the front of the buffer; returns those given up"""
+        if self._stopping:
+            logger.error(f"Giving up on {len(lines)} alerts Elasticsearch did not accept before shutdown")
+            return len(lines)
+        self._buffer[:0] = lines
+        self._buffer_ids[:0] = ids
+        self._buffer_bytes += sum(len(line) for line in lines)
+        if self._first_buffered_at is None:
+            self._first_buffered_at = time.monotonic()
+        if len(self._buffer) >= self.max_docs * 4:
+            self._room.clear()
+        self.metrics["documents_requeued"] += len(lines)
+        return 0
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.initial_backoff * 2 ** attempt, self.max_backoff)
+
+    async def _flush(self, reason: str):
+        batch, ids = self._take_batch()
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.metrics["flush_reasons"][reason] += 1
+        written, duplicate, failed, settled, unsent, unsent_ids = await self._send_with_retries(batch, ids)
+        if unsent:
+            failed += self._requeue(unsent, unsent_ids)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.metrics["flushes"] += 1
+        self.metrics["documents_written"] += written
+        self.metrics["documents_duplicate"] += duplicate
+        self.metrics["documents_failed"] += failed
+        self.metrics["bytes_written"] += sum(len(line) for line in batch)
+        self.metrics["last_flush_docs"] = len(batch)
+        self.metrics["last_flush_ms"] = elapsed_ms
+        self.metrics["total_flush_ms"] += elapsed_ms
+        if written:
+            for listener in self._flush_listeners:
+                try:
+                    listener(written)
+                except Exception as e:
+                    logger.error(f"Error in bulk flush listener: {str(e)}")
+        if settled:
+            for listener in self._ack_listeners:
+                try:
+                    listener(settled)
+                except Exception as e:
+                    logger.error(f"Error in bulk ack listener: {str(e)}")
+        if unsent and not self._stopping:
+            # Elasticsearch is struggling: give it longer before each failing flush
+            self._failed_flushes += 1
+            await asyncio.sleep(self._backoff(self.max_retries + self._failed_flushes))
+        elif not unsent:
+            self._failed_flushes = 0
+
+    async def _send_with_retries(self, batch: List[bytes], ids: List[Optional[str]]
+                                 ) -> Tuple[int, int, int, List[str], List[bytes], List[Optional[str]]]:
+        """
+        Send a batch, resending the whole request after a retryable request
+        error and only the retryable item failures otherwise.
+
+        Returns ``(written, duplicate, failed)`` counts, the IDs of settled
+        documents (see :meth:`add_ack_listener`) and the documents and IDs
+        still failing with a retryable error once the retries ran out.
+        """
+        pending, pending_ids = batch, ids
+        written = duplicate = failed = 0
+        settled: List[str] = []
+        for attempt in range(self.max_retries + 1):
+            body = b"\n".join(pending) + b"\n"
+            try:
+                response = await self.client.bulk(operations=body)
+            except Exception as e:
+                self.metrics["flush_errors"] += 1
+                if not retryable_request_error(e):
+                    # Resending the same request would fail the same way
+                    failed += len(pending)
+                    settled.extend(doc_id for doc_id in pending_ids if doc_id)
+                    logger.error(f"Elasticsearch rejected a bulk request of {len(pending)} alerts: {str(e)}")
+                    return written, duplicate, failed, settled, [], []
+                if attempt == self.max_retries:
+                    logger.error(f"Error flushing {len(pending)} alerts to Elasticsearch, requeueing them: {str(e)}")
+                    return written, duplicate, failed, settled, pending, pending_ids
+                self.metrics["request_retries"] += 1
+                logger.warning(f"Bulk request to Elasticsearch failed, retrying: {str(e)}")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            failures = failed_items(response.body)
+            written += len(pending) - len(failures)
+            failed_positions = {position for position, _, _ in failures}
+            settled.extend(doc_id for position, doc_id in enumerate(pending_ids)
+                           if doc_id and position not in failed_positions)
+
+            retry, retry_ids = [], []
+            for position, status, error in failures:
+                doc_id = pending_ids[position]
+                if status in RETRYABLE_STATUSES:
+                    retry.append(pending[position])
+                    retry_ids.append(doc_id)
+                    continue
+                if status == CONFLICT_STATUS:
+                    duplicate += 1
+                else:
+                    failed += 1
+                    logger.error(f"Elasticsearch rejected alert document (status {status}): {error}")
+                # Duplicates and permanent rejections would not change on a retry
+                if doc_id:
+                    settled.append(doc_id)
+            if not retry:
+                break
+            if attempt == self.max_retries:
+                return written, duplicate, failed, settled, retry, retry_ids
+            self.metrics["item_retries"] += len(retry)
+            pending, pending_ids = retry, retry_ids
+            await asyncio.sleep(self._backoff(attempt))
+        return written, duplicate, failed, settled, [], []
+
+    async def stop(self):
+        """Flush remaining documents and stop the background task"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._stopping = False
+
+    def stats(self) -> Dict[str, Any]:
+        flushes = self.metrics["flushes"]
+        return {
+            **self.metrics,
+            "flush_reasons": dict(self.metrics["flush_reasons"]),
+            "buffered": len(self._buffer),
+            "buffered_bytes": self._buffer_bytes,
+            "avg_flush_ms": self.metrics["total_flush_ms"] / flushes if flushes else 0.0,
+            "avg_flush_docs": self.metrics["documents_written"] / flushes if flushes else 0.0
+        }
+
+class AdaptiveBatchSizer:
+    """
+    Sizes bulk requests from observed Elasticsearch response times.
+
+    The batch grows additively while requests come back well under
+    ``target_latency`` and is halved when they run over it or the cluster
+    throttles, settling near the largest size the cluster absorbs comfortably.
+    """
+
+    def __init__(self, initial: int = 500, minimum: int = 50, maximum: int = 5000,
+                 target_latency: float = 1.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.size = max(minimum, min(initial, maximum))
+        self._step = max(1, self.size // 4)
+
+    def record(self, elapsed: float, throttled: bool = False):
+        if throttled or elapsed > self.target_latency:
+            self.size = max(self.minimum, self.size // 2)
+        elif elapsed < self.target_latency / 2:
+            self.size = min(self.maximum, self.size + self._step)
+
+class StreamingBulkIndexer:
+    """
+    Streams documents into Elasticsearch with several bulk requests in flight.
+
+    Documents are pulled lazily from an iterable, so parsing keeps running
+    while earlier batches are being indexed. Batch size adapts to response
+    times through ``AdaptiveBatchSizer``. Items rejected with a retryable
+    status, and whole requests throttled with a 429, are resent with
+    exponential backoff. Documents carrying an ``alert_id`` are created under
+    that ID, so re-indexing a file only counts duplicates; everything else
+    that fails is counted and logged.
+
+    Args:
+        client: Synchronous Elasticsearch client, shared by the sender threads
+        index: Index written to, or a function choosing it per document
+        concurrency: Bulk requests in flight at once
+        sizer: Batch sizing policy
+        max_retries: Retries per rejected item before it is dropped
+        initial_backoff: First retry delay in seconds, doubled on every retry
+        max_backoff: Upper bound on the retry delay in seconds
+    """
+
+    def __init__(self, client, index: Union[str, Callable[[Dict[str, Any]], str]], concurrency: int = 4,
+                 sizer: Optional[AdaptiveBatchSizer] = None, max_retries: int = 5,
+                 initial_backoff: float = 0.5, max_backoff: float = 30.0):
+        self.client = client
+        self.index_for = index_resolver(index)
+        self.concurrency = concurrency
+        self.sizer = sizer or AdaptiveBatchSizer()
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.metrics = {
+            "documents_written": 0,
+            "documents_failed": 0,
+            "documents_duplicate": 0,
+            "item_retries": 0,
+            "throttled_requests": 0,
+            "requests": 0,
+            "elapsed_seconds": 0.0
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.initial_backoff * 2 ** attempt, self.max_backoff)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _send(self, batch: List[bytes]) -> Tuple[int, int, int, float, bool]:
+        """Send one batch from a worker thread; return (written, duplicate, failed, seconds, throttled)"""
+        pending = batch
+        written = duplicate = failed = 0
+        throttled = False
+        first_elapsed = None
+        for attempt in range(self.max_retries + 1):
+            body = b"\n".join(pending) + b"\n"
+            started = time.perf_counter()
+            try:
+                response = self.client.bulk(operations=body)
+            except ApiError as e:
+                if e.meta.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                    raise
+                throttled = True
+                with self._lock:
+                    self.metrics["throttled_requests"] += 1
+                time.sleep(self._backoff(attempt))
+                continue
+            if first_elapsed is None:
+                first_elapsed = time.perf_counter() - started
+            with self._lock:
+                self.metrics["requests"] += 1
+
+            failures = failed_items(response.body)
+            written += len(pending) - len(failures)
+            retry = []
+            for position, status, error in failures:
+                if status == CONFLICT_STATUS:
+                    duplicate += 1
+                elif status in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    retry.append(pending[position])
+                else:
+                    failed += 1
+                    logger.error(f"Elasticsearch rejected alert document (status {status}): {error}")
+            if not retry:
+                break
+            throttled = True
+            with self._lock:
+                self.metrics["item_retries"] += len(retry)
+            pending = retry
+            time.sleep(self._backoff(attempt))
+        return written, duplicate, failed, first_elapsed or 0.0, throttled
+
+    def _batches(self, documents: Iterable[Dict[str, Any]]) -> Iterator[List[bytes]]:
+        iterator = iter(documents)
+        while True:
+            batch = [bulk_entry(self.index_for(document), document)
+                     for document in islice(iterator, self.sizer.size)]
+            if not batch:
+                return
+            yield batch
+
+    def index(self, documents: Iterable[Dict[str, Any]],
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Index every document and return the final stats"""
+        started = time.perf_counter()
+        in_flight = {}
+
+        def complete(done):
+            for future in done:
+                size = in_flight.pop(future)
+                try:
+                    written, duplicate, failed, elapsed, throttled = future.result()
+                    self.sizer.record(elapsed, throttled)
+                except Exception as e:
+                    logger.error(f"Error sending bulk request of {size} alerts: {str(e)}")
+                    self.sizer.record(self.sizer.target_latency * 2, True)
+                    written, duplicate, failed = 0, 0, size
+                with self._lock:
+                    self.metrics["documents_written"] += written
+                    self.metrics["documents_duplicate"] += duplicate
+                    self.metrics["documents_failed"] += failed
+                    self.metrics["elapsed_seconds"] = time.perf_counter() - started
+                if on_progress:
+                    on_progress(self.stats())
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in self._batches(documents):
+                if len(in_flight) >= self.concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    complete(done)
+                in_flight[executor.submit(self._send, batch)] = len(batch)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                complete(done)
+
+        self.metrics["elapsed_seconds"] = time.perf_counter() - started
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = self.metrics["elapsed_seconds"]
+        return {
+            **self.metrics,
+            "batch_size": self.sizer.size,
+            "docs_per_sec": self.metrics["documents_written"] / elapsed if elapsed > 0 else 0.0
+        }
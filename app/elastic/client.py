@@ -1,6 +1,11 @@
-from elasticsearch import Elasticsearch
+import asyncio
+from elasticsearch import AsyncElasticsearch, NotFoundError
 from config import get_settings
-from typing import List, Dict, Any
+from elastic.bulk import BulkAlertWriter
+from elastic.indices import AlertIndices
+from elastic.timeseries import build_timeseries_query, choose_interval, parse_timeseries_response
+from elastic.pagination import InvalidCursorError, PageCursor, decode_cursor, encode_cursor, query_fingerprint
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
 settings = get_settings()
@@ -8,78 +13,229 @@ logger = logging.getLogger(__name__)
 
 class ElasticsearchClient:
     def __init__(self):
-        self.client = Elasticsearch(
+        # One AsyncElasticsearch per process: its connection pool is shared by
+        # every request handler and background task, and nothing blocks the loop
+        self.client = AsyncElasticsearch(
             settings.elasticsearch_url,
-            api_key=settings.elasticsearch_api_key
+            api_key=settings.elasticsearch_api_key,
+            connections_per_node=settings.elasticsearch_connections_per_node,
+            request_timeout=settings.elasticsearch_request_timeout,
+            max_retries=settings.elasticsearch_max_retries,
+            retry_on_timeout=True
         )
         self.index_name = settings.elasticsearch_index
-        self._ensure_index()
-
-    def _ensure_index(self):
-        """Ensure the index exists with proper mappings"""
-        if not self.client.indices.exists(index=self.index_name):
-            mapping = {
-                "mappings": {
-                    "properties": {
-                        "timestamp": {"type": "date"},
-                        "alert_type": {"type": "keyword"},
-                        "priority": {"type": "integer"},
-                        "protocol": {"type": "keyword"},
-                        "source_ip": {"type": "ip"},
-                        "source_port": {"type": "integer"},
-                        "destination_ip": {"type": "ip"},
-                        "destination_port": {"type": "integer"},
-                        "message": {"type": "text"},
-                        "classification": {"type": "keyword"},
-                        "signature_id": {"type": "keyword"},
-                        "raw_alert": {"type": "text"},
-                        "analysis": {"type": "text"},
-                        "recommendations": {"type": "text"},
-                        "confidence_score": {"type": "float"}
-                    }
-                }
-            }
-            self.client.indices.create(index=self.index_name, body=mapping)
+        self.indices = AlertIndices.from_settings(settings)
+        self.bulk_writer = BulkAlertWriter(
+            self.client,
+            self.indices.index_for,
+            max_docs=settings.elasticsearch_bulk_max_docs,
+            max_bytes=settings.elasticsearch_bulk_max_bytes,
+            max_latency=settings.elasticsearch_bulk_max_latency_ms / 1000,
+            max_retries=settings.elasticsearch_bulk_max_retries
+        )
+        self._index_ready = False
+        self._index_lock = asyncio.Lock()
 
-    async def store_alert(self, alert_data: Dict[str, Any]) -> bool:
-        """Store a Snort alert in Elasticsearch"""
+    async def _ensure_index(self):
+        """Install the index template that every daily alert index is created from"""
+        if self._index_ready:
+            return
+        async with self._index_lock:
+            if self._index_ready:
+                return
+            await self.client.indices.put_index_template(**self.indices.template())
+            self._index_ready = True
+
+    async def prune_expired_indices(self) -> List[str]:
+        """Delete alert indices that have aged out of the retention window"""
         try:
-            response = self.client.index(
-                index=self.index_name,
-                document=alert_data
-            )
-            return response["result"] == "created"
+            response = await self.client.indices.get(index=self.indices.pattern, expand_wildcards="open,closed")
+            expired = self.indices.expired(response.body)
+            for index_name in expired:
+                await self.client.indices.delete(index=index_name)
+                logger.info(f"Deleted expired alert index {index_name}")
+            return expired
+        except Exception as e:
+            logger.error(f"Error pruning expired alert indices: {str(e)}")
+            return []
+
+    async def close(self):
+        """Flush buffered alerts and close the pooled connections"""
+        await self.bulk_writer.stop()
+        await self.client.close()
+
+    async def search(self, body: Dict[str, Any], request_timeout: Optional[float] = None,
+                     start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, Any]:
+        """Run a raw search with a per-call timeout
+
+        Only the alert indices overlapping ``start_time``/``end_time`` are
+        searched; without a range every alert index is.
+        """
+        response = await self.client.options(
+            request_timeout=request_timeout or settings.elasticsearch_search_timeout
+        ).search(
+            index=self.indices.search_indices(start_time, end_time),
+            body=body,
+            ignore_unavailable=True,
+            allow_no_indices=True
+        )
+        return response.body
+
+    async def store_alert(self, alert_data: Dict[str, Any], doc_id: Optional[str] = None) -> bool:
+        """Queue a Snort alert for the next bulk write to Elasticsearch
+
+        With a ``doc_id`` the alert is created under that ID, so storing the
+        same alert twice (e.g. after a tailer restart) leaves one document.
+        """
+        try:
+            await self._ensure_index()
+            await self.bulk_writer.add(alert_data, doc_id)
+            return True
         except Exception as e:
             logger.error(f"Error storing alert in Elasticsearch: {str(e)}")
             return False
 
-    async def search_alerts(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Search for alerts based on query"""
+    async def get_alert(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """Find a stored alert by ID in any partition; returns the hit (``_index``, ``_source``) or None"""
+        try:
+            response = await self.search({"query": {"ids": {"values": [alert_id]}}, "size": 1})
+            hits = response["hits"]["hits"]
+            return hits[0] if hits else None
+        except Exception as e:
+            logger.error(f"Error fetching alert from Elasticsearch: {str(e)}")
+            return None
+
+    async def replace_alert(self, index_name: str, alert_id: str, document: Dict[str, Any]) -> bool:
+        """Overwrite a stored alert document in place, e.g. with a new analysis"""
+        try:
+            await self.client.index(index=index_name, id=alert_id, document=document)
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing alert in Elasticsearch: {str(e)}")
+            return False
+
+    async def search_first_alerts(self, query: Dict[str, Any], size: int,
+                                  start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                  source_fields: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Fetch the newest ``size`` alerts without opening a point in time
+
+        Cheap enough to cache and safe to share between clients, since no PIT
+        is tied to it; continue it with :func:`first_page_cursor`. Returns
+        None if Elasticsearch could not be searched.
+        """
+        body = {**query, "size": size, "sort": [{"timestamp": "desc"}], "track_total_hits": False}
+        if source_fields:
+            body["_source"] = source_fields
         try:
-            response = self.client.search(
-                index=self.index_name,
-                body=query
-            )
+            response = await self.search(body, start_time=start_time, end_time=end_time)
             return [hit["_source"] for hit in response["hits"]["hits"]]
         except Exception as e:
             logger.error(f"Error searching alerts in Elasticsearch: {str(e)}")
-            return []
+            return None
+
+    async def search_alerts_page(self, query: Dict[str, Any], size: int, cursor: Optional[str] = None,
+                                 start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                 source_fields: Optional[List[str]] = None
+                                 ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of alerts, newest first, and the cursor for the next page
+
+        The first page opens a point in time over the indices covering the
+        time range; later pages resume from the cursor with ``search_after``,
+        so every page costs the same however deep it is. A cursor from
+        :func:`first_page_cursor` opens its own point in time and skips the
+        first page. The cursor is None once the last page has been returned,
+        and the point in time is then closed. ``source_fields`` limits each
+        returned document to those fields.
+
+        Raises:
+            InvalidCursorError: The cursor is malformed, expired, or belongs to
+                a query with different filters
+        """
+        try:
+            fingerprint = query_fingerprint(query)
+            page = decode_cursor(cursor, query) if cursor else PageCursor("", [], fingerprint)
+            if not page.pit_id:
+                response = await self.client.open_point_in_time(
+                    index=self.indices.search_indices(start_time, end_time),
+                    keep_alive=settings.elasticsearch_pit_keep_alive,
+                    ignore_unavailable=True
+                )
+                page = page._replace(pit_id=response["id"])
+
+            body = {
+                **query,
+                "size": size,
+                # _shard_doc is the cheapest unique tiebreaker within a point in time
+                "sort": [{"timestamp": "desc"}, {"_shard_doc": "asc"}],
+                "pit": {"id": page.pit_id, "keep_alive": settings.elasticsearch_pit_keep_alive},
+                "track_total_hits": False
+            }
+            if page.search_after:
+                body["search_after"] = page.search_after
+            elif page.skip:
+                body["from"] = page.skip
+            if source_fields:
+                body["_source"] = source_fields
+
+            response = await self.client.options(
+                request_timeout=settings.elasticsearch_search_timeout
+            ).search(body=body)
+
+            hits = response["hits"]["hits"]
+            pit_id = response.get("pit_id", page.pit_id)
+            if len(hits) < size:
+                try:
+                    await self.client.close_point_in_time(id=pit_id)
+                except Exception as e:
+                    logger.error(f"Error closing point in time: {str(e)}")
+                return [hit["_source"] for hit in hits], None
+
+            next_cursor = encode_cursor(PageCursor(pit_id, hits[-1]["sort"], fingerprint))
+            return [hit["_source"] for hit in hits], next_cursor
+        except InvalidCursorError:
+            raise
+        except NotFoundError as e:
+            # The point in time behind the cursor has been released
+            raise InvalidCursorError("Cursor has expired") from e
+        except Exception as e:
+            logger.error(f"Error searching alerts in Elasticsearch: {str(e)}")
+            return [], None
+
+    async def get_alert_timeseries(self, query: Dict[str, Any], start_time: Optional[str] = None,
+                                   end_time: Optional[str] = None, interval: Optional[str] = None,
+                                   buckets: int = 60, top_sources: int = 5,
+                                   composite_field: Optional[str] = None, composite_size: int = 100,
+                                   composite_after: Optional[str] = None) -> Dict[str, Any]:
+        """Get time-bucketed alert counts with per-bucket breakdowns in a single search
+
+        Raises:
+            InvalidCursorError: ``composite_after`` is not a cursor from a previous page
+            Exception: Elasticsearch failed; an error is not an empty time series
+        """
+        interval = interval or choose_interval(start_time, end_time, buckets)
+        body = build_timeseries_query(
+            query, start_time, end_time, interval, buckets, top_sources,
+            composite_field, composite_size, composite_after
+        )
+        try:
+            response = await self.search(body, start_time=start_time, end_time=end_time)
+            return parse_timeseries_response(response, interval, composite_field, composite_size)
+        except Exception as e:
+            logger.error(f"Error getting alert timeseries from Elasticsearch: {str(e)}")
+            raise
 
     async def get_alert_stats(self) -> Dict[str, Any]:
         """Get statistics about stored alerts"""
         try:
-            response = self.client.search(
-                index=self.index_name,
-                body={
-                    "size": 0,
-                    "aggs": {
-                        "alert_types": {"terms": {"field": "alert_type"}},
-                        "priority_distribution": {"terms": {"field": "priority"}},
-                        "protocols": {"terms": {"field": "protocol"}}
-                    }
+            response = await self.search({
+                "size": 0,
+                "aggs": {
+                    "alert_types": {"terms": {"field": "alert_type"}},
+                    "priority_distribution": {"terms": {"field": "priority"}},
+                    "protocols": {"terms": {"field": "protocol"}}
                 }
-            )
+            })
             return response["aggregations"]
         except Exception as e:
             logger.error(f"Error getting alert stats from Elasticsearch: {str(e)}")
-            return {} 
\ No newline at end of file
+            return {}
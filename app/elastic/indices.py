@@ -0,0 +1,232 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Fields of a parsed Snort alert, shared by the bulk indexer and the live path
+ALERT_PROPERTIES = {
+    "timestamp": {"type": "date"},
+    "alert_type": {"type": "keyword"},
+    "priority": {"type": "integer"},
+    "protocol": {"type": "keyword"},
+    "source_ip": {"type": "ip"},
+    "source_port": {"type": "integer"},
+    "destination_ip": {"type": "ip"},
+    "destination_port": {"type": "integer"},
+    "message": {"type": "text"},
+    "classification": {"type": "keyword"},
+    "signature_id": {"type": "keyword"},
+    "raw_alert": {"type": "text"},
+    "alert_id": {"type": "keyword"}
+}
+
+# Same fields, trimmed to what the API actually queries: free text is only
+# matched (never phrase-queried or scored by length), so it drops positions
+# and norms; ports and IDs are filtered on but never sorted or aggregated
+LEAN_ALERT_PROPERTIES = {
+    **ALERT_PROPERTIES,
+    "source_port": {"type": "integer", "doc_values": False},
+    "destination_port": {"type": "integer", "doc_values": False},
+    "message": {"type": "match_only_text"},
+    "raw_alert": {"type": "match_only_text"},
+    "alert_id": {"type": "keyword", "doc_values": False}
+}
+
+# Live documents are AlertAnalysis dicts: the alert nested under "alert" plus
+# the analysis fields; bulk-indexed documents are flat alerts
+MAPPING_PROFILES = {
+    "search-rich": {
+        "mappings": {
+            "properties": {
+                **ALERT_PROPERTIES,
+                "alert": {"properties": ALERT_PROPERTIES},
+                "analysis": {"type": "text"},
+                "recommendations": {"type": "text"},
+                "confidence_score": {"type": "float"}
+            }
+        },
+        "settings": {"refresh_interval": "1s"}
+    },
+    "ingest-lean": {
+        "mappings": {
+            # Unmapped fields (related_alerts, context) stay in _source unindexed
+            "dynamic": False,
+            "properties": {
+                **LEAN_ALERT_PROPERTIES,
+                "alert": {"properties": LEAN_ALERT_PROPERTIES},
+                "analysis": {"type": "match_only_text"},
+                "recommendations": {"type": "match_only_text"},
+                "confidence_score": {"type": "half_float"}
+            }
+        },
+        "settings": {"refresh_interval": "30s", "index.codec": "best_compression"}
+    }
+}
+
+GRANULARITIES = {
+    "daily": ("%Y.%m.%d", timedelta(days=1)),
+    "hourly": ("%Y.%m.%d.%H", timedelta(hours=1))
+}
+
+# Beyond this many concrete indices a query targets whole months by wildcard
+MAX_QUERY_INDICES = 62
+
+def to_utc(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """
+    Parse an ISO timestamp into a naive UTC datetime.
+
+    Naive values are taken to be UTC already, as Elasticsearch does. Returns
+    None for anything that is not an ISO date, such as date math (``now-1d``).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class AlertIndices:
+    """
+    Names, template and retention for time-partitioned alert indices.
+
+    Alerts are written to ``<prefix>-YYYY.MM.DD`` (or ``...DD.HH`` when
+    hourly) chosen by the alert's own timestamp, so a replayed alert always
+    lands in the index that already holds it and its ``create`` is a no-op.
+    Every partition picks up its mappings and settings from one index
+    template, built from the selected entry of ``MAPPING_PROFILES``. The
+    unpartitioned ``<prefix>`` index written by earlier versions, if any, is
+    still searched.
+
+    Args:
+        prefix: Base index name
+        granularity: ``daily`` or ``hourly``
+        retention_days: Partitions older than this are reported by :meth:`expired`
+            for deletion; 0 keeps everything
+        profile: Mapping profile name, ``search-rich`` or ``ingest-lean``
+    """
+
+    def __init__(self, prefix: str, granularity: str = "daily", retention_days: int = 30,
+                 profile: str = "search-rich"):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown index granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+        if profile not in MAPPING_PROFILES:
+            raise ValueError(f"Unknown mapping profile {profile!r}; expected one of {', '.join(MAPPING_PROFILES)}")
+        self.prefix = prefix
+        self.granularity = granularity
+        self.retention_days = retention_days
+        self.profile = profile
+        self._format, self._step = GRANULARITIES[granularity]
+
+    @classmethod
+    def from_settings(cls, settings) -> "AlertIndices":
+        """Build from the application settings"""
+        return cls(
+            settings.elasticsearch_index,
+            granularity=settings.elasticsearch_index_granularity,
+            retention_days=settings.elasticsearch_retention_days,
+            profile=settings.elasticsearch_mapping_profile
+        )
+
+    @property
+    def pattern(self) -> str:
+        """Wildcard matching every partition"""
+        return f"{self.prefix}-*"
+
+    @property
+    def refresh_interval(self) -> str:
+        """Refresh interval partitions run with outside of bulk loads"""
+        return MAPPING_PROFILES[self.profile]["settings"]["refresh_interval"]
+
+    def aggregatable(self, field: str) -> bool:
+        """Whether the profile maps ``field`` with doc values, as sorting and aggregating need"""
+        mapping = MAPPING_PROFILES[self.profile]["mappings"]["properties"].get(field)
+        return (mapping is not None and mapping.get("doc_values", True)
+                and mapping["type"] not in ("text", "match_only_text"))
+
+    def template(self) -> Dict[str, Any]:
+        """Keyword arguments for ``indices.put_index_template``"""
+        return {
+            "name": self.prefix,
+            "index_patterns": [self.pattern],
+            "priority": 200,
+            "template": MAPPING_PROFILES[self.profile]
+        }
+
+    def index_name(self, timestamp: Optional[datetime] = None) -> str:
+        """Partition holding alerts from ``timestamp`` (default: now, UTC)"""
+        timestamp = to_utc(timestamp) or datetime.utcnow()
+        return f"{self.prefix}-{timestamp.strftime(self._format)}"
+
+    def index_for(self, document: Dict[str, Any]) -> str:
+        """Partition for a flat alert document or a nested AlertAnalysis document"""
+        timestamp = document.get("timestamp")
+        if timestamp is None and isinstance(document.get("alert"), dict):
+            timestamp = document["alert"].get("timestamp")
+        return self.index_name(to_utc(timestamp))
+
+    def _truncate(self, timestamp: datetime) -> datetime:
+        if self.granularity == "hourly":
+            return timestamp.replace(minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def search_indices(self, start_time: Union[str, datetime, None] = None,
+                       end_time: Union[str, datetime, None] = None) -> str:
+        """
+        Comma-separated index expression covering ``[start_time, end_time]``.
+
+        Only bounded ranges can be narrowed: a missing or unparseable start
+        targets every partition, and a missing end runs up to now plus a day of
+        clock skew. Search with ``ignore_unavailable`` so that partitions with
+        no alerts are skipped.
+        """
+        start = to_utc(start_time)
+        end = to_utc(end_time) if end_time else datetime.utcnow() + timedelta(days=1)
+        if end is not None and isinstance(end_time, str) and "T" not in end_time:
+            # A date-only upper bound includes that whole day
+            end += timedelta(days=1, milliseconds=-1)
+        if start is None or end is None:
+            return f"{self.pattern},{self.prefix}"
+        if end < start:
+            return self.prefix
+
+        names = []
+        current = self._truncate(start)
+        while current <= end:
+            names.append(self.index_name(current))
+            if len(names) > MAX_QUERY_INDICES:
+                break
+            current += self._step
+
+        if len(names) > MAX_QUERY_INDICES:
+            names, month = [], datetime(start.year, start.month, 1)
+            while month <= end:
+                names.append(f"{self.prefix}-{month.strftime('%Y.%m')}.*")
+                month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+        return ",".join(names + [self.prefix])
+
+    def partition_period(self, index_name: str) -> Optional[Tuple[datetime, timedelta]]:
+        """Start and length of the period an index covers, or None if it is not a partition"""
+        if not index_name.startswith(f"{self.prefix}-"):
+            return None
+        suffix = index_name[len(self.prefix) + 1:]
+        for date_format, step in GRANULARITIES.values():
+            try:
+                return datetime.strptime(suffix, date_format), step
+            except ValueError:
+                continue
+        return None
+
+    def expired(self, index_names: Iterable[str], now: Optional[datetime] = None) -> List[str]:
+        """Partitions entirely older than the retention window"""
+        if self.retention_days <= 0:
+            return []
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        expired = []
+        for name in index_names:
+            period = self.partition_period(name)
+            if period is not None and period[0] + period[1] <= cutoff:
+                expired.append(name)
+        return sorted(expired)
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, NamedTuple
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that is malformed, expired or used with other filters"""
+
+class PageCursor(NamedTuple):
+    """
+    Position in a point-in-time search: the PIT, the last sort values and the query they belong to.
+
+    A cursor without a PIT continues a first page that was searched without
+    one (and possibly cached): the next page opens its own PIT and skips the
+    ``skip`` alerts already returned.
+    """
+    pit_id: str
+    search_after: List[Any]
+    fingerprint: str
+    skip: int = 0
+
+def query_fingerprint(query: Dict[str, Any]) -> str:
+    """Short digest tying a cursor to the filters it was issued for"""
+    canonical = json.dumps(query, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()
+
+def encode_cursor(cursor: PageCursor) -> str:
+    """Serialize a cursor into an opaque URL-safe token"""
+    fields = {"p": cursor.pit_id, "a": cursor.search_after, "q": cursor.fingerprint}
+    if cursor.skip:
+        fields["s"] = cursor.skip
+    payload = json.dumps(fields, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def first_page_cursor(query: Dict[str, Any], returned: int) -> str:
+    """Cursor continuing a first page of ``returned`` alerts searched without a point in time"""
+    return encode_cursor(PageCursor("", [], query_fingerprint(query), returned))
+
+def decode_cursor(token: str, query: Dict[str, Any]) -> PageCursor:
+    """Parse a token from :func:`encode_cursor` and check it matches ``query``"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        cursor = PageCursor(str(payload["p"]), list(payload["a"]), str(payload["q"]), int(payload.get("s", 0)))
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    if cursor.fingerprint != query_fingerprint(query):
+        raise InvalidCursorError("Cursor was issued for different filters")
+    return cursor
@@ -0,0 +1,35 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# Field names accepted by the fields= projection, including dotted and wildcard paths
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.*]+$')
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated fields= parameter into _source includes"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not FIELD_NAME_PATTERN.match(name)]
+    if invalid:
+        raise ValueError(f"Invalid field names: {', '.join(invalid)}")
+    return names or None
+
+def field_value(document: Dict[str, Any], path: str) -> Any:
+    """Look up a dotted path such as ``alert.timestamp`` in a document"""
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def to_rows(documents: List[Dict[str, Any]], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Compact response: column names once, then one value array per document"""
+    if fields and not any("*" in name for name in fields):
+        columns = fields
+    else:
+        columns = list(dict.fromkeys(key for document in documents for key in document))
+    return {
+        "columns": columns,
+        "rows": [[field_value(document, column) for column in columns] for document in documents]
+    }
@@ -0,0 +1,173 @@
+import base64
+import json
+import re
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from elastic.indices import to_utc
+from elastic.pagination import InvalidCursorError
+
+# Candidate fixed intervals, smallest first; the first one giving at most the
+# requested number of buckets is used
+INTERVALS = [
+    ("1s", timedelta(seconds=1)),
+    ("5s", timedelta(seconds=5)),
+    ("10s", timedelta(seconds=10)),
+    ("30s", timedelta(seconds=30)),
+    ("1m", timedelta(minutes=1)),
+    ("5m", timedelta(minutes=5)),
+    ("10m", timedelta(minutes=10)),
+    ("30m", timedelta(minutes=30)),
+    ("1h", timedelta(hours=1)),
+    ("3h", timedelta(hours=3)),
+    ("6h", timedelta(hours=6)),
+    ("12h", timedelta(hours=12)),
+    ("1d", timedelta(days=1)),
+    ("7d", timedelta(days=7)),
+    ("30d", timedelta(days=30))
+]
+
+# Breakdowns computed inside every time bucket and over the whole range
+BREAKDOWN_FIELDS = {
+    "alert_type": 10,
+    "priority": 10,
+    "protocol": 10
+}
+
+# Fields that may be paged through with a composite aggregation, where the
+# mapping profile keeps their doc values (see AlertIndices.aggregatable)
+COMPOSITE_FIELDS = (
+    "alert_type", "classification", "destination_ip", "destination_port",
+    "priority", "protocol", "signature_id", "source_ip", "source_port"
+)
+
+# Largest number of time buckets a single request may produce
+MAX_BUCKETS = 1000
+
+INTERVAL_PATTERN = re.compile(r'^(\d+)(s|m|h|d)$')
+INTERVAL_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+def interval_length(interval: str) -> Optional[timedelta]:
+    """Length of a fixed interval such as ``15m``, or None if it is not one"""
+    match = INTERVAL_PATTERN.match(interval)
+    if not match or int(match.group(1)) == 0:
+        return None
+    return timedelta(**{INTERVAL_UNITS[match.group(2)]: int(match.group(1))})
+
+def bucket_count(start_time: Optional[str], end_time: Optional[str], interval: str) -> Optional[int]:
+    """Number of buckets ``interval`` splits a bounded range into, if the range is bounded"""
+    start, end = to_utc(start_time), to_utc(end_time)
+    length = interval_length(interval)
+    if start is None or end is None or length is None:
+        return None
+    return int((end - start) / length) + 1
+
+def choose_interval(start_time: Optional[str], end_time: Optional[str], buckets: int) -> Optional[str]:
+    """Smallest fixed interval splitting a bounded range into at most ``buckets`` buckets"""
+    start, end = to_utc(start_time), to_utc(end_time)
+    if start is None or end is None or end <= start:
+        return None
+    span = end - start
+    for name, length in INTERVALS:
+        if span / length <= buckets:
+            return name
+    return INTERVALS[-1][0]
+
+def _breakdowns(top_sources: int) -> Dict[str, Any]:
+    aggs = {field: {"terms": {"field": field, "size": size}} for field, size in BREAKDOWN_FIELDS.items()}
+    aggs["top_source_ips"] = {"terms": {"field": "source_ip", "size": top_sources}}
+    return aggs
+
+def encode_after_key(after_key: Dict[str, Any]) -> str:
+    payload = json.dumps(after_key, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_after_key(token: str) -> Dict[str, Any]:
+    try:
+        after_key = json.loads(base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode('ascii')))
+    except ValueError as e:
+        raise InvalidCursorError("Malformed composite cursor") from e
+    if not isinstance(after_key, dict):
+        raise InvalidCursorError("Malformed composite cursor")
+    return after_key
+
+def build_timeseries_query(query: Dict[str, Any], start_time: Optional[str] = None,
+                           end_time: Optional[str] = None, interval: Optional[str] = None,
+                           buckets: int = 60, top_sources: int = 5,
+                           composite_field: Optional[str] = None, composite_size: int = 100,
+                           composite_after: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build one search body returning the whole timeseries.
+
+    With an explicit ``interval``, or a bounded range from which one can be
+    chosen, buckets come from a fixed-interval ``date_histogram`` extended
+    over the full range so empty periods show as zero. Otherwise
+    ``auto_date_histogram`` picks the interval from the data.
+    """
+    interval = interval or choose_interval(start_time, end_time, buckets)
+    sub_aggs = _breakdowns(top_sources)
+    if interval:
+        histogram = {
+            "date_histogram": {"field": "timestamp", "fixed_interval": interval, "min_doc_count": 0},
+            "aggs": sub_aggs
+        }
+        if start_time and end_time and to_utc(start_time) and to_utc(end_time):
+            histogram["date_histogram"]["extended_bounds"] = {"min": start_time, "max": end_time}
+    else:
+        histogram = {
+            "auto_date_histogram": {"field": "timestamp", "buckets": buckets},
+            "aggs": sub_aggs
+        }
+
+    aggs = {"timeline": histogram, **_breakdowns(top_sources)}
+    if composite_field:
+        composite = {"size": composite_size, "sources": [{composite_field: {"terms": {"field": composite_field}}}]}
+        if composite_after:
+            composite["after"] = decode_after_key(composite_after)
+        aggs["composite"] = {"composite": composite}
+
+    return {**query, "size": 0, "track_total_hits": True, "aggs": aggs}
+
+def _counts(aggregation: Dict[str, Any]) -> Dict[str, int]:
+    return {str(bucket["key"]): bucket["doc_count"] for bucket in aggregation["buckets"]}
+
+def _summary(aggregations: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {field: _counts(aggregations[field]) for field in BREAKDOWN_FIELDS}
+    summary["top_source_ips"] = [
+        {"ip": bucket["key"], "count": bucket["doc_count"]}
+        for bucket in aggregations["top_source_ips"]["buckets"]
+    ]
+    return summary
+
+def parse_timeseries_response(response: Dict[str, Any], interval: Optional[str] = None,
+                              composite_field: Optional[str] = None,
+                              composite_size: int = 100) -> Dict[str, Any]:
+    """Flatten the aggregation response into chart-ready buckets"""
+    aggregations = response.get("aggregations", {})
+    timeline = aggregations.get("timeline", {"buckets": []})
+    result = {
+        # auto_date_histogram reports the interval it settled on
+        "interval": interval or timeline.get("interval"),
+        "total": response["hits"]["total"]["value"],
+        "buckets": [
+            {
+                "timestamp": bucket.get("key_as_string", bucket["key"]),
+                "count": bucket["doc_count"],
+                **_summary(bucket)
+            }
+            for bucket in timeline["buckets"]
+        ],
+        "totals": _summary(aggregations) if aggregations else {}
+    }
+    if composite_field:
+        composite = aggregations["composite"]
+        after_key = composite.get("after_key")
+        result["composite"] = {
+            "field": composite_field,
+            "buckets": [
+                {"key": bucket["key"][composite_field], "count": bucket["doc_count"]}
+                for bucket in composite["buckets"]
+            ],
+            # A short page means there is nothing after it
+            "after": encode_after_key(after_key) if after_key and len(composite["buckets"]) >= composite_size else None
+        }
+    return result
@@ -1,22 +1,29 @@
 # Force redeploy
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Body
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Body, HTTPException, Query, Response
 from fastapi.requests import Request
 import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import os
 import requests
 
 from mangum import Mangum
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from config import get_settings
 from snort.processor import SnortAlertProcessor
 from elastic.client import ElasticsearchClient
+from elastic.pagination import InvalidCursorError, first_page_cursor
+from elastic.projection import parse_fields, to_rows
+from elastic.timeseries import COMPOSITE_FIELDS, MAX_BUCKETS, bucket_count, interval_length
 from ai.analyzer import AlertAnalyzer
+from ai.governor import INTERACTIVE_PRIORITY, get_governor, request_tokens
+from services.pipeline import AlertPipeline
+from services.fanout import ConcurrentFanOut
+from services.cache import QueryCache, make_key
 from models.snort import SnortAlert, AlertAnalysis
-from elasticsearch import Elasticsearch
 import openai
 
 # Setup logging
@@ -33,8 +40,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Alert pages are repetitive JSON and compress several-fold
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 settings = get_settings()
 
 handler = Mangum(app)
@@ -42,6 +53,15 @@ handler = Mangum(app)
 # Initialize components
 snort_processor = SnortAlertProcessor()
 elastic_client = ElasticsearchClient()
+query_cache = QueryCache(
+    max_entries=settings.api_cache_max_entries,
+    ttl=settings.api_cache_ttl,
+    min_age=settings.api_cache_min_age
+)
+# Newly stored alerts make cached pages and stats stale
+elastic_client.bulk_writer.add_flush_listener(query_cache.invalidate)
+# The tail checkpoint only moves past alerts once they are stored
+elastic_client.bulk_writer.add_ack_listener(snort_processor.release_alerts)
 alert_analyzer = AlertAnalyzer()
 
 # WebSocket connection manager
@@ -61,6 +81,7 @@ class ConnectionManager:
             await connection.send_text(message)
 
 manager = ConnectionManager()
+alert_fan_out = ConcurrentFanOut(concurrency=settings.alert_concurrency)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -72,40 +93,100 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+async def store_analysis(analysis: AlertAnalysis):
+    if analysis.context and analysis.context.get("error"):
+        # Keep the alert itself, not the placeholder left by a failed analysis
+        await elastic_client.store_alert(analysis.alert.dict(), doc_id=analysis.alert.alert_id)
+        return
+    await elastic_client.store_alert(analysis.dict(), doc_id=analysis.alert.alert_id)
+
+async def broadcast_analysis(analysis: AlertAnalysis):
+    await manager.broadcast(analysis.json())
+
 async def process_new_alerts(alerts: List[SnortAlert]):
-    """Process new alerts and broadcast them to connected clients"""
-    for alert in alerts:
-        # Analyze the alert
-        analysis = await alert_analyzer.analyze_alert(alert)
-        
-        # Store in Elasticsearch
-        await elastic_client.store_alert(analysis.dict())
-        
-        # Broadcast to WebSocket clients
-        await manager.broadcast(json.dumps(analysis.dict()))
+    """Process new alerts and broadcast them to connected clients
+
+    The batch is analyzed at once, one model call per cluster of similar
+    alerts. Storing and broadcasting then run concurrently up to
+    ``settings.alert_concurrency``; alerts belonging to the same flow keep
+    their original order.
+    """
+    analyses = dict(zip(map(id, alerts), await alert_analyzer.analyze_alerts(alerts)))
+
+    async def deliver(alert: SnortAlert):
+        analysis = analyses[id(alert)]
+        await store_analysis(analysis)
+        await broadcast_analysis(analysis)
+
+    await alert_fan_out.run(alerts, deliver)
+
+def release_alerts(alerts: List[SnortAlert]):
+    """Let the tail checkpoint move past alerts the pipeline dropped, spilled or failed to analyze"""
+    snort_processor.release_alerts([alert.alert_id for alert in alerts])
+
+alert_pipeline = AlertPipeline(
+    analyze=alert_analyzer.analyze_alert,
+    analyze_batch=alert_analyzer.analyze_alerts,
+    analysis_batch_size=settings.pipeline_analysis_batch_size,
+    store=store_analysis,
+    broadcast=broadcast_analysis,
+    queue_size=settings.pipeline_queue_size,
+    analysis_workers=settings.pipeline_analysis_workers,
+    storage_workers=settings.pipeline_storage_workers,
+    broadcast_workers=settings.pipeline_broadcast_workers,
+    overflow_policy=settings.pipeline_overflow_policy,
+    spill_file=settings.pipeline_spill_file,
+    release=release_alerts
+)
+
+async def enforce_retention():
+    """Delete expired alert indices now and then every hour"""
+    while True:
+        await elastic_client.prune_expired_indices()
+        await asyncio.sleep(3600)
 
 @app.on_event("startup")
 async def startup_event():
     """Start monitoring Snort alerts when the application starts"""
     if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        if settings.elasticsearch_retention_days > 0:
+            asyncio.create_task(enforce_retention())
         # Only monitor the alert file when running locally
-        asyncio.create_task(snort_processor.monitor_alert_file(process_new_alerts))
+        if settings.pipeline_enabled:
+            await alert_pipeline.start()
+            asyncio.create_task(snort_processor.monitor_alert_file(alert_pipeline.submit, hold_until_released=True))
+        else:
+            asyncio.create_task(snort_processor.monitor_alert_file(process_new_alerts, hold_until_released=True))
 
-@app.get("/api/alerts")
-async def get_alerts(
-    start_time: str = None,
-    end_time: str = None,
-    alert_type: str = None,
-    priority: int = None
-) -> List[Dict[str, Any]]:
-    """Get alerts from Elasticsearch with optional filters"""
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let queued alerts finish processing before the application exits"""
+    if alert_pipeline.alert_queue is not None:
+        await alert_pipeline.stop()
+    await elastic_client.close()
+
+@app.get("/api/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """Get internal processing metrics"""
+    return {
+        "pipeline": alert_pipeline.stats(),
+        "tail": {"held_alerts": snort_processor.tailer.held if snort_processor.tailer else 0},
+        "analyzer": alert_analyzer.stats(),
+        "openai_governor": get_governor().stats(),
+        "fan_out": alert_fan_out.stats(),
+        "bulk_writer": elastic_client.bulk_writer.stats(),
+        "query_cache": query_cache.stats()
+    }
+
+def alert_filter_query(start_time: str = None, end_time: str = None,
+                       alert_type: str = None, priority: int = None) -> Dict[str, Any]:
+    """Build the bool query shared by the alert listing and statistics endpoints"""
     query = {
         "query": {
             "bool": {
                 "must": []
             }
-        },
-        "sort": [{"timestamp": "desc"}]
+        }
     }
 
     if start_time:
@@ -116,13 +197,149 @@ async def get_alerts(
         query["query"]["bool"]["must"].append({"term": {"alert_type": alert_type}})
     if priority:
         query["query"]["bool"]["must"].append({"term": {"priority": priority}})
+    return query
 
-    return await elastic_client.search_alerts(query)
+@app.get("/api/alerts")
+async def get_alerts(
+    response: Response,
+    start_time: str = None,
+    end_time: str = None,
+    alert_type: str = None,
+    priority: int = None,
+    size: int = Query(10, ge=1),
+    cursor: str = None,
+    fields: str = None,
+    format: str = Query("objects", regex="^(objects|rows)$")
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """Get alerts from Elasticsearch with optional filters, newest first
+
+    Returns one page of at most ``size`` alerts (capped at
+    ``settings.api_max_page_size``). When more alerts match, the
+    ``X-Next-Cursor`` response header holds a cursor; pass it back as
+    ``cursor`` with the same filters to fetch the next page. The first page
+    is searched without a point in time and may be served from the cache;
+    the second page opens the client's own point in time, so alerts stored
+    in between can repeat a few alerts of the first page.
+
+    ``fields`` is a comma-separated list of fields to return (e.g.
+    ``timestamp,alert_type,priority``); by default whole documents are
+    returned. ``format=rows`` returns ``{"columns": [...], "rows": [[...]]}``
+    instead of a list of objects.
+    """
+    try:
+        source_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = alert_filter_query(start_time, end_time, alert_type, priority)
+
+    size = min(size, settings.api_max_page_size)
+
+    try:
+        if cursor:
+            alerts, next_cursor = await elastic_client.search_alerts_page(
+                query, size, cursor, start_time, end_time, source_fields
+            )
+        else:
+            # Only the hits are cached: each client paging on gets its own point in time
+            alerts = await query_cache.get_or_load(
+                make_key("alerts", start_time=start_time, end_time=end_time, alert_type=alert_type,
+                         priority=priority, size=size, fields=",".join(source_fields) if source_fields else None),
+                lambda: elastic_client.search_first_alerts(query, size, start_time, end_time, source_fields),
+                # None means Elasticsearch could not be searched; don't keep it
+                cacheable=lambda hits: hits is not None
+            ) or []
+            next_cursor = first_page_cursor(query, len(alerts)) if len(alerts) == size else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if format == "rows":
+        return to_rows(alerts, source_fields)
+    return alerts
+
+@app.post("/api/alerts/{alert_id}/escalate")
+async def escalate_alert(alert_id: str) -> AlertAnalysis:
+    """Re-analyze a stored alert with the large model and replace its stored analysis
+
+    For alerts the triage policy summarized by rules or sent to the small
+    model; the new analysis is stored, broadcast and returned.
+    """
+    hit = await elastic_client.get_alert(alert_id)
+    if hit is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    source = hit["_source"]
+    # Analyzed alerts are nested under "alert"; bulk-loaded or unanalyzed ones are flat
+    alert = SnortAlert.parse_obj(source.get("alert", source))
+
+    analysis = await alert_analyzer.escalate(alert)
+    if analysis.context and analysis.context.get("error"):
+        raise HTTPException(status_code=502, detail="The alert could not be analyzed")
+    if not await elastic_client.replace_alert(hit["_index"], alert_id, analysis.dict()):
+        raise HTTPException(status_code=503, detail="The analysis could not be stored")
+    query_cache.invalidate()
+    await broadcast_analysis(analysis)
+    return analysis
 
 @app.get("/api/stats")
 async def get_stats() -> Dict[str, Any]:
     """Get alert statistics from Elasticsearch"""
-    return await elastic_client.get_alert_stats()
+    # An empty result means Elasticsearch could not be reached; don't keep it
+    return await query_cache.get_or_load(make_key("stats"), elastic_client.get_alert_stats, cacheable=bool)
+
+@app.get("/api/stats/timeseries")
+async def get_stats_timeseries(
+    start_time: str = None,
+    end_time: str = None,
+    alert_type: str = None,
+    priority: int = None,
+    interval: str = None,
+    buckets: int = Query(60, ge=1, le=MAX_BUCKETS),
+    top_sources: int = Query(5, ge=1, le=50),
+    composite_field: str = None,
+    composite_size: int = Query(100, ge=1, le=1000),
+    after: str = None
+) -> Dict[str, Any]:
+    """Get alert counts over time with per-bucket breakdowns, in one Elasticsearch round trip
+
+    Each time bucket carries counts by alert type, priority and protocol plus
+    the top source IPs; ``totals`` has the same breakdowns over the whole
+    range. The interval is ``interval`` (e.g. ``15m``) if given, otherwise the
+    smallest one yielding at most ``buckets`` buckets. ``composite_field``
+    additionally pages through every value of that field, ``composite_size``
+    at a time; pass the returned ``composite.after`` back as ``after``.
+    """
+    if interval:
+        if interval_length(interval) is None:
+            raise HTTPException(status_code=400, detail="interval must look like 30s, 15m, 1h or 1d")
+        count = bucket_count(start_time, end_time, interval)
+        if count is not None and count > MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"interval {interval} would produce {count} buckets; "
+                                                        f"the limit is {MAX_BUCKETS}")
+    # The ingest-lean profile drops doc values from some fields, which rules them out
+    composite_fields = [field for field in COMPOSITE_FIELDS if elastic_client.indices.aggregatable(field)]
+    if composite_field and composite_field not in composite_fields:
+        raise HTTPException(status_code=400, detail=f"composite_field must be one of {', '.join(composite_fields)}")
+
+    query = alert_filter_query(start_time, end_time, alert_type, priority)
+
+    async def load_timeseries():
+        return await elastic_client.get_alert_timeseries(
+            query, start_time, end_time, interval, buckets, top_sources,
+            composite_field, composite_size, after
+        )
+
+    try:
+        return await query_cache.get_or_load(
+            make_key("timeseries", start_time=start_time, end_time=end_time, alert_type=alert_type,
+                     priority=priority, interval=interval, buckets=buckets, top_sources=top_sources,
+                     composite_field=composite_field, composite_size=composite_size, after=after),
+            load_timeseries,
+            cacheable=bool
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=502, detail="Elasticsearch could not compute the time series")
 
 # Helper: fields to extract from ES hits
 index_source_fields = {
@@ -150,7 +367,7 @@ index_source_fields = {
     ]
 }
 
-def get_elasticsearch_results(query):
+async def get_elasticsearch_results(query):
     es_query = {
         "query": {
             "multi_match": {
@@ -166,8 +383,7 @@ def get_elasticsearch_results(query):
         },
         "size": 3
     }
-    es = Elasticsearch(settings.elasticsearch_url, api_key=settings.elasticsearch_api_key)
-    result = es.search(index=settings.elasticsearch_index, body=es_query)
+    result = await elastic_client.search(es_query)
     return result["hits"]["hits"]
 
 def create_openai_prompt(results):
@@ -197,14 +413,22 @@ Context:
 """
     return prompt, context_map
 
-def generate_openai_completion(user_prompt, question):
+# Completion tokens reserved for an assistant answer until its actual usage is known
+ASSISTANT_RESERVED_TOKENS = 500
+
+async def generate_openai_completion(user_prompt, question):
     openai.api_key = settings.openai_api_key
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": user_prompt},
-            {"role": "user", "content": question},
-        ]
+    messages = [
+        {"role": "system", "content": user_prompt},
+        {"role": "user", "content": question},
+    ]
+    response = await get_governor().run(
+        lambda: openai.ChatCompletion.acreate(
+            model="gpt-3.5-turbo",
+            messages=messages
+        ),
+        tokens=request_tokens(messages, ASSISTANT_RESERVED_TOKENS),
+        priority=INTERACTIVE_PRIORITY
     )
     return response.choices[0].message.content
 
@@ -215,9 +439,9 @@ async def ai_assistant(request: Request):
     logger.info(f"Received question: {question}")
 
     try:
-        elasticsearch_results = get_elasticsearch_results(question)
+        elasticsearch_results = await get_elasticsearch_results(question)
         context_prompt, context_map = create_openai_prompt(elasticsearch_results)
-        openai_completion = generate_openai_completion(context_prompt, question)
+        openai_completion = await generate_openai_completion(context_prompt, question)
         answer = openai_completion
     except Exception as e:
         logger.error(f"AI assistant error: {e}")
@@ -231,7 +455,6 @@ async def semantic_search(payload: dict = Body(...)):
     query = payload.get("query", "")
     if not query:
         return {"results": []}
-    es = Elasticsearch(settings.elasticsearch_url, api_key=settings.elasticsearch_api_key)
     body = {
         "size": 5,
         "query": {
@@ -245,7 +468,7 @@ async def semantic_search(payload: dict = Body(...)):
         "_source": ["alert_type", "message", "timestamp"]
     }
     try:
-        response = es.search(index=settings.elasticsearch_index, body=body)
+        response = await elastic_client.search(body)
         results = [hit["_source"] for hit in response["hits"]["hits"]]
     except Exception as e:
         logger.error(f"ELSER search error: {e}")
@@ -15,6 +15,7 @@ class SnortAlert(BaseModel):
     classification: Optional[str] = None
     signature_id: Optional[str] = None
     raw_alert: str
+    alert_id: Optional[str] = None
     
     class Config:
         json_schema_extra = {
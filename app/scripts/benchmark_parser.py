@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+import click
+from rich.console import Console
+from rich.table import Table
+from elastic.bulk import bulk_entry
+from models.snort import SnortAlert
+from scripts.generate_test_alerts import generate_test_alerts
+from scripts.index_alerts import iter_alert_batches
+from snort.batch import parse_batch
+from snort.parallel import iter_parallel_batches
+from snort.parser import parse_alert_line
+from snort.processor import SnortAlertProcessor
+from snort.reader import iter_mmap_batches
+
+console = Console()
+
+CORPUS_SIZES = {
+    "1k": 1000,
+    "100k": 100000,
+    "10m": 10000000
+}
+
+# Lines used for the (slow) tracemalloc pass of every stage
+MEMORY_SAMPLE_LINES = 10000
+
+def legacy_parse_alert_line(line: str):
+    """Reference copy of the original four-regex parser, kept as the baseline."""
+    try:
+        if not line.strip():
+            return None
+        timestamp_match = re.search(r'\[(\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]', line)
+        if not timestamp_match:
+            return None
+        timestamp = datetime.strptime(timestamp_match.group(1), '%m/%d-%H:%M:%S.%f')
+        alert_match = re.search(r'\[\*\*\] \[([^\]]+)\] (.+?) \[\*\*\]', line)
+        if not alert_match:
+            return None
+        alert_type = alert_match.group(1)
+        class_match = re.search(r'\[Classification: (.+?)\]', line)
+        priority_match = re.search(r'\[Priority: (\d+)\]', line)
+        ip_match = re.search(r'(\w+) (\d+\.\d+\.\d+\.\d+):(\d+) -> (\d+\.\d+\.\d+\.\d+):(\d+)', line)
+        if not ip_match:
+            return None
+        return SnortAlert(
+            timestamp=timestamp.isoformat(),
+            alert_type=alert_type,
+            priority=int(priority_match.group(1)) if priority_match else 0,
+            message=alert_match.group(2).strip(),
+            source_ip=ip_match.group(2),
+            source_port=int(ip_match.group(3)),
+            destination_ip=ip_match.group(4),
+            destination_port=int(ip_match.group(5)),
+            protocol=ip_match.group(1),
+            classification=class_match.group(1) if class_match else "Unknown",
+            signature_id="0:0:0" if alert_type == "FAILED" else alert_type,
+            raw_alert=line.strip()
+        )
+    except Exception:
+        return None
+
+def _per_line(parse):
+    def stage(file_path: str):
+        with open(file_path, 'r') as f:
+            for line in f:
+                yield parse(line)
+    return stage
+
+def _parse_batch_stage(file_path: str):
+    with open(file_path, 'r') as f:
+        for lines in iter(lambda: list(islice(f, 10000)), []):
+            yield parse_batch(lines)
+
+def _mmap_stage(file_path: str):
+    yield from iter_mmap_batches(file_path)
+
+def _parallel_stage(file_path: str):
+    yield from iter_parallel_batches(file_path)
+
+def _index_documents_stage(file_path: str):
+    """Everything index_alerts does short of sending the bulk request"""
+    for columns in iter_alert_batches(file_path, 500):
+        for document in columns.documents():
+            yield bulk_entry("snort-alerts", document)
+
+STAGES = {
+    "legacy_parse_alert_line": _per_line(legacy_parse_alert_line),
+    "parse_alert_line": _per_line(parse_alert_line),
+    "processor.parse_alert": _per_line(SnortAlertProcessor().parse_alert),
+    "parse_batch": _parse_batch_stage,
+    "mmap_batches": _mmap_stage,
+    "parallel_batches": _parallel_stage,
+    "index_documents": _index_documents_stage
+}
+
+def count_lines(file_path: str) -> int:
+    with open(file_path, 'rb') as f:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b''))
+
+def ensure_corpus(corpus_dir: str, num_lines: int, seed: int, malformed_ratio: float) -> str:
+    """Generate the corpus once per (size, seed, malformed ratio) and reuse it afterwards"""
+    corpus_dir = os.path.expanduser(corpus_dir)
+    file_path = os.path.join(corpus_dir, f"alerts-{num_lines}-seed{seed}-malformed{malformed_ratio}.log")
+    if not os.path.exists(file_path):
+        generate_test_alerts(num_lines, file_path, seed, malformed_ratio)
+    return file_path
+
+def run_throughput(stage_name: str, file_path: str, num_lines: int):
+    """Run one stage over the full corpus; executed in a fresh process for a clean peak RSS"""
+    logging.disable(logging.WARNING)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for _ in STAGES[stage_name](file_path):
+        pass
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "seconds": elapsed,
+        "lines_per_sec": num_lines / elapsed if elapsed > 0 else 0.0,
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": peak_rss / 1024,
+        "peak_rss_growth_mb": (peak_rss - baseline_rss) / 1024
+    }
+
+def run_memory(stage_name: str, file_path: str):
+    """
+    Measure memory retained by a stage's results on a sample, with every result kept alive.
+
+    Retained blocks and bytes are the difference between tracemalloc snapshots
+    taken before and after the parse, so short-lived temporaries freed during
+    parsing do not count; the peak shows how much was live at any one time.
+    """
+    logging.disable(logging.WARNING)
+    with open(file_path, 'r') as f:
+        sample = list(islice(f, MEMORY_SAMPLE_LINES))
+    with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as f:
+        f.writelines(sample)
+        sample_path = f.name
+    try:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        results = list(STAGES[stage_name](sample_path))
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Leave out tracemalloc's own bookkeeping
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        retained = after.filter_traces(own).compare_to(before.filter_traces(own), 'filename')
+    finally:
+        os.remove(sample_path)
+    del results
+    return {
+        "retained_blocks_per_line": sum(stat.count_diff for stat in retained) / len(sample),
+        "retained_bytes_per_line": sum(stat.size_diff for stat in retained) / len(sample),
+        "peak_traced_bytes_per_line": peak / len(sample)
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+@click.command()
+@click.option('--corpus', type=click.Choice(list(CORPUS_SIZES)), default='100k', help='Corpus size')
+@click.option('--seed', default=42, help='Random seed used to generate the corpus')
+@click.option('--malformed-ratio', default=0.02, help='Fraction of malformed lines in the corpus')
+@click.option('--corpus-dir', default='~/snort_bench', help='Directory where generated corpora are cached')
+@click.option('--stage', 'stages', multiple=True, type=click.Choice(list(STAGES)),
+              help='Stage to run (repeatable); defaults to every stage')
+@click.option('--output', default=None, help='Write results as JSON to this path')
+def main(corpus: str, seed: int, malformed_ratio: float, corpus_dir: str, stages, output: str):
+    """Benchmark every alert parsing stage on a reproducible synthetic corpus."""
+    num_lines = CORPUS_SIZES[corpus]
+    file_path = ensure_corpus(corpus_dir, num_lines, seed, malformed_ratio)
+    total_lines = count_lines(file_path)
+    stages = list(stages) or list(STAGES)
+
+    results = {}
+    for stage_name in stages:
+        console.print(f"[blue]Running {stage_name}...[/blue]")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            throughput = executor.submit(run_throughput, stage_name, file_path, total_lines).result()
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            memory = executor.submit(run_memory, stage_name, file_path).result()
+        results[stage_name] = {**throughput, **memory}
+
+    table = Table(title=f"Alert parsing stages ({total_lines:,} lines, seed {seed}, {malformed_ratio:.0%} malformed)")
+    table.add_column("Stage", no_wrap=True)
+    table.add_column("Lines/sec", justify="right")
+    table.add_column("Retained blocks/line", justify="right")
+    table.add_column("Retained B/line", justify="right")
+    table.add_column("Peak traced B/line", justify="right")
+    table.add_column("Peak RSS (MB)", justify="right")
+    for stage_name, result in results.items():
+        table.add_row(
+            stage_name,
+            f"{result['lines_per_sec']:,.0f}",
+            f"{result['retained_blocks_per_line']:.1f}",
+            f"{result['retained_bytes_per_line']:,.0f}",
+            f"{result['peak_traced_bytes_per_line']:,.0f}",
+            f"{result['peak_rss_mb']:,.1f}"
+        )
+    console.print(table)
+
+    if output:
+        report = {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": {
+                "size": corpus,
+                "lines": total_lines,
+                "seed": seed,
+                "malformed_ratio": malformed_ratio
+            },
+            "stages": results
+        }
+        with open(os.path.expanduser(output), 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        console.print(f"[green]Results written to {output}[/green]")
+
+if __name__ == '__main__':
+    main()
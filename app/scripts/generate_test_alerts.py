@@ -6,8 +6,27 @@ import random
 
 console = Console()
 
-def generate_test_alerts(num_alerts: int = 10, output_file: str = "~/snort_test/alert"):
-    """Generate test Snort alerts with various failure scenarios."""
+# Line corruptions used to mix malformed input into a corpus
+MALFORMED_VARIANTS = [
+    lambda line, rng: line[:rng.randint(1, len(line) - 1)],                 # truncated write
+    lambda line, rng: line.replace(" -> ", " "),                            # missing destination
+    lambda line, rng: line.replace("[**]", "[*]", 1),                       # broken alert block
+    lambda line, rng: "[13/45-99:99:99.000]" + line[20:],                   # impossible timestamp
+    lambda line, rng: line.replace("192.168.", "192.999.", 1),              # out-of-range octet
+    lambda line, rng: "".join(rng.choice("abcdef0123456789 []*:") for _ in range(60)),  # garbage
+    lambda line, rng: ""                                                    # blank line
+]
+
+def generate_test_alerts(num_alerts: int = 10, output_file: str = "~/snort_test/alert",
+                         seed: int = None, malformed_ratio: float = 0.0):
+    """Generate test Snort alerts with various failure scenarios.
+    
+    With a ``seed`` the output is byte-for-byte reproducible (timestamps start
+    from a fixed date instead of an hour ago). ``malformed_ratio`` is the
+    fraction of lines replaced by a corrupted variant, for exercising the
+    parsers' rejection paths. Lines are streamed to disk, so corpora of tens of
+    millions of lines do not need to fit in memory.
+    """
     # Expand home directory in path
     output_file = os.path.expanduser(output_file)
     
@@ -84,33 +103,36 @@ def generate_test_alerts(num_alerts: int = 10, output_file: str = "~/snort_test/
     ]
     
     # Generate alerts
-    alerts = []
-    base_time = datetime.now() - timedelta(hours=1)
-    
-    for i in range(num_alerts):
-        # Select a random alert type
-        alert = random.choice(alert_types)
-        
-        # Generate random IPs
-        source_ip = f"192.168.{random.randint(1, 254)}.{random.randint(1, 254)}"
-        dest_ip = f"10.0.{random.randint(1, 254)}.{random.randint(1, 254)}"
-        
-        # Generate timestamp
-        timestamp = base_time + timedelta(minutes=i*5)
-        
-        # Create alert line
-        alert_line = (
-            f"[{timestamp.strftime('%m/%d-%H:%M:%S.%f')[:-3]}] "
-            f"[**] [{alert['type']}] {alert['message']} [**] "
-            f"[Classification: {alert['classification']}] [Priority: {alert['priority']}] "
-            f"{alert['protocol']} {source_ip}:{alert['source_port']} -> {dest_ip}:{alert['dest_port']}"
-        )
-        alerts.append(alert_line)
+    rng = random.Random(seed)
+    if seed is None:
+        base_time = datetime.now() - timedelta(hours=1)
+    else:
+        base_time = datetime(2024, 1, 1)
     
     # Write alerts to file
     try:
         with open(output_file, 'w') as f:
-            f.write('\n'.join(alerts))
+            for i in range(num_alerts):
+                # Select a random alert type
+                alert = rng.choice(alert_types)
+                
+                # Generate random IPs
+                source_ip = f"192.168.{rng.randint(1, 254)}.{rng.randint(1, 254)}"
+                dest_ip = f"10.0.{rng.randint(1, 254)}.{rng.randint(1, 254)}"
+                
+                # Generate timestamp
+                timestamp = base_time + timedelta(minutes=i*5)
+                
+                # Create alert line
+                alert_line = (
+                    f"[{timestamp.strftime('%m/%d-%H:%M:%S.%f')[:-3]}] "
+                    f"[**] [{alert['type']}] {alert['message']} [**] "
+                    f"[Classification: {alert['classification']}] [Priority: {alert['priority']}] "
+                    f"{alert['protocol']} {source_ip}:{alert['source_port']} -> {dest_ip}:{alert['dest_port']}"
+                )
+                if malformed_ratio and rng.random() < malformed_ratio:
+                    alert_line = rng.choice(MALFORMED_VARIANTS)(alert_line, rng)
+                f.write(alert_line + '\n')
         console.print(f"[green]Successfully generated {num_alerts} test alerts[/green]")
         console.print(f"[blue]Output file: {output_file}[/blue]")
     except Exception as e:
@@ -119,9 +141,11 @@ def generate_test_alerts(num_alerts: int = 10, output_file: str = "~/snort_test/
 @click.command()
 @click.option('--num-alerts', default=10, help='Number of test alerts to generate')
 @click.option('--output-file', default='~/snort_test/alert', help='Path to output file')
-def main(num_alerts: int, output_file: str):
+@click.option('--seed', type=int, default=None, help='Random seed for a reproducible corpus')
+@click.option('--malformed-ratio', default=0.0, help='Fraction of lines to corrupt (0-1)')
+def main(num_alerts: int, output_file: str, seed: int, malformed_ratio: float):
     """Generate test Snort alerts."""
-    generate_test_alerts(num_alerts, output_file)
+    generate_test_alerts(num_alerts, output_file, seed, malformed_ratio)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,12 +1,17 @@
 import os
+import signal
+import sys
 import click
 from rich.console import Console
 from rich.progress import Progress
-from datetime import datetime
-from elasticsearch import Elasticsearch
-from models.snort import SnortAlert
+from elasticsearch import BadRequestError, Elasticsearch
 from config import get_settings
-from snort.parser import parse_alert_line
+from elastic.bulk import AdaptiveBatchSizer, StreamingBulkIndexer
+from elastic.indices import AlertIndices
+from typing import Iterator, Set
+from snort.batch import AlertColumns
+from snort.parallel import iter_parallel_batches
+from snort.reader import iter_mmap_batches
 
 console = Console()
 settings = get_settings()
@@ -19,95 +24,122 @@ def get_elasticsearch_client():
         verify_certs=True  # Enable SSL verification
     )
 
-def index_alerts(alert_file: str, batch_size: int = 100):
+def iter_alert_batches(alert_file: str, batch_size: int = 100, workers: int = 1) -> Iterator[AlertColumns]:
+    """Yield parsed alert columns in file order, using a process pool when workers > 1."""
+    if workers > 1:
+        yield from iter_parallel_batches(alert_file, workers)
+        return
+    
+    # Parse the memory-mapped file in blocks straight into columns; no per-line
+    # str or pydantic model is built on the bulk indexing path
+    yield from iter_mmap_batches(alert_file, batch_size)
+
+def bulk_load_router(es: Elasticsearch, indices: AlertIndices, loaded: Set[str]):
+    """
+    Route documents to their partitions with refresh disabled for the load.
+
+    The first document for a missing partition creates it (from the template)
+    with ``refresh_interval: -1`` and records it in ``loaded`` for
+    :func:`finish_bulk_load`. Partitions that already exist may be receiving
+    live alerts, so their settings are left alone.
+    """
+    seen = set()
+
+    def index_for(document):
+        index_name = indices.index_for(document)
+        if index_name not in seen:
+            seen.add(index_name)
+            try:
+                es.indices.create(index=index_name, settings={"refresh_interval": "-1"})
+                loaded.add(index_name)
+            except BadRequestError as e:
+                if e.error != "resource_already_exists_exception":
+                    raise
+        return index_name
+    return index_for
+
+def finish_bulk_load(es: Elasticsearch, indices: AlertIndices, loaded: Set[str]):
+    """Restore the profile's refresh interval on created partitions and make them searchable"""
+    for index_name in sorted(loaded):
+        try:
+            es.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": indices.refresh_interval}})
+            es.indices.refresh(index=index_name)
+        except Exception as e:
+            console.print(f"[red]Error restoring refresh_interval on {index_name}: {str(e)}[/red]")
+
+def exit_on_sigterm(signum, frame):
+    """Turn SIGTERM into SystemExit so cleanup in ``finally`` blocks still runs"""
+    sys.exit(128 + signum)
+
+def index_alerts(alert_file: str, batch_size: int = 500, workers: int = 1, concurrency: int = 4,
+                 max_batch_size: int = 5000):
     """Read alerts from file and index them in Elasticsearch."""
     es = get_elasticsearch_client()
-    index_name = settings.elasticsearch_index
+    indices = AlertIndices.from_settings(settings)
     
-    # Create index if it doesn't exist
-    if not es.indices.exists(index=index_name):
-        es.indices.create(
-            index=index_name,
-            mappings={
-                "properties": {
-                    "timestamp": {"type": "date"},
-                    "alert_type": {"type": "keyword"},
-                    "priority": {"type": "integer"},
-                    "message": {"type": "text"},
-                    "source_ip": {"type": "ip"},
-                    "source_port": {"type": "integer"},
-                    "destination_ip": {"type": "ip"},
-                    "destination_port": {"type": "integer"},
-                    "protocol": {"type": "keyword"},
-                    "classification": {"type": "keyword"},
-                    "signature_id": {"type": "keyword"},
-                    "raw_alert": {"type": "text"}
-                }
-            }
-        )
+    # Daily alert indices are created on first write from the shared template
+    es.indices.put_index_template(**indices.template())
+    loaded = set()
     
-    alerts = []
-    total_indexed = 0
+    def documents():
+        nonlocal total_rejected
+        for columns in iter_alert_batches(alert_file, batch_size, workers):
+            total_rejected += columns.rejected
+            yield from columns.documents()
+    
+    total_rejected = 0
+    indexer = StreamingBulkIndexer(
+        es,
+        bulk_load_router(es, indices, loaded),
+        concurrency=concurrency,
+        sizer=AdaptiveBatchSizer(initial=batch_size, maximum=max(batch_size, max_batch_size))
+    )
     
     try:
-        with open(alert_file, 'r') as f:
-            with Progress() as progress:
-                task = progress.add_task("[cyan]Indexing alerts...", total=None)
-                
-                for line in f:
-                    try:
-                        alert = parse_alert_line(line)
-                        if alert:
-                            # Convert alert to dict for indexing
-                            alert_dict = alert.dict()
-                            alerts.append(alert_dict)
-                            
-                            # Index in batches
-                            if len(alerts) >= batch_size:
-                                # Prepare bulk request
-                                bulk_data = []
-                                for alert in alerts:
-                                    bulk_data.append({"index": {"_index": index_name}})
-                                    bulk_data.append(alert)
-                                
-                                # Send bulk request
-                                response = es.bulk(operations=bulk_data)
-                                if not response.get('errors'):
-                                    total_indexed += len(alerts)
-                                    progress.update(task, completed=total_indexed)
-                                else:
-                                    console.print(f"[red]Error in bulk indexing: {response}[/red]")
-                                alerts = []
-                    
-                    except Exception as e:
-                        console.print(f"[red]Error parsing alert: {str(e)}[/red]")
-                        continue
-                
-                # Index any remaining alerts
-                if alerts:
-                    # Prepare bulk request
-                    bulk_data = []
-                    for alert in alerts:
-                        bulk_data.append({"index": {"_index": index_name}})
-                        bulk_data.append(alert)
-                    
-                    # Send bulk request
-                    response = es.bulk(operations=bulk_data)
-                    if not response.get('errors'):
-                        total_indexed += len(alerts)
-                        progress.update(task, completed=total_indexed)
-                    else:
-                        console.print(f"[red]Error in bulk indexing: {response}[/red]")
+        with Progress() as progress:
+            task = progress.add_task("[cyan]Indexing alerts...", total=None)
+            
+            def report(stats):
+                progress.update(
+                    task,
+                    completed=stats["documents_written"],
+                    description=f"[cyan]Indexing alerts ({stats['docs_per_sec']:,.0f} docs/sec, batch {stats['batch_size']})..."
+                )
+            
+            previous_handler = signal.signal(signal.SIGTERM, exit_on_sigterm)
+            try:
+                stats = indexer.index(documents(), on_progress=report)
+            finally:
+                signal.signal(signal.SIGTERM, previous_handler)
+                finish_bulk_load(es, indices, loaded)
         
-        console.print(f"\n[green]Successfully indexed {total_indexed} alerts in Elasticsearch[/green]")
+        if total_rejected:
+            console.print(f"[yellow]Skipped {total_rejected} unparseable alert lines[/yellow]")
+        if stats["documents_duplicate"]:
+            console.print(f"[yellow]Skipped {stats['documents_duplicate']} alerts that were already indexed[/yellow]")
+        if stats["documents_failed"]:
+            console.print(f"[red]Failed to index {stats['documents_failed']} alerts[/red]")
+        if stats["item_retries"] or stats["throttled_requests"]:
+            console.print(f"[yellow]Retried {stats['item_retries']} rejected alerts and "
+                          f"{stats['throttled_requests']} throttled requests[/yellow]")
+        expired = indices.expired(es.indices.get(index=indices.pattern, expand_wildcards="open,closed").body)
+        for index_name in expired:
+            es.indices.delete(index=index_name)
+        if expired:
+            console.print(f"[yellow]Deleted {len(expired)} alert indices older than {indices.retention_days} days[/yellow]")
+        console.print(f"\n[green]Successfully indexed {stats['documents_written']} alerts in Elasticsearch "
+                      f"({stats['docs_per_sec']:,.0f} docs/sec over {stats['elapsed_seconds']:.1f}s)[/green]")
         
     except Exception as e:
         console.print(f"[red]Error indexing alerts: {str(e)}[/red]")
 
 @click.command()
 @click.option('--alert-file', default='~/snort_test/alert', help='Path to Snort alert file')
-@click.option('--batch-size', default=100, help='Number of alerts to index in each batch')
-def main(alert_file: str, batch_size: int):
+@click.option('--batch-size', default=500, help='Initial number of alerts per bulk request; adapted to response times')
+@click.option('--max-batch-size', default=5000, help='Upper bound for the adaptive bulk request size')
+@click.option('--concurrency', default=4, help='Number of bulk requests in flight at once')
+@click.option('--workers', default=1, help='Number of processes used to parse the file (1 disables parallel parsing)')
+def main(alert_file: str, batch_size: int, max_batch_size: int, concurrency: int, workers: int):
     """Index Snort alerts in Elasticsearch."""
     # Expand home directory in path
     alert_file = os.path.expanduser(alert_file)
@@ -117,7 +149,7 @@ def main(alert_file: str, batch_size: int):
         return
     
     console.print(f"[blue]Indexing alerts from {alert_file}...[/blue]")
-    index_alerts(alert_file, batch_size)
+    index_alerts(alert_file, batch_size, workers, concurrency, max_batch_size)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+import statistics
+import time
+import click
+import httpx
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+async def _hammer(client: httpx.AsyncClient, path: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.get(path)
+            latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+async def _probe(client: httpx.AsyncClient, path: str, deadline: float, interval: float, latencies: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.get(path)
+            latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+def _summary(latencies: list) -> list:
+    if not latencies:
+        return ["0", "-", "-", "-"]
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return [
+        str(len(ordered)),
+        f"{statistics.median(ordered) * 1000:,.1f}",
+        f"{p95 * 1000:,.1f}",
+        f"{ordered[-1] * 1000:,.1f}"
+    ]
+
+async def run_load_test(base_url: str, concurrency: int, duration: float, load_path: str, probe_path: str):
+    deadline = time.perf_counter() + duration
+    load_latencies, probe_latencies, errors = [], [], []
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(
+            _probe(client, probe_path, deadline, 0.05, probe_latencies),
+            *(_hammer(client, load_path, deadline, load_latencies, errors) for _ in range(concurrency))
+        )
+
+    table = Table(title=f"{concurrency} concurrent {load_path} for {duration:.0f}s")
+    table.add_column("Endpoint")
+    table.add_column("Requests", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p95 (ms)", justify="right")
+    table.add_column("max (ms)", justify="right")
+    table.add_row(f"{load_path} (load)", *_summary(load_latencies))
+    table.add_row(f"{probe_path} (probe)", *_summary(probe_latencies))
+    console.print(table)
+    if errors:
+        console.print(f"[red]{len(errors)} load requests failed, e.g. {errors[0]}[/red]")
+
+@click.command()
+@click.option('--url', default='http://localhost:8000', help='Base URL of the running API')
+@click.option('--concurrency', default=50, help='Concurrent clients hitting the Elasticsearch-backed endpoint')
+@click.option('--duration', default=15.0, help='Test duration in seconds')
+@click.option('--load-path', default='/api/alerts', help='Elasticsearch-backed endpoint to load')
+@click.option('--probe-path', default='/api/metrics', help='Endpoint that does not touch Elasticsearch')
+def main(url: str, concurrency: int, duration: float, load_path: str, probe_path: str):
+    """Check that the API stays responsive while Elasticsearch calls are slow.
+
+    Run the API against a slow or throttled cluster, then compare probe latency
+    with the load endpoint's: probe latency should stay flat because no
+    Elasticsearch call blocks the event loop.
+    """
+    asyncio.run(run_load_test(url, concurrency, duration, load_path, probe_path))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import click
+from rich.console import Console
+from rich.table import Table
+from config import get_settings
+from elastic.bulk import StreamingBulkIndexer
+from elastic.indices import MAPPING_PROFILES
+from scripts.generate_test_alerts import generate_test_alerts
+from scripts.index_alerts import get_elasticsearch_client, iter_alert_batches
+
+console = Console()
+settings = get_settings()
+
+def report_index_name(profile: str) -> str:
+    """Scratch index for a profile; outside the <index>-* template pattern"""
+    return f"{settings.elasticsearch_index}_mapping_report_{profile.replace('-', '_')}"
+
+def measure_profile(es, profile: str, alert_file: str, with_fields: bool) -> dict:
+    """Load the corpus into a fresh index with the profile's mapping and measure it"""
+    index_name = report_index_name(profile)
+    es.indices.delete(index=index_name, ignore_unavailable=True)
+    es.indices.create(
+        index=index_name,
+        mappings=MAPPING_PROFILES[profile]["mappings"],
+        settings={**MAPPING_PROFILES[profile]["settings"], "refresh_interval": "-1", "number_of_replicas": 0}
+    )
+
+    documents = (document for columns in iter_alert_batches(alert_file, 10000) for document in columns.documents())
+    stats = StreamingBulkIndexer(es, index_name).index(documents)
+
+    # Segments are compressed as they merge; compare fully merged indices
+    es.indices.refresh(index=index_name)
+    es.indices.forcemerge(index=index_name, max_num_segments=1)
+    primaries = es.indices.stats(index=index_name, metric="docs,store")["indices"][index_name]["primaries"]
+    result = {
+        "documents": primaries["docs"]["count"],
+        "store_bytes": primaries["store"]["size_in_bytes"],
+        "docs_per_sec": stats["docs_per_sec"]
+    }
+    result["bytes_per_document"] = result["store_bytes"] / result["documents"] if result["documents"] else 0.0
+
+    if with_fields:
+        usage = es.indices.disk_usage(index=index_name, run_expensive_tasks=True)[index_name]
+        result["fields"] = {
+            field: details["total_in_bytes"]
+            for field, details in usage["fields"].items()
+        }
+    return result
+
+@click.command()
+@click.option('--alert-file', default=None, help='Alert file to load; defaults to a generated corpus')
+@click.option('--num-alerts', default=50000, help='Size of the generated corpus')
+@click.option('--seed', default=42, help='Random seed used to generate the corpus')
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(list(MAPPING_PROFILES)),
+              help='Profile to measure (repeatable); defaults to every profile')
+@click.option('--fields', 'with_fields', is_flag=True, help='Also report per-field disk usage (expensive)')
+@click.option('--keep', is_flag=True, help='Keep the scratch indices instead of deleting them')
+@click.option('--output', default=None, help='Write results as JSON to this path')
+def main(alert_file: str, num_alerts: int, seed: int, profiles, with_fields: bool, keep: bool, output: str):
+    """Compare index size per document across the alert mapping profiles."""
+    profiles = list(profiles) or list(MAPPING_PROFILES)
+    generated = None
+    if alert_file is None:
+        generated = tempfile.NamedTemporaryFile(suffix='.log', delete=False).name
+        generate_test_alerts(num_alerts, generated, seed)
+        alert_file = generated
+    alert_file = os.path.expanduser(alert_file)
+
+    es = get_elasticsearch_client()
+    results = {}
+    try:
+        for profile in profiles:
+            console.print(f"[blue]Loading {alert_file} with the {profile} profile...[/blue]")
+            results[profile] = measure_profile(es, profile, alert_file, with_fields)
+    finally:
+        if not keep:
+            for profile in profiles:
+                es.indices.delete(index=report_index_name(profile), ignore_unavailable=True)
+        if generated:
+            os.remove(generated)
+
+    baseline = results.get("search-rich")
+    table = Table(title="Alert mapping profiles (force-merged primaries)")
+    table.add_column("Profile")
+    table.add_column("Documents", justify="right")
+    table.add_column("Store (MB)", justify="right")
+    table.add_column("Bytes/doc", justify="right")
+    table.add_column("vs search-rich", justify="right")
+    for profile, result in results.items():
+        relative = f"{result['store_bytes'] / baseline['store_bytes']:.0%}" if baseline and baseline["store_bytes"] else "-"
+        table.add_row(
+            profile,
+            f"{result['documents']:,}",
+            f"{result['store_bytes'] / (1024 * 1024):,.1f}",
+            f"{result['bytes_per_document']:,.0f}",
+            relative
+        )
+    console.print(table)
+
+    if with_fields:
+        fields = sorted({field for result in results.values() for field in result["fields"]})
+        field_table = Table(title="Bytes per document by field")
+        field_table.add_column("Field")
+        for profile in results:
+            field_table.add_column(profile, justify="right")
+        for field in fields:
+            field_table.add_row(field, *(
+                f"{result['fields'].get(field, 0) / result['documents']:,.1f}" if result["documents"] else "-"
+                for result in results.values()
+            ))
+        console.print(field_table)
+
+    if output:
+        with open(os.path.expanduser(output), 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        console.print(f"[green]Results written to {output}[/green]")
+
+if __name__ == '__main__':
+    main()
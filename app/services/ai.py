@@ -1,28 +1,43 @@
 from typing import Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import openai
 from models.snort import SnortAlert
 from config import get_settings
+from ai.cache import analysis_key, get_analysis_cache
+from ai.governor import alert_lane, get_governor, request_tokens
 
 settings = get_settings()
 
+# Bump when the prompt changes so cached analyses of the old prompt stop matching
+PROMPT_VERSION = "1"
+
 @dataclass
 class AlertAnalysis:
     analysis: str
     recommendations: Optional[str] = None
     confidence_score: float = 0.0
 
-def analyze_alert(alert: SnortAlert, model: str = "gpt-4") -> AlertAnalysis:
+def analyze_alert(alert: SnortAlert, model: str = "gpt-4", priority: Optional[int] = None) -> AlertAnalysis:
     """
     Analyze a Snort alert using OpenAI's API.
     
     Args:
         alert: The SnortAlert object to analyze
         model: The OpenAI model to use for analysis
+        priority: Governor lane of the request; the alert's priority by default
         
     Returns:
         AlertAnalysis object containing the analysis, recommendations, and confidence score
+
+    Repeats of an alert already analyzed with the same model (ignoring
+    addresses, ports and time) are answered from the analysis cache.
     """
+    cache = get_analysis_cache()
+    key = analysis_key(alert, "services.ai", model, PROMPT_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return AlertAnalysis(**cached)
+
     # Set up the OpenAI client
     openai.api_key = settings.openai_api_key
     
@@ -52,15 +67,20 @@ CONFIDENCE: [0-100]
 """
 
     try:
-        # Get the AI response
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a Snort and network security expert. Provide clear, actionable analysis and recommendations."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+        # Get the AI response, within the shared OpenAI rate limits
+        messages = [
+            {"role": "system", "content": "You are a Snort and network security expert. Provide clear, actionable analysis and recommendations."},
+            {"role": "user", "content": prompt}
+        ]
+        response = get_governor().run_sync(
+            lambda: openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
+            ),
+            tokens=request_tokens(messages, 1000),
+            priority=alert_lane(alert.priority) if priority is None else priority
         )
         
         # Parse the response
@@ -83,11 +103,13 @@ CONFIDENCE: [0-100]
                 except ValueError:
                     confidence = 0.0
         
-        return AlertAnalysis(
+        result = AlertAnalysis(
             analysis=analysis,
             recommendations=recommendations,
             confidence_score=confidence
         )
+        cache.put(key, asdict(result))
+        return result
         
     except Exception as e:
         raise Exception(f"Error analyzing alert: {str(e)}") 
\ No newline at end of file
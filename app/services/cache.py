@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+def make_key(name: str, **params: Any) -> Hashable:
+    """Normalize endpoint parameters into a cache key; None values are dropped"""
+    return (name,) + tuple(sorted((key, str(value)) for key, value in params.items() if value is not None))
+
+class QueryCache:
+    """
+    In-process TTL + LRU cache for read endpoints, with request coalescing.
+
+    Concurrent misses on the same key share a single load. :meth:`invalidate`
+    marks everything cached so far as stale; entries younger than ``min_age``
+    survive it, so continuous ingest costs at most one reload per key every
+    ``min_age`` seconds instead of defeating the cache entirely.
+
+    Args:
+        max_entries: Least recently used entries are evicted beyond this
+        ttl: Seconds an entry is served without invalidation
+        min_age: Seconds an entry is served even after an invalidation
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0, min_age: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_age = min_age
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._invalidated_at = float("-inf")
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "invalidations": 0,
+            "evictions": 0
+        }
+
+    def _fresh(self, stored_at: float, now: float) -> bool:
+        age = now - stored_at
+        if age >= self.ttl:
+            return False
+        return stored_at >= self._invalidated_at or age < self.min_age
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value for ``key``, loading it at most once at a time.
+
+        ``cacheable`` can reject results that should not be kept, such as the
+        empty fallback returned when Elasticsearch is unreachable. If the
+        caller running a shared load is cancelled, its waiters retry the load
+        instead of being cancelled with it.
+        """
+        while True:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0], now):
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return entry[1]
+
+            pending = self._loading.get(key)
+            if pending is None:
+                break
+            self.metrics["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only the loader was cancelled, not this caller: load again
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        self.metrics["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else awaited is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if cacheable is None or cacheable(value):
+                self._store(key, now, value)
+            return value
+        finally:
+            del self._loading[key]
+
+    def _store(self, key: Hashable, stored_at: float, value: Any):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def invalidate(self, *args: Any):
+        """Mark every entry cached so far as stale; usable directly as an event listener"""
+        self._invalidated_at = time.monotonic()
+        self.metrics["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"] + self.metrics["coalesced"]
+        return {
+            **self.metrics,
+            "entries": len(self._entries),
+            "hit_ratio": (self.metrics["hits"] + self.metrics["coalesced"]) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from models.snort import SnortAlert, AlertAnalysis
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest", "spill")
+
+# Bytes of the spill file read per trip to a worker thread during replay
+SPILL_REPLAY_READ_BYTES = 64 * 1024
+
+class AlertPipeline:
+    """
+    Bounded producer/consumer pipeline between the alert tailer and the
+    analysis, storage and broadcast stages.
+
+    The tailer calls :meth:`submit`; each stage has its own worker pool and the
+    queues between stages are bounded, so a slow stage pushes back on the one
+    before it instead of growing memory. What happens when the ingress queue is
+    full is decided by ``overflow_policy``:
+
+    - ``block``: the producer waits for space (backpressure on the tailer)
+    - ``drop_newest``: incoming alerts are discarded
+    - ``drop_oldest``: the oldest queued alert is evicted to make room
+    - ``spill``: incoming alerts are appended to ``spill_file`` and replayed
+      once the queue has drained below half full
+
+    Dropped alerts are logged and counted. Alerts that leave the pipeline
+    without being stored (dropped, spilled to disk, or failed in analysis or
+    storage) are passed to ``release``, so whoever tracks them (e.g. the tail
+    checkpoint) can let go of them; stored alerts are acknowledged by the
+    storage layer instead. A failed ``analyze_batch`` call falls back to
+    ``analyze`` for each of its alerts. Spill file I/O runs in worker threads.
+
+    Args:
+        analyze: Coroutine turning an alert into an analysis; with ``analyze_batch``,
+            only used for the alerts of a batch that failed
+        store: Coroutine persisting an analysis
+        broadcast: Coroutine pushing an analysis to live clients
+        queue_size: Capacity of each inter-stage queue
+        analysis_workers: Concurrent analysis calls
+        storage_workers: Concurrent storage calls
+        broadcast_workers: Concurrent broadcast calls
+        overflow_policy: One of ``OVERFLOW_POLICIES``
+        spill_file: JSON-lines file used by the ``spill`` policy
+        analyze_batch: Coroutine turning a list of alerts into their analyses, in
+            order; when given, each analysis worker takes up to
+            ``analysis_batch_size`` queued alerts at once
+        analysis_batch_size: Most alerts handed to ``analyze_batch`` in one call
+        release: Called with alerts that leave the pipeline without being stored
+    """
+
+    def __init__(self,
+                 analyze: Callable[[SnortAlert], Awaitable[AlertAnalysis]],
+                 store: Callable[[AlertAnalysis], Awaitable[Any]],
+                 broadcast: Callable[[AlertAnalysis], Awaitable[Any]],
+                 queue_size: int = 1000,
+                 analysis_workers: int = 4,
+                 storage_workers: int = 2,
+                 broadcast_workers: int = 1,
+                 overflow_policy: str = "block",
+                 spill_file: Optional[str] = None,
+                 analyze_batch: Optional[Callable[[List[SnortAlert]], Awaitable[List[AlertAnalysis]]]] = None,
+                 analysis_batch_size: int = 100,
+                 release: Optional[Callable[[List[SnortAlert]], Any]] = None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy!r}; expected one of {OVERFLOW_POLICIES}")
+        if overflow_policy == "spill" and not spill_file:
+            raise ValueError("The spill overflow policy requires a spill file")
+
+        self.analyze = analyze
+        self.analyze_batch = analyze_batch
+        self.analysis_batch_size = analysis_batch_size
+        self.store = store
+        self.release = release
+        self.broadcast = broadcast
+        self.queue_size = queue_size
+        self.worker_counts = {
+            "analysis": analysis_workers,
+            "storage": storage_workers,
+            "broadcast": broadcast_workers
+        }
+        self.overflow_policy = overflow_policy
+        self.spill_file = os.path.expanduser(spill_file) if spill_file else None
+
+        self.alert_queue: Optional[asyncio.Queue] = None
+        self.storage_queue: Optional[asyncio.Queue] = None
+        self.broadcast_queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._spill_lock = asyncio.Lock()
+        self.counters = {
+            "submitted": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "spill_corrupt": 0,
+            "analyzed": 0,
+            "analysis_batches": 0,
+            "analysis_batch_errors": 0,
+            "stored": 0,
+            "broadcast": 0,
+            "analysis_errors": 0,
+            "storage_errors": 0,
+            "broadcast_errors": 0
+        }
+
+    async def start(self):
+        """Create the queues and start every worker pool"""
+        self.alert_queue = asyncio.Queue(self.queue_size)
+        self.storage_queue = asyncio.Queue(self.queue_size)
+        self.broadcast_queue = asyncio.Queue(self.queue_size)
+        analysis_worker = self._batch_analysis_worker if self.analyze_batch else self._analysis_worker
+        for _ in range(self.worker_counts["analysis"]):
+            self._tasks.append(asyncio.create_task(analysis_worker()))
+        for _ in range(self.worker_counts["storage"]):
+            self._tasks.append(asyncio.create_task(
+                self._stage_worker(self.storage_queue, self.store, "stored", "storage_errors", release_failed=True)))
+        for _ in range(self.worker_counts["broadcast"]):
+            self._tasks.append(asyncio.create_task(
+                self._stage_worker(self.broadcast_queue, self.broadcast, "broadcast", "broadcast_errors")))
+        if self.overflow_policy == "spill":
+            self._tasks.append(asyncio.create_task(self._replay_spill()))
+
+    async def stop(self, timeout: float = 10.0):
+        """Give queued work up to ``timeout`` seconds to finish, then cancel the workers"""
+        try:
+            await asyncio.wait_for(self._join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Alert pipeline did not drain before shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _join(self):
+        await self.alert_queue.join()
+        await self.storage_queue.join()
+        await self.broadcast_queue.join()
+
+    async def submit(self, alerts: List[SnortAlert]):
+        """Enqueue alerts for processing, applying the overflow policy when full"""
+        dropped = []
+        for alert in alerts:
+            self.counters["submitted"] += 1
+            if self.overflow_policy == "block":
+                await self.alert_queue.put(alert)
+            elif not self.alert_queue.full():
+                self.alert_queue.put_nowait(alert)
+            elif self.overflow_policy == "drop_newest":
+                dropped.append(alert)
+            elif self.overflow_policy == "drop_oldest":
+                dropped.append(self.alert_queue.get_nowait())
+                self.alert_queue.task_done()
+                self.alert_queue.put_nowait(alert)
+            else:
+                await self._spill(alert)
+                self._release([alert])
+        if dropped:
+            self.counters["dropped"] += len(dropped)
+            logger.warning(
+                f"Alert pipeline full, dropped {len(dropped)} alerts ({self.overflow_policy}); "
+                f"{self.counters['dropped']} dropped so far"
+            )
+            self._release(dropped)
+
+    def _release(self, alerts: List[SnortAlert]):
+        if self.release is not None:
+            try:
+                self.release(alerts)
+            except Exception as e:
+                logger.error(f"Error releasing alerts from pipeline: {str(e)}")
+
+    def _append_spill(self, line: str):
+        directory = os.path.dirname(self.spill_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.spill_file, 'a') as f:
+            f.write(line + "\n")
+
+    async def _spill(self, alert: SnortAlert):
+        async with self._spill_lock:
+            await asyncio.to_thread(self._append_spill, alert.json())
+        self.counters["spilled"] += 1
+
+    def _claim_spill(self, replay_file: str) -> bool:
+        """Move the spill file aside for replay, unless a replay is unfinished; False if nothing is spilled"""
+        if os.path.exists(replay_file):
+            return True
+        if not os.path.exists(self.spill_file):
+            return False
+        os.replace(self.spill_file, replay_file)
+        return True
+
+    async def _replay_spill(self):
+        """Feed spilled alerts back in once the ingress queue has room; corrupt lines are skipped"""
+        replay_file = f"{self.spill_file}.replay"
+        while True:
+            await asyncio.sleep(1)
+            if self.alert_queue.qsize() > self.queue_size // 2:
+                continue
+            async with self._spill_lock:
+                if not await asyncio.to_thread(self._claim_spill, replay_file):
+                    continue
+            f = await asyncio.to_thread(open, replay_file, 'r', errors='replace')
+            try:
+                number = 0
+                while True:
+                    lines = await asyncio.to_thread(f.readlines, SPILL_REPLAY_READ_BYTES)
+                    if not lines:
+                        break
+                    for line in lines:
+                        number += 1
+                        if not line.strip():
+                            continue
+                        try:
+                            alert = SnortAlert.parse_raw(line)
+                        except ValueError as e:
+                            self.counters["spill_corrupt"] += 1
+                            logger.error(f"Skipping corrupt line {number} of {replay_file}: {str(e)}")
+                            continue
+                        await self.alert_queue.put(alert)
+                        self.counters["replayed"] += 1
+            finally:
+                f.close()
+            await asyncio.to_thread(os.remove, replay_file)
+
+    async def _analyze_one(self, alert: SnortAlert) -> Optional[AlertAnalysis]:
+        """Analyze one alert; a failure is counted, logged and releases the alert"""
+        try:
+            analysis = await self.analyze(alert)
+        except Exception as e:
+            self.counters["analysis_errors"] += 1
+            logger.error(f"Error analyzing alert in pipeline: {str(e)}")
+            self._release([alert])
+            return None
+        self.counters["analyzed"] += 1
+        return analysis
+
+    async def _forward(self, analysis: AlertAnalysis):
+        await self.storage_queue.put(analysis)
+        await self.broadcast_queue.put(analysis)
+
+    async def _analysis_worker(self):
+        while True:
+            alert = await self.alert_queue.get()
+            try:
+                analysis = await self._analyze_one(alert)
+                if analysis is not None:
+                    await self._forward(analysis)
+            finally:
+                self.alert_queue.task_done()
+
+    async def _batch_analysis_worker(self):
+        while True:
+            # Wait for one alert, then take whatever else is already queued
+            alerts = [await self.alert_queue.get()]
+            while len(alerts) < self.analysis_batch_size and not self.alert_queue.empty():
+                alerts.append(self.alert_queue.get_nowait())
+            try:
+                try:
+                    analyses = await self.analyze_batch(alerts)
+                    self.counters["analyzed"] += len(analyses)
+                    self.counters["analysis_batches"] += 1
+                except Exception as e:
+                    # One bad alert or a failed request should not cost the whole batch
+                    self.counters["analysis_batch_errors"] += 1
+                    logger.error(f"Error analyzing alert batch in pipeline, analyzing its alerts one at a time: {str(e)}")
+                    analyses = await asyncio.gather(*(self._analyze_one(alert) for alert in alerts))
+                for analysis in analyses:
+                    if analysis is not None:
+                        await self._forward(analysis)
+            finally:
+                for _ in alerts:
+                    self.alert_queue.task_done()
+
+    async def _stage_worker(self, queue: asyncio.Queue,
+                            handler: Callable[[AlertAnalysis], Awaitable[Any]],
+                            counter: str, error_counter: str, release_failed: bool = False):
+        while True:
+            analysis = await queue.get()
+            try:
+                await handler(analysis)
+                self.counters[counter] += 1
+            except Exception as e:
+                self.counters[error_counter] += 1
+                logger.error(f"Error in alert pipeline {error_counter.split('_')[0]} stage: {str(e)}")
+                if release_failed:
+                    self._release([analysis.alert])
+            finally:
+                queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, queue depths and configuration for monitoring"""
+        return {
+            **self.counters,
+            "overflow_policy": self.overflow_policy,
+            "workers": dict(self.worker_counts),
+            "analysis_batch_size": self.analysis_batch_size if self.analyze_batch else 1,
+            "queue_capacity": self.queue_size,
+            "queue_depth": {
+                "alerts": self.alert_queue.qsize() if self.alert_queue else 0,
+                "storage": self.storage_queue.qsize() if self.storage_queue else 0,
+                "broadcast": self.broadcast_queue.qsize() if self.broadcast_queue else 0
+            }
+        }
@@ -0,0 +1,231 @@
+import socket
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.snort import SnortAlert
+from snort.parser import AlertParser, alert_id, default_parser, pack_ipv4, parse_port, parse_priority, resolve_token
+
+EPOCH = datetime(1970, 1, 1)
+US_PER_DAY = 86400000000
+
+def unpack_ipv4(value: int) -> str:
+    """Inverse of :func:`pack_ipv4`"""
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+def epoch_us_to_datetime(value: int) -> datetime:
+    """Convert epoch microseconds back to the naive datetime the parser would produce"""
+    return EPOCH + timedelta(microseconds=value)
+
+class AlertColumns:
+    """
+    Column-oriented view of a block of parsed alerts.
+
+    Numeric fields are stored in typed arrays and low-cardinality strings are
+    interned, so a batch costs a handful of allocations per line instead of a
+    validated pydantic model. Timestamps are naive epoch microseconds, the
+    precision Snort logs (it does not log a timezone; Elasticsearch treats
+    naive dates as UTC, and so do we). ``SnortAlert`` objects are only built
+    on demand via :meth:`alert`.
+
+    ``source`` names the file the rows were read from and ``offsets`` holds the
+    byte offset of each line (-1 when unknown); both feed the ``alert_id``.
+    """
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.offsets = array('q')
+        self.timestamps = array('q')
+        self.priorities = array('H')
+        self.source_ips = array('I')
+        self.source_ports = array('H')
+        self.destination_ips = array('I')
+        self.destination_ports = array('H')
+        self.protocols: List[str] = []
+        self.classifications: List[str] = []
+        self.alert_types: List[str] = []
+        self.signature_ids: List[str] = []
+        self.messages: List[str] = []
+        self.raw_alerts: List[str] = []
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def extend(self, other: "AlertColumns"):
+        """Append every row of another batch, preserving order"""
+        self.source = self.source or other.source
+        self.offsets.extend(other.offsets)
+        self.timestamps.extend(other.timestamps)
+        self.priorities.extend(other.priorities)
+        self.source_ips.extend(other.source_ips)
+        self.source_ports.extend(other.source_ports)
+        self.destination_ips.extend(other.destination_ips)
+        self.destination_ports.extend(other.destination_ports)
+        self.protocols.extend(other.protocols)
+        self.classifications.extend(other.classifications)
+        self.alert_types.extend(other.alert_types)
+        self.signature_ids.extend(other.signature_ids)
+        self.messages.extend(other.messages)
+        self.raw_alerts.extend(other.raw_alerts)
+        self.rejected += other.rejected
+
+    def document(self, index: int) -> Dict[str, Any]:
+        """Build the Elasticsearch document for one row without pydantic"""
+        offset = self.offsets[index]
+        return {
+            "timestamp": epoch_us_to_datetime(self.timestamps[index]).isoformat(),
+            "alert_type": self.alert_types[index],
+            "priority": self.priorities[index],
+            "protocol": self.protocols[index],
+            "source_ip": unpack_ipv4(self.source_ips[index]),
+            "source_port": self.source_ports[index],
+            "destination_ip": unpack_ipv4(self.destination_ips[index]),
+            "destination_port": self.destination_ports[index],
+            "message": self.messages[index],
+            "classification": self.classifications[index],
+            "signature_id": self.signature_ids[index],
+            "raw_alert": self.raw_alerts[index],
+            "alert_id": alert_id(self.raw_alerts[index], self.source, None if offset < 0 else offset)
+        }
+
+    def documents(self) -> Iterator[Dict[str, Any]]:
+        """Yield an Elasticsearch document for every row"""
+        for index in range(len(self)):
+            yield self.document(index)
+
+    def alert(self, index: int) -> SnortAlert:
+        """Materialise a validated SnortAlert for one row"""
+        document = self.document(index)
+        document["timestamp"] = epoch_us_to_datetime(self.timestamps[index])
+        return SnortAlert(**document)
+
+    def alerts(self) -> Iterator[SnortAlert]:
+        """Lazily materialise a SnortAlert for every row"""
+        for index in range(len(self)):
+            yield self.alert(index)
+
+class DayResolver:
+    """Per-batch cache from ``MM/DD`` to the epoch microseconds of that day's midnight
+
+    Accepts ``str`` or ``bytes`` timestamps alike.
+    """
+
+    def __init__(self, parser: AlertParser):
+        self.fixed_year = parser.year
+        now = datetime.now()
+        self.year = parser.year if parser.year is not None else now.year
+        self.limit_us = (now + timedelta(days=1) - EPOCH) // timedelta(microseconds=1)
+        self.cache: Dict[str, Tuple[int, Optional[int]]] = {}
+
+    def _midnight_us(self, year: int, month: int, day: int) -> Optional[int]:
+        try:
+            return (datetime(year, month, day) - EPOCH).days * US_PER_DAY
+        except ValueError:
+            return None
+
+    def resolve(self, timestamp_str: str) -> Optional[int]:
+        key = timestamp_str[:5]
+        days = self.cache.get(key)
+        if days is None:
+            month, day = int(key[0:2]), int(key[3:5])
+            days = (
+                self._midnight_us(self.year, month, day),
+                None if self.fixed_year is not None else self._midnight_us(self.year - 1, month, day)
+            )
+            self.cache[key] = days
+        current, previous = days
+        if current is None:
+            return None
+        fraction = timestamp_str[15:]
+        value = current + (
+            (int(timestamp_str[6:8]) * 60 + int(timestamp_str[9:11])) * 60 + int(timestamp_str[12:14])
+        ) * 1000000 + int(fraction) * 10 ** (6 - len(fraction))
+        # Mirror AlertParser.resolve_timestamp: far-future dates are last year's
+        if previous is not None and value > self.limit_us:
+            value += previous - current
+        return value
+
+def append_row(columns: AlertColumns, days: DayResolver, timestamp_str, token: str,
+               message: str, classification: Optional[str], priority, protocol: str,
+               source_ip: str, source_port, destination_ip: str, destination_port,
+               raw_alert: str, offset: int = -1) -> bool:
+    """
+    Convert one matched line and append it to ``columns``.
+
+    Timestamp, priority and port values may be ``str`` or ``bytes`` since they
+    are only sliced and passed to ``int``; every other field must already be a
+    ``str``. ``offset`` is the byte offset of the line, if known. Returns
+    False, leaving the columns untouched, for a line
+    :meth:`AlertParser.parse` would reject (invalid date, address, port or
+    priority); every value it accepts fits its column type.
+    """
+    try:
+        timestamp = days.resolve(timestamp_str)
+        if timestamp is None:
+            raise ValueError(f"invalid date {timestamp_str!r}")
+        # Validate every value before appending anything
+        row = (
+            timestamp,
+            parse_priority(priority),
+            pack_ipv4(source_ip),
+            parse_port(source_port),
+            pack_ipv4(destination_ip),
+            parse_port(destination_port)
+        )
+    except ValueError:
+        return False
+
+    intern = sys.intern
+    alert_type, signature_id = resolve_token(token)
+    columns.offsets.append(offset)
+    columns.timestamps.append(row[0])
+    columns.priorities.append(row[1])
+    columns.source_ips.append(row[2])
+    columns.source_ports.append(row[3])
+    columns.destination_ips.append(row[4])
+    columns.destination_ports.append(row[5])
+    columns.protocols.append(intern(protocol))
+    columns.classifications.append(intern(classification or "Unknown"))
+    columns.alert_types.append(intern(alert_type))
+    columns.signature_ids.append(intern(signature_id))
+    columns.messages.append(message.strip())
+    columns.raw_alerts.append(raw_alert)
+    return True
+
+def parse_batch(lines: Iterable[str], parser: Optional[AlertParser] = None,
+                source: str = "") -> AlertColumns:
+    """
+    Parse a block of alert lines into columnar arrays.
+
+    Lines that do not match any format, or whose values do not fit the column
+    types (e.g. an octet above 255), are skipped and counted in ``rejected``.
+    Blank lines are ignored without being counted.
+
+    Args:
+        lines: Alert lines, with or without trailing newlines
+        parser: Parsing engine to use; defaults to the shared module-level engine
+        source: File the lines came from, recorded for alert IDs
+
+    Returns:
+        AlertColumns holding one row per parsed alert
+    """
+    parser = parser or default_parser
+    columns = AlertColumns(source)
+    days = DayResolver(parser)
+    match_line = parser.match
+
+    for line in lines:
+        match = match_line(line)
+        if not match:
+            if line.strip():
+                columns.rejected += 1
+            continue
+
+        if not append_row(columns, days, *match.group(
+            'timestamp', 'token', 'message', 'classification', 'priority',
+            'protocol', 'source_ip', 'source_port', 'destination_ip', 'destination_port'
+        ), line.strip()):
+            columns.rejected += 1
+
+    return columns
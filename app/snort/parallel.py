@@ -0,0 +1,69 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from snort.batch import AlertColumns
+from snort.parser import AlertParser, default_parser
+from snort.reader import iter_mmap_batches
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+def split_file(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split a file into ``(start, end)`` byte ranges that end on newline boundaries.
+
+    Every range except possibly the last ends just after a ``\\n``, so no line is
+    ever split between two chunks.
+    """
+    file_size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, 'rb') as f:
+        start = 0
+        while start < file_size:
+            end = min(start + chunk_size, file_size)
+            if end < file_size:
+                f.seek(end)
+                # Extend the chunk to the end of the line it stops in
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def parse_file_range(file_path: str, start: int, end: int,
+                     parser: Optional[AlertParser] = None) -> AlertColumns:
+    """Parse the lines within one byte range of an alert file"""
+    columns = AlertColumns()
+    for batch in iter_mmap_batches(file_path, None, start, end, parser):
+        columns.extend(batch)
+    return columns
+
+def iter_parallel_batches(file_path: str, workers: int = None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          parser: Optional[AlertParser] = None) -> Iterator[AlertColumns]:
+    """
+    Parse an alert file in a process pool, yielding one batch per chunk in file order.
+
+    At most ``2 * workers`` chunks are in flight at a time, so memory use stays
+    bounded even when the consumer (e.g. a bulk indexer) is slower than parsing.
+
+    Args:
+        file_path: Path to the alert file
+        workers: Number of worker processes; defaults to the CPU count
+        chunk_size: Approximate number of bytes parsed per task
+        parser: Parsing engine to use in every worker; must be picklable
+
+    Yields:
+        AlertColumns for each chunk, in the order the chunks appear in the file
+    """
+    workers = workers or os.cpu_count() or 1
+    parser = parser or default_parser
+    ranges = deque(split_file(file_path, chunk_size))
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while ranges or pending:
+            while ranges and len(pending) < workers * 2:
+                start, end = ranges.popleft()
+                pending.append(executor.submit(parse_file_range, file_path, start, end, parser))
+            yield pending.popleft().result()
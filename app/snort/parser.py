@@ -1,79 +1,286 @@
+import hashlib
+import logging
 import re
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import List, Match, NamedTuple, Optional, Pattern, Tuple
 from models.snort import SnortAlert
 
-def parse_alert_line(line: str) -> Optional[SnortAlert]:
+logger = logging.getLogger(__name__)
+
+class AlertFormat(NamedTuple):
+    """A named alert-line grammar understood by :class:`AlertParser`.
+
+    Patterns must define the groups ``timestamp``, ``token``, ``message``,
+    ``classification``, ``priority``, ``protocol``, ``source_ip``,
+    ``source_port``, ``destination_ip`` and ``destination_port``. The timestamp
+    group is always ``MM/DD-HH:MM:SS`` followed by a fractional part.
     """
-    Parse a line from a Snort alert file into a SnortAlert object.
-    
-    Example alert line format:
-    [03/20-10:00:00.123] [**] [FAILED] Failed to process packet: Invalid packet length [**] [Classification: Snort Error] [Priority: 1] TCP 192.168.1.1:54321 -> 10.0.0.1:443
-    
+    name: str
+    pattern: Pattern
+
+# Format written by scripts/generate_test_alerts.py:
+# [03/20-10:00:00.123] [**] [FAILED] Failed to process packet [**] [Classification: Snort Error] [Priority: 1] TCP 192.168.1.1:54321 -> 10.0.0.1:443
+SNORTAI_FORMAT = AlertFormat(
+    name="snortai",
+    pattern=re.compile(
+        r'\s*\[(?P<timestamp>\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{1,6})\]'
+        r'\s+\[\*\*\] \[(?P<token>[^\]]+)\] (?P<message>.+?) \[\*\*\]'
+        r'(?: \[Classification: (?P<classification>.+?)\])?'
+        r'(?: \[Priority: (?P<priority>\d+)\])?'
+        r' (?P<protocol>\w+)'
+        r' (?P<source_ip>\d+\.\d+\.\d+\.\d+):(?P<source_port>\d+)'
+        r' -> (?P<destination_ip>\d+\.\d+\.\d+\.\d+):(?P<destination_port>\d+)'
+    )
+)
+
+# Native Snort "alert_fast" output:
+# 03/20-10:00:00.123456  [**] [1:1000001:0] Possible TCP scan [**] [Classification: Misc activity] [Priority: 2] {TCP} 192.168.1.100:12345 -> 192.168.1.200:80
+SNORT_FAST_FORMAT = AlertFormat(
+    name="snort-fast",
+    pattern=re.compile(
+        r'\s*(?P<timestamp>\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{1,6})'
+        r'\s+\[\*\*\] \[(?P<token>[^\]]+)\] (?P<message>.+?) \[\*\*\]'
+        r'(?: \[Classification: (?P<classification>.+?)\])?'
+        r'(?: \[Priority: (?P<priority>\d+)\])?'
+        r' \{(?P<protocol>\w+)\}'
+        r' (?P<source_ip>\d+\.\d+\.\d+\.\d+):(?P<source_port>\d+)'
+        r' -> (?P<destination_ip>\d+\.\d+\.\d+\.\d+):(?P<destination_port>\d+)'
+    )
+)
+
+DEFAULT_FORMATS = (SNORTAI_FORMAT, SNORT_FAST_FORMAT)
+
+SIGNATURE_ID_PATTERN = re.compile(r'\d+:\d+:\d+$')
+
+def parse_timestamp(timestamp_str: str, year: int = 1900) -> datetime:
+    """
+    Decode a Snort ``MM/DD-HH:MM:SS.fff`` timestamp by fixed offsets.
+
+    The grammar has already validated the layout, so slicing is both safe and
+    considerably cheaper than ``datetime.strptime``. The fractional part may
+    carry 1 to 6 digits.
+    """
+    fraction = timestamp_str[15:]
+    return datetime(
+        year,
+        int(timestamp_str[0:2]),
+        int(timestamp_str[3:5]),
+        int(timestamp_str[6:8]),
+        int(timestamp_str[9:11]),
+        int(timestamp_str[12:14]),
+        int(fraction) * 10 ** (6 - len(fraction))
+    )
+
+def pack_ipv4(ip: str) -> int:
+    """
+    Pack a dotted-quad IPv4 address into an unsigned 32-bit integer.
+
+    The grammars only check the dotted-quad shape; this is where octets are
+    validated, raising ValueError for one above 255. Every ingest path goes
+    through it, so live and bulk parsing accept exactly the same addresses.
+    """
+    value = 0
+    for octet in ip.split('.'):
+        octet = int(octet)
+        if octet > 255:
+            raise ValueError(f"invalid IPv4 address {ip!r}")
+        value = value << 8 | octet
+    return value
+
+# Largest TCP/UDP port; the columnar path also stores priorities in 16 bits
+MAX_PORT = 0xFFFF
+MAX_PRIORITY = 0xFFFF
+
+def parse_port(value) -> int:
+    """Port from a ``str`` or ``bytes`` group; ValueError above ``MAX_PORT``"""
+    port = int(value)
+    if port > MAX_PORT:
+        raise ValueError(f"invalid port {port}")
+    return port
+
+def parse_priority(value) -> int:
+    """Priority from an optional ``str`` or ``bytes`` group (0 if missing); ValueError above ``MAX_PRIORITY``"""
+    priority = int(value) if value else 0
+    if priority > MAX_PRIORITY:
+        raise ValueError(f"invalid priority {priority}")
+    return priority
+
+def to_bytes_pattern(pattern: Pattern) -> Pattern:
+    """Compile the bytes equivalent of an ASCII-only str pattern"""
+    return re.compile(pattern.pattern.encode('ascii'), pattern.flags & ~re.UNICODE)
+
+def resolve_token(token: str) -> Tuple[str, str]:
+    """
+    Map the bracketed token after ``[**]`` to ``(alert_type, signature_id)``.
+
+    Native Snort writes ``gid:sid:rev`` there, which becomes the signature ID
+    of a generic ``ALERT``. The SnortAI format writes an alert type instead;
+    ``FAILED`` alerts get the ``0:0:0`` signature and every other type doubles
+    as its own signature ID.
+    """
+    if SIGNATURE_ID_PATTERN.match(token):
+        return "ALERT", token
+    return token, "0:0:0" if token == "FAILED" else token
+
+def alert_id(raw_alert: str, source: str = "", offset: Optional[int] = None) -> str:
+    """
+    Derive a stable document ID for an alert line.
+
+    The ID hashes the stripped line together with the file it was read from
+    and the byte offset of the line, so re-reading the same file yields the
+    same IDs while identical lines at different positions stay distinct.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{source}\0{'' if offset is None else offset}\0".encode('utf-8'))
+    digest.update(raw_alert.encode('utf-8', errors='replace'))
+    return digest.hexdigest()
+
+class AlertParser:
+    """
+    Pluggable alert-line parsing engine shared by every ingest path.
+
+    Formats are tried in order, starting with whichever one matched the previous
+    line, so a homogeneous file costs a single anchored match per line.
+
     Args:
-        line: A line from the Snort alert file
-        
-    Returns:
-        SnortAlert object if parsing successful, None otherwise
+        formats: Alert formats to recognise, in priority order
+        year: Fixed year for parsed timestamps. When omitted, the current year is
+            used and timestamps more than a day in the future are assumed to
+            belong to the previous year (e.g. December alerts read in January).
     """
-    try:
-        # Skip empty lines
-        if not line.strip():
-            return None
-            
-        # Extract timestamp
-        timestamp_match = re.search(r'\[(\d{2}/\d{2}-\d{2}:\d{2}:\d{2}\.\d{3})\]', line)
-        if not timestamp_match:
-            return None
-            
-        # Parse timestamp
-        timestamp_str = timestamp_match.group(1)
-        timestamp = datetime.strptime(timestamp_str, '%m/%d-%H:%M:%S.%f')
-        
-        # Extract alert type and message
-        alert_match = re.search(r'\[\*\*\] \[([^\]]+)\] (.+?) \[\*\*\]', line)
-        if not alert_match:
+
+    def __init__(self, formats: Optional[List[AlertFormat]] = None, year: Optional[int] = None):
+        self.formats: List[AlertFormat] = list(formats or DEFAULT_FORMATS)
+        self.year = year
+        self._last_format = self.formats[0] if self.formats else None
+        self._bytes_patterns = [to_bytes_pattern(f.pattern) for f in self.formats]
+        self._last_bytes_pattern = self._bytes_patterns[0] if self._bytes_patterns else None
+
+    def register_format(self, alert_format: AlertFormat, first: bool = False):
+        """Add an alert format, optionally ahead of the existing ones"""
+        bytes_pattern = to_bytes_pattern(alert_format.pattern)
+        if first:
+            self.formats.insert(0, alert_format)
+            self._bytes_patterns.insert(0, bytes_pattern)
+        else:
+            self.formats.append(alert_format)
+            self._bytes_patterns.append(bytes_pattern)
+        if self._last_format is None:
+            self._last_format = alert_format
+            self._last_bytes_pattern = bytes_pattern
+
+    def match(self, line: str) -> Optional[Match]:
+        """Return the grammar match for a line, or None if no format applies"""
+        last_format = self._last_format
+        if last_format is not None:
+            match = last_format.pattern.match(line)
+            if match:
+                return match
+        for alert_format in self.formats:
+            if alert_format is last_format:
+                continue
+            match = alert_format.pattern.match(line)
+            if match:
+                self._last_format = alert_format
+                return match
+        return None
+
+    def match_bytes(self, buffer, pos: int, endpos: int) -> Optional[Match]:
+        """
+        Match the line at ``buffer[pos:endpos]`` without copying or decoding it.
+
+        ``buffer`` may be any bytes-like object, including an ``mmap``; groups
+        of the returned match are ``bytes``.
+        """
+        last_pattern = self._last_bytes_pattern
+        if last_pattern is not None:
+            match = last_pattern.match(buffer, pos, endpos)
+            if match:
+                return match
+        for pattern in self._bytes_patterns:
+            if pattern is last_pattern:
+                continue
+            match = pattern.match(buffer, pos, endpos)
+            if match:
+                self._last_bytes_pattern = pattern
+                return match
+        return None
+
+    def resolve_timestamp(self, timestamp_str: str) -> datetime:
+        """Decode a timestamp, supplying the year Snort leaves out"""
+        if self.year is not None:
+            return parse_timestamp(timestamp_str, self.year)
+        now = datetime.now()
+        timestamp = parse_timestamp(timestamp_str, now.year)
+        if timestamp > now + timedelta(days=1):
+            timestamp = timestamp.replace(year=now.year - 1)
+        return timestamp
+
+    def parse(self, line: str, source: str = "", offset: Optional[int] = None) -> Optional[SnortAlert]:
+        """
+        Parse one alert line into a SnortAlert, or None if it does not match,
+        an address has an octet above 255, a port or the priority is above
+        65535 or the date does not exist (such as ``13/45`` or ``02/29``
+        outside a leap year). :func:`snort.batch.append_row` applies the same
+        checks, so the columnar path accepts exactly the same lines.
+
+        ``source`` and ``offset`` identify where the line was read from and
+        feed into its ``alert_id``.
+        """
+        match = self.match(line)
+        if not match:
             return None
-            
-        alert_type = alert_match.group(1)
-        message = alert_match.group(2).strip()
-        
-        # Extract classification and priority
-        class_match = re.search(r'\[Classification: (.+?)\]', line)
-        priority_match = re.search(r'\[Priority: (\d+)\]', line)
-        
-        classification = class_match.group(1) if class_match else "Unknown"
-        priority = int(priority_match.group(1)) if priority_match else 0
-        
-        # Extract protocol and IP addresses
-        ip_match = re.search(r'(\w+) (\d+\.\d+\.\d+\.\d+):(\d+) -> (\d+\.\d+\.\d+\.\d+):(\d+)', line)
-        if not ip_match:
+
+        (timestamp_str, token, message, classification, priority,
+         protocol, source_ip, source_port, destination_ip, destination_port) = match.group(
+            'timestamp', 'token', 'message', 'classification', 'priority',
+            'protocol', 'source_ip', 'source_port', 'destination_ip', 'destination_port'
+        )
+        try:
+            pack_ipv4(source_ip)
+            pack_ipv4(destination_ip)
+            source_port, destination_port = parse_port(source_port), parse_port(destination_port)
+            priority = parse_priority(priority)
+            timestamp = self.resolve_timestamp(timestamp_str)
+        except ValueError:
             return None
-            
-        protocol = ip_match.group(1)
-        source_ip = ip_match.group(2)
-        source_port = int(ip_match.group(3))
-        destination_ip = ip_match.group(4)
-        destination_port = int(ip_match.group(5))
-        
-        # Generate signature ID for failed alerts
-        signature_id = f"0:0:0" if alert_type == "FAILED" else alert_type
-        
+        alert_type, signature_id = resolve_token(token)
+        raw_alert = line.strip()
+
         return SnortAlert(
-            timestamp=timestamp.isoformat(),
+            timestamp=timestamp,
             alert_type=alert_type,
             priority=priority,
-            message=message,
+            message=message.strip(),
             source_ip=source_ip,
             source_port=source_port,
             destination_ip=destination_ip,
             destination_port=destination_port,
             protocol=protocol,
-            classification=classification,
+            classification=classification or "Unknown",
             signature_id=signature_id,
-            raw_alert=line.strip()
+            raw_alert=raw_alert,
+            alert_id=alert_id(raw_alert, source, offset)
         )
+
+default_parser = AlertParser()
+
+def parse_alert_line(line: str, parser: Optional[AlertParser] = None) -> Optional[SnortAlert]:
+    """
+    Parse a line from a Snort alert file into a SnortAlert object.
+    
+    Example alert line format:
+    [03/20-10:00:00.123] [**] [FAILED] Failed to process packet: Invalid packet length [**] [Classification: Snort Error] [Priority: 1] TCP 192.168.1.1:54321 -> 10.0.0.1:443
+    
+    Args:
+        line: A line from the Snort alert file
+        parser: Parsing engine to use; defaults to the shared module-level engine
         
+    Returns:
+        SnortAlert object if parsing successful, None otherwise
+    """
+    try:
+        return (parser or default_parser).parse(line)
     except Exception as e:
-        print(f"Error parsing alert line: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.error(f"Error parsing alert line: {str(e)}")
+        return None
@@ -1,109 +1,119 @@
-import re
-from datetime import datetime
 from typing import Optional, List
+import asyncio
 import logging
 from models.snort import SnortAlert
+from snort.parser import AlertParser, default_parser
+from snort.parallel import iter_parallel_batches
+from snort.reader import iter_mmap_batches
+from snort.tail import AlertFileTailer, TailCheckpoint
 from config import get_settings
 import os
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Backoff before following the alert file again after a read error
+MONITOR_RETRY_INITIAL = 1.0
+MONITOR_RETRY_MAX = 60.0
+
 # Change the alert file path to use a path in the user's home directory
 alert_file = os.path.expanduser("~/snort_test/alert")
 
 class SnortAlertProcessor:
-    def __init__(self):
-        self.alert_pattern = re.compile(
-            r'\[(?P<timestamp>.*?)\] \[(?P<signature_id>.*?)\] (?P<message>.*?) \[Classification: (?P<classification>.*?)\] \[Priority: (?P<priority>\d+)\]'
-        )
-        self.packet_pattern = re.compile(
-            r'(?P<protocol>TCP|UDP|ICMP) (?P<source_ip>[\d\.]+):(?P<source_port>\d+) -> (?P<destination_ip>[\d\.]+):(?P<destination_port>\d+)'
-        )
-
-    def parse_alert(self, alert_line: str) -> Optional[SnortAlert]:
-        """Parse a single Snort alert line into a SnortAlert object"""
-        try:
-            # Extract alert information
-            alert_match = self.alert_pattern.search(alert_line)
-            if not alert_match:
-                logger.warning(f"Could not parse alert line: {alert_line}")
-                return None
+    def __init__(self, parser: Optional[AlertParser] = None):
+        self.parser = parser or default_parser
+        self.tailer: Optional[AlertFileTailer] = None
 
-            # Extract packet information
-            packet_match = self.packet_pattern.search(alert_line)
-            if not packet_match:
-                logger.warning(f"Could not parse packet information: {alert_line}")
-                return None
+    def parse_alert(self, alert_line: str, source: str = "", offset: Optional[int] = None) -> Optional[SnortAlert]:
+        """Parse a single Snort alert line into a SnortAlert object
 
-            # Parse timestamp
-            timestamp_str = alert_match.group('timestamp')
-            try:
-                timestamp = datetime.strptime(timestamp_str, '%m/%d-%H:%M:%S.%f')
-                # Add current year since Snort doesn't include it
-                timestamp = timestamp.replace(year=datetime.now().year)
-            except ValueError:
-                logger.warning(f"Could not parse timestamp: {timestamp_str}")
-                return None
-
-            # Create SnortAlert object
-            return SnortAlert(
-                timestamp=timestamp,
-                alert_type=alert_match.group('message').split(']')[0].strip(),
-                priority=int(alert_match.group('priority')),
-                protocol=packet_match.group('protocol'),
-                source_ip=packet_match.group('source_ip'),
-                source_port=int(packet_match.group('source_port')),
-                destination_ip=packet_match.group('destination_ip'),
-                destination_port=int(packet_match.group('destination_port')),
-                message=alert_match.group('message'),
-                classification=alert_match.group('classification'),
-                signature_id=alert_match.group('signature_id'),
-                raw_alert=alert_line
-            )
+        ``source`` and ``offset`` locate the line in its file and make the
+        alert's ``alert_id`` stable across re-reads.
+        """
+        try:
+            alert = self.parser.parse(alert_line, source, offset)
+            if alert is None and alert_line.strip():
+                logger.warning(f"Could not parse alert line: {alert_line}")
+            return alert
 
         except Exception as e:
             logger.error(f"Error parsing alert: {str(e)}")
             return None
 
-    async def process_alert_file(self, file_path: str = None) -> List[SnortAlert]:
-        """Process a Snort alert file and return a list of parsed alerts"""
+    async def process_alert_file(self, file_path: str = None, workers: int = 1) -> List[SnortAlert]:
+        """Process a Snort alert file and return a list of parsed alerts
+
+        The file is memory-mapped and parsed in columnar batches. With
+        ``workers > 1`` it is also split at line boundaries and parsed in a
+        process pool; alerts are still returned in file order.
+        """
         if file_path is None:
             file_path = settings.snort_alert_file
 
         alerts = []
+        rejected = 0
         try:
-            with open(file_path, 'r') as f:
-                for line in f:
-                    alert = self.parse_alert(line.strip())
-                    if alert:
-                        alerts.append(alert)
+            if workers > 1:
+                batches = iter_parallel_batches(file_path, workers, parser=self.parser)
+            else:
+                batches = iter_mmap_batches(file_path, parser=self.parser)
+            for columns in batches:
+                rejected += columns.rejected
+                alerts.extend(columns.alerts())
+            if rejected:
+                logger.warning(f"Skipped {rejected} unparseable lines in {file_path}")
         except Exception as e:
             logger.error(f"Error processing alert file: {str(e)}")
 
         return alerts
 
-    async def monitor_alert_file(self, callback):
-        """Monitor the Snort alert file for new alerts and call the callback function"""
-        import asyncio
-        import time
-
-        last_position = 0
+    def release_alerts(self, alert_ids: List[str]):
+        """Let the tail checkpoint move past alerts that are fully processed"""
+        if self.tailer is not None:
+            self.tailer.release(alert_ids)
+
+    async def monitor_alert_file(self, callback, hold_until_released: bool = False):
+        """Monitor the Snort alert file for new alerts and call the callback function
+
+        Wakes on inotify write events where available, and otherwise polls with
+        adaptive backoff. Rotation and truncation are followed, and the position
+        is checkpointed so a restart resumes where the previous run stopped.
+        Read errors (permissions, I/O, network filesystems) are logged and the
+        file is followed again after a backoff, from the last position handed
+        out.
+
+        By default a batch counts as processed once the callback returns. With
+        ``hold_until_released`` the checkpoint stays before each alert until it
+        is passed to :meth:`release_alerts`, so alerts still queued, being
+        analyzed or waiting for a bulk write are read again after a crash. If
+        the callback raises, the alerts of that batch are released at once.
+        """
+        checkpoint = TailCheckpoint(settings.snort_checkpoint_file) if settings.snort_checkpoint_file else None
+        tailer = self.tailer = AlertFileTailer(settings.snort_alert_file, checkpoint)
+        source = os.path.abspath(settings.snort_alert_file)
+        delay = MONITOR_RETRY_INITIAL
         while True:
             try:
-                with open(settings.snort_alert_file, 'r') as f:
-                    f.seek(last_position)
+                async for lines in tailer.follow():
+                    delay = MONITOR_RETRY_INITIAL
                     new_alerts = []
-                    for line in f:
-                        alert = self.parse_alert(line.strip())
-                        if alert:
-                            new_alerts.append(alert)
-                    last_position = f.tell()
-
-                    if new_alerts:
-                        await callback(new_alerts)
-
-            except Exception as e:
-                logger.error(f"Error monitoring alert file: {str(e)}")
-
-            await asyncio.sleep(1)  # Check for new alerts every second 
\ No newline at end of file
+                    try:
+                        for offset, line in lines:
+                            alert = self.parse_alert(line.strip(), source, offset)
+                            if alert:
+                                new_alerts.append(alert)
+                                if hold_until_released:
+                                    tailer.hold(alert.alert_id, offset)
+
+                        if new_alerts:
+                            await callback(new_alerts)
+
+                    except Exception as e:
+                        logger.error(f"Error monitoring alert file: {str(e)}")
+                        if hold_until_released:
+                            # Nothing will acknowledge this batch; keep the checkpoint moving
+                            self.release_alerts([alert.alert_id for alert in new_alerts])
+            except OSError as e:
+                logger.error(f"Error reading alert file {settings.snort_alert_file}, retrying in {delay:.0f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MONITOR_RETRY_MAX)
@@ -0,0 +1,118 @@
+import mmap
+import os
+from typing import Iterator, Optional, Tuple
+from snort.batch import AlertColumns, DayResolver, append_row
+from snort.parser import AlertParser, default_parser
+
+def _release_pages(buffer: mmap.mmap, start: int, end: int):
+    """Drop already-parsed pages from the process's resident set"""
+    if not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    start -= start % mmap.PAGESIZE
+    length = end - start
+    length -= length % mmap.PAGESIZE
+    if length > 0:
+        buffer.madvise(mmap.MADV_DONTNEED, start, length)
+
+def parse_buffer(buffer, start: int, end: int, parser: Optional[AlertParser] = None,
+                 max_lines: Optional[int] = None,
+                 days: Optional[DayResolver] = None,
+                 source: str = "") -> Tuple[AlertColumns, int]:
+    """
+    Parse alert lines directly from a bytes-like buffer.
+
+    Lines are located by scanning for newline offsets and matched in place with
+    the parser's bytes grammars; only the captured fields of matching lines are
+    decoded, never the buffer as a whole.
+
+    Args:
+        buffer: Bytes-like object, typically an ``mmap`` of the alert file
+        start: Offset of the first line to parse
+        end: Offset just past the last byte to parse
+        parser: Parsing engine to use; defaults to the shared module-level engine
+        max_lines: Stop after this many lines (parsed or not); None for no limit
+        days: Day resolver to reuse across calls on the same file
+        source: File the buffer maps, recorded with line offsets for alert IDs
+
+    Returns:
+        The parsed columns and the offset where parsing stopped
+    """
+    parser = parser or default_parser
+    days = days or DayResolver(parser)
+    columns = AlertColumns(source)
+    match_bytes = parser.match_bytes
+    find = buffer.find
+    pos = start
+    lines = 0
+
+    while pos < end and (max_lines is None or lines < max_lines):
+        newline = find(b'\n', pos, end)
+        line_end = end if newline == -1 else newline
+        lines += 1
+
+        match = match_bytes(buffer, pos, line_end)
+        if match:
+            (timestamp, token, message, classification, priority,
+             protocol, source_ip, source_port, destination_ip, destination_port) = match.group(
+                'timestamp', 'token', 'message', 'classification', 'priority',
+                'protocol', 'source_ip', 'source_port', 'destination_ip', 'destination_port'
+            )
+            if not append_row(
+                columns, days, timestamp,
+                token.decode('utf-8', errors='replace'),
+                message.decode('utf-8', errors='replace'),
+                classification.decode('utf-8', errors='replace') if classification else None,
+                priority,
+                protocol.decode('ascii'),
+                source_ip.decode('ascii'),
+                source_port,
+                destination_ip.decode('ascii'),
+                destination_port,
+                buffer[pos:line_end].decode('utf-8', errors='replace').strip(),
+                pos
+            ):
+                columns.rejected += 1
+        elif buffer[pos:line_end].strip():
+            columns.rejected += 1
+
+        pos = line_end + 1
+
+    return columns, min(pos, end)
+
+def iter_mmap_batches(file_path: str, batch_size: Optional[int] = 10000, start: int = 0,
+                      end: Optional[int] = None,
+                      parser: Optional[AlertParser] = None) -> Iterator[AlertColumns]:
+    """
+    Parse an alert file through a read-only memory map, one batch at a time.
+
+    Pages are released once their lines have been parsed, so resident memory
+    stays roughly constant regardless of file size.
+
+    Args:
+        file_path: Path to the alert file
+        batch_size: Lines per yielded batch; None yields the whole range at once
+        start: Byte offset to start from; must be at a line boundary
+        end: Byte offset to stop at; defaults to the end of the file
+        parser: Parsing engine to use; defaults to the shared module-level engine
+
+    Yields:
+        AlertColumns for each batch, in file order
+    """
+    file_size = os.path.getsize(file_path)
+    end = file_size if end is None else min(end, file_size)
+    if start >= end:
+        return
+
+    parser = parser or default_parser
+    days = DayResolver(parser)
+    source = os.path.abspath(file_path)
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+            pos = start
+            while pos < end:
+                columns, next_pos = parse_buffer(buffer, pos, end, parser, batch_size, days, source)
+                _release_pages(buffer, pos, next_pos)
+                pos = next_pos
+                yield columns
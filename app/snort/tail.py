@@ -0,0 +1,382 @@
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import struct
+import sys
+from collections import OrderedDict
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """
+    Wakes when a file in a watched directory changes, using Linux inotify.
+
+    The parent directory is watched rather than the file itself so that
+    creation, replacement and deletion of the file are seen as well as writes.
+    """
+
+    def __init__(self, file_path: str):
+        self.directory = os.path.dirname(os.path.abspath(file_path))
+        self.name = os.fsencode(os.path.basename(file_path))
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {self.directory}")
+
+    def _drain(self) -> bool:
+        """Consume pending events; return True if any concern the watched file"""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + name_length].rstrip(b'\0')
+                offset += name_length
+                if name == self.name or mask & IN_Q_OVERFLOW:
+                    relevant = True
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for a change; return True if one occurred"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            ready = loop.create_future()
+            loop.add_reader(self.fd, lambda: ready.done() or ready.set_result(None))
+            try:
+                await asyncio.wait_for(ready, remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                loop.remove_reader(self.fd)
+            if self._drain():
+                return True
+
+    def activity(self):
+        """Inotify needs no hint about observed activity"""
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Portable fallback that polls with adaptive backoff.
+
+    The interval starts at ``min_interval`` after any activity and doubles on
+    every idle poll up to ``max_interval``, so bursts are followed closely while
+    an idle file costs almost nothing.
+    """
+
+    def __init__(self, min_interval: float = 0.05, max_interval: float = 1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+    async def wait(self, timeout: float) -> bool:
+        await asyncio.sleep(min(self.interval, timeout))
+        self.interval = min(self.interval * 2, self.max_interval)
+        return True
+
+    def activity(self):
+        self.interval = self.min_interval
+
+    def close(self):
+        pass
+
+def create_watcher(file_path: str, min_interval: float = 0.05, max_interval: float = 1.0):
+    """Return an inotify watcher where supported, falling back to adaptive polling"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(file_path)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable, falling back to polling: {str(e)}")
+    return PollingWatcher(min_interval, max_interval)
+
+class TailCheckpoint:
+    """
+    Persists the tail position of a file as ``(device, inode, offset)``.
+
+    Writes go to a temporary file that is atomically renamed over the
+    checkpoint, so a crash never leaves a torn checkpoint behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+
+    def load(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return int(data["device"]), int(data["inode"]), int(data["offset"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable tail checkpoint {self.path}: {str(e)}")
+            return None
+
+    def save(self, device: int, inode: int, offset: int):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"device": device, "inode": inode, "offset": offset}, f)
+        os.replace(tmp_path, self.path)
+
+class AlertFileTailer:
+    """
+    Follows an alert file and yields newly appended complete lines.
+
+    A trailing partial line is held back until its newline is written, so a
+    line is never parsed half-written. Rotation (the path now names a different
+    inode) and truncation (the file shrank below the read position) are
+    detected whenever the open file is at EOF; a rotated file is drained to the
+    end before the new one is followed from its start.
+
+    With a checkpoint, the position of the last line handed to the consumer is
+    persisted after the consumer asks for the next batch, and a restart resumes
+    from there. A consumer that finishes lines later (e.g. once they are
+    stored) calls :meth:`hold` for them before asking for the next batch and
+    :meth:`release` when they are done; the checkpoint then never passes the
+    oldest line still held, so a crash replays it instead of losing it.
+    Lines are held against the file they were read from, even when it was
+    rotated away as they were read. If the file was rotated in the meantime,
+    the rest of the checkpointed inode is drained from its rotated name (a
+    sibling such as ``alert.1``) before the new file is read from its start.
+
+    Args:
+        file_path: Path to the alert file
+        checkpoint: Where to persist the tail position, if anywhere
+        min_poll_interval: Shortest polling interval when inotify is unavailable
+        max_poll_interval: Longest polling interval, and the safety re-check
+            interval when inotify is in use
+        max_read_bytes: Upper bound on the bytes read per batch
+    """
+
+    def __init__(self, file_path: str, checkpoint: Optional[TailCheckpoint] = None,
+                 min_poll_interval: float = 0.05, max_poll_interval: float = 1.0,
+                 max_read_bytes: int = 1024 * 1024):
+        self.file_path = file_path
+        self.checkpoint = checkpoint
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_read_bytes = max_read_bytes
+        self.position = 0
+        self._file = None
+        self._identity: Optional[Tuple[int, int]] = None
+        # File the last lines were read from; after a rotation that is not the open file
+        self._source: Optional[Tuple[int, int]] = None
+        self._partial = b''
+        self._resume = checkpoint.load() if checkpoint else None
+        # Held lines in the order handed out, so the first is the oldest
+        self._held: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+        self._handled: Optional[Tuple[int, int, int]] = None
+        self._saved: Optional[Tuple[int, int, int]] = None
+
+    @property
+    def offset(self) -> int:
+        """Offset just past the last complete line handed out"""
+        return self.position - len(self._partial)
+
+    def _rotated_path(self, device: int, inode: int) -> Optional[str]:
+        """Find where a checkpointed inode was rotated to (``alert.1``, ``alert-20240320``, ...)"""
+        directory, name = os.path.split(os.path.abspath(self.file_path))
+        try:
+            candidates = sorted(entry for entry in os.listdir(directory) if entry.startswith(name) and entry != name)
+        except OSError:
+            return None
+        for candidate in candidates:
+            path = os.path.join(directory, candidate)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) == (device, inode):
+                return path
+        return None
+
+    def _open(self) -> bool:
+        if self._file is not None:
+            return True
+        path = self.file_path
+        if self._resume is not None:
+            # Rotated while we were away: finish the old file before the new one
+            try:
+                stat = os.stat(self.file_path)
+                moved = (stat.st_dev, stat.st_ino) != self._resume[:2]
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                path = self._rotated_path(*self._resume[:2]) or self.file_path
+        try:
+            self._file = open(path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        self.position = 0
+        self._partial = b''
+
+        if self._resume is not None:
+            device, inode, offset = self._resume
+            self._resume = None
+            if (device, inode) == self._identity and offset <= stat.st_size:
+                self.position = offset
+                if path == self.file_path:
+                    logger.info(f"Resuming {self.file_path} at offset {offset}")
+                else:
+                    logger.info(f"{self.file_path} was rotated to {path}; draining it from offset {offset} first")
+            else:
+                logger.info(f"{self.file_path} changed since the last checkpoint; reading from the start")
+        self._file.seek(self.position)
+        return True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _split(self, data: bytes, final: bool = False) -> List[Tuple[int, str]]:
+        base = self.position - len(self._partial)
+        self.position += len(data)
+        data = self._partial + data
+        if final:
+            self._partial = b''
+            complete = data
+        else:
+            complete, newline, self._partial = data.rpartition(b'\n')
+            if not newline:
+                return []
+        entries = []
+        offset = base
+        for raw in complete.split(b'\n'):
+            entries.append((offset, raw.decode('utf-8', errors='replace').rstrip('\r')))
+            offset += len(raw) + 1
+        if final and entries and not entries[-1][1]:
+            entries.pop()
+        return entries
+
+    def _check_rotation(self) -> List[Tuple[int, str]]:
+        """At EOF: switch to a rotated-in file or rewind after truncation"""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            # Rotated away and not yet recreated; keep draining the old file
+            return []
+
+        if (stat.st_dev, stat.st_ino) != self._identity:
+            # The writer may have appended a last few bytes before letting go
+            lines = self._split(self._file.read(), final=True)
+            logger.info(f"{self.file_path} was rotated; following the new file")
+            self._close()
+            self._open()
+            return lines
+
+        if os.fstat(self._file.fileno()).st_size < self.position:
+            logger.warning(f"{self.file_path} was truncated; reading from the start")
+            self._file.seek(0)
+            self.position = 0
+            self._partial = b''
+        return []
+
+    def read_lines(self) -> List[Tuple[int, str]]:
+        """
+        Read complete lines appended since the last call, following rotation.
+
+        Returns ``(offset, line)`` pairs, where ``offset`` is the byte offset of
+        the line within the file it was read from.
+        """
+        if not self._open():
+            return []
+        self._source = self._identity
+        data = self._file.read(self.max_read_bytes)
+        if data:
+            return self._split(data)
+        return self._check_rotation()
+
+    def hold(self, key: str, offset: int):
+        """Keep the checkpoint before the line at ``offset`` of the last batch's file until ``key`` is released"""
+        if self.checkpoint is not None and self._source is not None:
+            self._held[key] = (self._source[0], self._source[1], offset)
+
+    def release(self, keys: Iterable[str]):
+        """Mark held lines as done and checkpoint up to the oldest line still held"""
+        if self.checkpoint is None:
+            return
+        released = False
+        for key in keys:
+            released = self._held.pop(key, None) is not None or released
+        if released:
+            self.save_checkpoint()
+
+    @property
+    def held(self) -> int:
+        """Lines handed out but not yet released"""
+        return len(self._held)
+
+    def committed(self) -> Optional[Tuple[int, int, int]]:
+        """``(device, inode, offset)`` before which every handed-out line is done"""
+        if self._held:
+            return next(iter(self._held.values()))
+        return self._handled
+
+    def save_checkpoint(self):
+        """Persist the committed position, if it moved"""
+        position = self.committed()
+        if self.checkpoint is None or position is None or position == self._saved:
+            return
+        try:
+            self.checkpoint.save(*position)
+            self._saved = position
+        except OSError as e:
+            logger.error(f"Error saving tail checkpoint: {str(e)}")
+
+    async def follow(self) -> AsyncIterator[List[Tuple[int, str]]]:
+        """Yield batches of new ``(offset, line)`` pairs as they are written, forever"""
+        watcher = create_watcher(self.file_path, self.min_poll_interval, self.max_poll_interval)
+        try:
+            while True:
+                lines = self.read_lines()
+                if lines:
+                    watcher.activity()
+                    yield lines
+                    # The consumer is back for more: the batch is handled or held
+                    self._handled = (self._identity[0], self._identity[1], self.offset)
+                    self.save_checkpoint()
+                    continue
+                await watcher.wait(self.max_poll_interval)
+        finally:
+            watcher.close()
+            # Following again (e.g. after an error) resumes where this left off
+            if self._file is not None:
+                self._resume = (self._identity[0], self._identity[1], self.offset)
+            self._close()
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import openai
+from openai.openai_object import OpenAIObject
+
+from ai import analyzer as analyzer_module
+from ai.analyzer import AlertAnalyzer
+from ai.cache import AnalysisCache, analysis_key
+from cli.ai_chat import create_alert_from_text
+from models.snort import SnortAlert
+from services import ai as services_ai
+
+def snort_alert(source_ip: str, message: str) -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=2, protocol="TCP",
+        source_ip=source_ip, source_port=40000, destination_ip="10.0.0.2", destination_port=22,
+        message=message, classification="Detection of a Network Scan", signature_id="1:1000001:0",
+        raw_alert=message
+    )
+
+def test_rule_alerts_share_a_key_across_addresses():
+    first = snort_alert("10.0.0.5", "Portscan from 10.0.0.5 (42 ports)")
+    second = snort_alert("10.0.0.9", "Portscan from 10.0.0.9 (17 ports)")
+    assert analysis_key(first, "test", "gpt-4", "1") == analysis_key(second, "test", "gpt-4", "1")
+
+def test_cli_questions_are_keyed_on_their_exact_text():
+    first = create_alert_from_text("Why is 10.0.0.5 scanning port 22?")
+    second = create_alert_from_text("Why is 10.0.0.9 scanning port 3389?")
+    again = create_alert_from_text("Why is 10.0.0.5 scanning port 22?")
+    assert analysis_key(first, "test", "gpt-4", "1") != analysis_key(second, "test", "gpt-4", "1")
+    assert analysis_key(first, "test", "gpt-4", "1") == analysis_key(again, "test", "gpt-4", "1")
+
+def test_cli_questions_get_their_own_analysis(monkeypatch):
+    questions = []
+
+    def create(model, messages, **kwargs):
+        questions.append(messages[-1]["content"])
+        content = f"ANALYSIS:\nanswer {len(questions)}\n\nRECOMMENDATIONS:\nnone\n\nCONFIDENCE: 50"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", create)
+    monkeypatch.setattr(services_ai, "get_analysis_cache", lambda: cache)
+    cache = AnalysisCache("")
+
+    first = services_ai.analyze_alert(create_alert_from_text("Why is 10.0.0.5 scanning port 22?"))
+    second = services_ai.analyze_alert(create_alert_from_text("Why is 10.0.0.9 scanning port 3389?"))
+    again = services_ai.analyze_alert(create_alert_from_text("Why is 10.0.0.5 scanning port 22?"))
+    assert (first.analysis, second.analysis, again.analysis) == ("answer 1", "answer 2", "answer 1")
+    assert len(questions) == 2
+
+def test_coroutines_use_sqlite_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = AnalysisCache(path), AnalysisCache(path)
+    threads = []
+    for cache in (writer, reader):
+        connection = cache._connection
+        cache._connection = lambda connection=connection: threads.append(threading.get_ident()) or connection()
+
+    async def scenario():
+        await writer.aput("key", {"analysis": "cached"})
+        return await reader.aget("key"), await reader.aget("key"), await reader.aget("missing")
+
+    assert asyncio.run(scenario()) == ({"analysis": "cached"}, {"analysis": "cached"}, None)
+    assert threads and threading.get_ident() not in threads
+    assert reader.stats()["disk_hits"] == 1
+    assert reader.stats()["memory_hits"] == 1
+    assert reader.stats()["misses"] == 1
+
+def test_small_tier_reuses_a_cached_large_tier_analysis(monkeypatch):
+    models = []
+
+    async def acreate(model, messages, **kwargs):
+        models.append(model)
+        content = "ANALYSIS:\nlarge answer\n\nRECOMMENDATIONS:\nnone\n\nCONFIDENCE: 50"
+        return OpenAIObject.construct_from({
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    monkeypatch.setattr(analyzer_module, "get_analysis_cache", lambda: AnalysisCache(""))
+    analyzer = AlertAnalyzer()
+
+    async def scenario():
+        novel = await analyzer.analyze_alert(snort_alert("10.0.0.5", "Portscan from 10.0.0.5 (42 ports)"))
+        repeat = await analyzer.analyze_alert(snort_alert("10.0.0.9", "Portscan from 10.0.0.9 (17 ports)"))
+        return novel, repeat
+
+    novel, repeat = asyncio.run(scenario())
+    assert models == [analyzer.triage.large.model]
+    assert novel.context["triage"] == {"tier": "large", "model": analyzer.triage.large.model, "reason": "novel"}
+    assert repeat.analysis == novel.analysis
+    assert repeat.context["cached"] is True
+    assert repeat.context["triage"] == {"tier": "large", "model": analyzer.triage.large.model, "reason": "known"}
+    assert analyzer.triage.stats()["tiers"]["small"]["cached"] == 1
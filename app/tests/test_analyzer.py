@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import openai
+from openai.openai_object import OpenAIObject
+
+from ai import analyzer as analyzer_module
+from ai.analyzer import AlertAnalyzer, pack_batches
+from ai.cache import AnalysisCache
+from models.snort import SnortAlert
+
+def make_alert(number: int) -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=2, protocol="TCP",
+        source_ip="10.0.0.1", source_port=40000, destination_ip="10.0.0.2", destination_port=80 + number,
+        message=f"Suspicious request {chr(65 + number)}", raw_alert=f"line {number}", alert_id=f"alert-{number}"
+    )
+
+def completion(content: str) -> OpenAIObject:
+    return OpenAIObject.construct_from({
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    })
+
+def test_pack_batches_respects_budget_and_size():
+    lines = ["x" * 39] * 5
+    # Each line costs 10 estimated tokens plus 10 reserved for its answer
+    assert pack_batches(lines, fixed_tokens=10, token_budget=70, output_tokens=10, max_alerts=10) == \
+        [[0, 1, 2], [3, 4]]
+    assert pack_batches(lines, fixed_tokens=10, token_budget=1000, output_tokens=10, max_alerts=2) == \
+        [[0, 1], [2, 3], [4]]
+    # Too large for any batch: sent alone
+    assert pack_batches(["x" * 400, "x"], fixed_tokens=10, token_budget=50, output_tokens=10, max_alerts=10) == \
+        [[0], [1]]
+    assert pack_batches([], fixed_tokens=10, token_budget=50, output_tokens=10, max_alerts=10) == []
+
+def batch_analyzer(monkeypatch, batch_answer):
+    """Analyzer whose batch requests get ``batch_answer`` and single requests a plain analysis"""
+    requests = []
+
+    async def acreate(model, messages, **kwargs):
+        batch = messages[-1]["content"].startswith("Alerts:")
+        requests.append("batch" if batch else "single")
+        if batch:
+            return completion(batch_answer)
+        return completion("single answer")
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    monkeypatch.setattr(analyzer_module, "get_analysis_cache", lambda: AnalysisCache(""))
+    return AlertAnalyzer(), requests
+
+def analyze_batch(analyzer, alerts):
+    lines = [analyzer._alert_line(alert) for alert in alerts]
+    return asyncio.run(analyzer._analyze_batch(alerts, lines, analyzer.triage.large))
+
+def test_alerts_missing_from_a_batch_answer_are_retried_alone(monkeypatch):
+    answer = json.dumps([{"id": 0, "analysis": "batch answer", "recommendations": ["block"], "confidence_score": 80},
+                         {"id": 2, "analysis": ""}])
+    analyzer, requests = batch_analyzer(monkeypatch, answer)
+    analyses = analyze_batch(analyzer, [make_alert(number) for number in range(3)])
+    assert requests == ["batch", "single", "single"]
+    assert [analysis.analysis for analysis in analyses] == ["batch answer", "single answer", "single answer"]
+    assert [analysis.alert.alert_id for analysis in analyses] == ["alert-0", "alert-1", "alert-2"]
+    assert analyses[0].confidence_score == 0.8
+    assert analyzer.metrics["fallbacks"] == 2
+
+def test_unreadable_batch_answer_falls_back_per_alert(monkeypatch):
+    analyzer, requests = batch_analyzer(monkeypatch, "I cannot answer in JSON")
+    analyses = analyze_batch(analyzer, [make_alert(number) for number in range(2)])
+    assert requests == ["batch", "single", "single"]
+    assert [analysis.analysis for analysis in analyses] == ["single answer", "single answer"]
+    assert analyzer.metrics["fallbacks"] == 2
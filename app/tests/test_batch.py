@@ -0,0 +1,37 @@
+from snort.batch import parse_batch
+from snort.parser import AlertParser, parse_alert_line
+from snort.reader import parse_buffer
+from tests.test_parser_golden import CORPUS, read_lines
+
+def corpus_lines():
+    return read_lines(CORPUS)
+
+def test_parse_batch_matches_line_parser():
+    parser = AlertParser(year=2026)
+    lines = corpus_lines()
+    columns = parse_batch(lines, parser)
+    expected = [alert for alert in (parse_alert_line(line, parser) for line in lines) if alert is not None]
+    assert list(columns.alerts()) == expected
+    assert columns.rejected == sum(1 for line in lines if line.strip()) - len(expected)
+
+def test_parse_batch_keeps_microseconds():
+    line = "03/20-10:00:06.123456  [**] [1:1000001:0] Possible TCP scan [**] {TCP} 192.168.1.100:12345 -> 192.168.1.200:80"
+    columns = parse_batch([line], AlertParser(year=2026))
+    assert columns.document(0)["timestamp"] == "2026-03-20T10:00:06.123456"
+
+def test_parse_buffer_matches_parse_batch():
+    parser = AlertParser(year=2026)
+    with open(CORPUS, "rb") as f:
+        buffer = f.read()
+    columns, end = parse_buffer(buffer, 0, len(buffer), parser)
+    assert end == len(buffer)
+    assert [{**document, "alert_id": None} for document in columns.documents()] == \
+        [{**document, "alert_id": None} for document in parse_batch(corpus_lines(), parser).documents()]
+
+def test_out_of_range_ports_are_rejected_on_both_paths():
+    parser = AlertParser(year=2026)
+    line = "[03/20-10:00:00.123] [**] [FAILED] Port above 65535 [**] [Priority: 1] TCP 192.168.1.1:99999 -> 10.0.0.1:443"
+    assert parser.parse(line) is None
+    columns = parse_batch([line, line.replace("99999", "65535")], parser)
+    assert (len(columns), columns.rejected) == (1, 1)
+    assert columns.document(0)["source_port"] == 65535
@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+from elasticsearch import ApiError, ConnectionError
+
+from elastic.bulk import AdaptiveBatchSizer, BulkAlertWriter, StreamingBulkIndexer
+
+def throttled():
+    return ApiError("429 Too Many Requests", meta=SimpleNamespace(status=429), body={})
+
+class FakeClient:
+    """Answers each bulk request with the next list of item statuses, or raises the next error"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def bulk(self, operations):
+        self.requests.append(operations.count(b"\n") // 2)
+        statuses = self.responses.pop(0)
+        if isinstance(statuses, Exception):
+            raise statuses
+        items = [{"create": {"status": status, "error": None if status < 300 else "rejected"}} for status in statuses]
+        return SimpleNamespace(body={"errors": any(status >= 300 for status in statuses), "items": items})
+
+def test_ack_listener_gets_settled_ids():
+    # ok, duplicate, bad document, throttled twice then written, throttled until retries run out
+    client = FakeClient([201, 409, 400, 429, 429], [429, 429], [201, 429])
+    writer = BulkAlertWriter(client, "alerts", max_retries=2, initial_backoff=0.01)
+    acknowledged = []
+    writer.add_ack_listener(acknowledged.extend)
+
+    async def scenario():
+        for doc_id in ("written", "duplicate", "invalid", "retried", "lost"):
+            await writer.add({"alert_id": doc_id})
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert sorted(acknowledged) == ["duplicate", "invalid", "retried", "written"]
+
+def test_failed_requests_are_retried_then_requeued():
+    client = FakeClient(
+        ConnectionError("connection refused"), throttled(), throttled(),
+        # Retries ran out: the batch is requeued and flushed again
+        [201, 201]
+    )
+    writer = BulkAlertWriter(client, "alerts", max_retries=2, initial_backoff=0.01)
+    acknowledged = []
+    writer.add_ack_listener(acknowledged.extend)
+
+    async def scenario():
+        for doc_id in ("first", "second"):
+            await writer.add({"alert_id": doc_id})
+        await asyncio.sleep(0.5)
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert client.requests == [2, 2, 2, 2]
+    assert sorted(acknowledged) == ["first", "second"]
+    stats = writer.stats()
+    assert (stats["request_retries"], stats["documents_requeued"]) == (2, 2)
+    assert (stats["documents_written"], stats["documents_failed"], stats["buffered"]) == (2, 0, 0)
+
+def test_rejected_request_settles_its_documents():
+    client = FakeClient(ApiError("400 Bad Request", meta=SimpleNamespace(status=400), body={}))
+    writer = BulkAlertWriter(client, "alerts", initial_backoff=0.01)
+    acknowledged = []
+    writer.add_ack_listener(acknowledged.extend)
+
+    async def scenario():
+        await writer.add({"alert_id": "malformed"})
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert client.requests == [1]
+    assert acknowledged == ["malformed"]
+    assert writer.stats()["documents_failed"] == 1
+
+def test_documents_failing_at_shutdown_stay_unacknowledged():
+    client = FakeClient(throttled(), throttled())
+    writer = BulkAlertWriter(client, "alerts", max_retries=1, initial_backoff=0.01)
+    acknowledged = []
+    writer.add_ack_listener(acknowledged.extend)
+
+    async def scenario():
+        await writer.add({"alert_id": "unsent"})
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert acknowledged == []
+    assert writer.stats()["documents_failed"] == 1
+    assert writer.stats()["documents_requeued"] == 0
+
+class SyncFakeClient(FakeClient):
+    """Blocking counterpart of :class:`FakeClient` for ``StreamingBulkIndexer``"""
+
+    def bulk(self, operations):
+        return asyncio.run(FakeClient.bulk(self, operations))
+
+def test_batch_size_grows_when_fast_and_shrinks_when_slow_or_throttled():
+    sizer = AdaptiveBatchSizer(initial=100, minimum=20, maximum=150, target_latency=1.0)
+    sizer.record(0.1)
+    assert sizer.size == 125
+    sizer.record(0.1)
+    sizer.record(0.1)
+    assert sizer.size == 150
+    # Between half the target and the target: left alone
+    sizer.record(0.7)
+    assert sizer.size == 150
+    sizer.record(1.5)
+    assert sizer.size == 75
+    sizer.record(0.1, throttled=True)
+    sizer.record(0.1, throttled=True)
+    assert sizer.size == 20
+
+def test_streaming_indexer_retries_throttled_requests():
+    client = SyncFakeClient(throttled(), [201, 429, 201], [201])
+    indexer = StreamingBulkIndexer(client, "alerts", concurrency=1, initial_backoff=0.01,
+                                   sizer=AdaptiveBatchSizer(initial=3, minimum=1))
+    stats = indexer.index({"alert_id": f"alert-{number}"} for number in range(3))
+    # Whole request resent after the 429, then only the rejected item
+    assert client.requests == [3, 3, 1]
+    assert stats["documents_written"] == 3
+    assert stats["documents_failed"] == 0
+    assert stats["throttled_requests"] == 1
+    assert stats["item_retries"] == 1
+    # Throttling halved the batch size
+    assert stats["batch_size"] == 1
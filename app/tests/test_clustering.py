@@ -0,0 +1,34 @@
+from ai.clustering import cluster_alerts, message_template
+from models.snort import SnortAlert
+
+def make_alert(number: int, message: str, priority: int = 2, source_port: int = 40000,
+               destination_port: int = 80) -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=priority, protocol="TCP",
+        source_ip="10.0.0.1", source_port=source_port, destination_ip="10.0.0.2",
+        destination_port=destination_port, message=message, raw_alert=f"line {number}", alert_id=f"alert-{number}"
+    )
+
+def test_message_template_masks_variable_parts():
+    assert message_template("Portscan from 10.0.0.7:4444 (42 ports)") == "Portscan from <ip> (<n> ports)"
+    assert message_template("Shellcode  0xdeadbeef\tfrom fe80:0:0:0:1:2:3:4") == "Shellcode <hex> from <ip>"
+    assert message_template("Portscan from 10.0.0.9 (17 ports)") == message_template("Portscan from 10.0.0.7 (42 ports)")
+
+def test_clusters_keep_first_appearance_order_and_pick_the_most_severe():
+    alerts = [
+        make_alert(0, "Portscan from 10.0.0.7 (42 ports)", priority=3),
+        make_alert(1, "SQL injection attempt"),
+        # Reply direction: same service port, same cluster
+        make_alert(2, "Portscan from 10.0.0.9 (17 ports)", priority=1, source_port=80, destination_port=40001),
+        make_alert(3, "Portscan from 10.0.0.8 (3 ports)", priority=1),
+        make_alert(4, "Portscan from 10.0.0.8 (3 ports)", destination_port=443)
+    ]
+    clusters = cluster_alerts(alerts)
+    assert [[alert.alert_id for alert in cluster.members] for cluster in clusters] == \
+        [["alert-0", "alert-2", "alert-3"], ["alert-1"], ["alert-4"]]
+    assert [cluster.representative.alert_id for cluster in clusters] == ["alert-2", "alert-1", "alert-4"]
+    assert len({cluster.digest for cluster in clusters}) == 3
+
+def test_alerts_without_a_priority_do_not_represent_a_cluster():
+    alerts = [make_alert(0, "Unknown traffic", priority=0), make_alert(1, "Unknown traffic", priority=3)]
+    assert cluster_alerts(alerts)[0].representative.alert_id == "alert-1"
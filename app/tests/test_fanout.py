@@ -0,0 +1,55 @@
+import asyncio
+
+from models.snort import SnortAlert
+from services.fanout import ConcurrentFanOut
+
+def make_alert(number: int, source_port: int) -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=2, protocol="TCP",
+        source_ip="10.0.0.1", source_port=source_port, destination_ip="10.0.0.2", destination_port=80,
+        message="Possible TCP scan", raw_alert=f"line {number}", alert_id=f"alert-{number}"
+    )
+
+def test_alerts_of_a_flow_keep_their_order():
+    fan_out = ConcurrentFanOut(concurrency=4)
+    # Two flows, interleaved; earlier alerts take longer so reordering would show
+    alerts = [make_alert(number, 40000 + number % 2) for number in range(6)]
+    handled = []
+
+    async def handler(alert):
+        await asyncio.sleep(0.01 * (6 - int(alert.alert_id.split("-")[1])))
+        handled.append(alert.alert_id)
+
+    asyncio.run(fan_out.run(alerts, handler))
+    assert [alert_id for alert_id in handled if int(alert_id[-1]) % 2 == 0] == ["alert-0", "alert-2", "alert-4"]
+    assert [alert_id for alert_id in handled if int(alert_id[-1]) % 2 == 1] == ["alert-1", "alert-3", "alert-5"]
+    assert fan_out.stats()["alerts"] == 6
+
+def test_concurrency_bound_holds_across_flows():
+    fan_out = ConcurrentFanOut(concurrency=2)
+    alerts = [make_alert(number, 40000 + number) for number in range(6)]
+    running, peak = [0], [0]
+
+    async def handler(alert):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    asyncio.run(fan_out.run(alerts, handler))
+    assert peak[0] == 2
+    assert fan_out.stats()["peak_in_flight"] == 2
+
+def test_handler_errors_are_counted_without_stopping_the_flow():
+    fan_out = ConcurrentFanOut(concurrency=2)
+    alerts = [make_alert(number, 40000) for number in range(3)]
+    handled = []
+
+    async def handler(alert):
+        if alert.alert_id == "alert-0":
+            raise RuntimeError("boom")
+        handled.append(alert.alert_id)
+
+    asyncio.run(fan_out.run(alerts, handler))
+    assert handled == ["alert-1", "alert-2"]
+    assert fan_out.stats()["errors"] == 1
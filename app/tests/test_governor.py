@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import openai
+
+from ai.governor import INTERACTIVE_PRIORITY, RateLimitGovernor, alert_lane
+
+def counting(governor: RateLimitGovernor):
+    """Count admission checks, to tell waking up from polling"""
+    checks = []
+    try_admit = governor._try_admit
+
+    def counted(ticket, tokens):
+        checks.append(ticket)
+        return try_admit(ticket, tokens)
+
+    governor._try_admit = counted
+    return checks
+
+def test_queued_coroutines_wake_on_release_in_lane_order():
+    governor = RateLimitGovernor(max_concurrency=1)
+    checks = counting(governor)
+    order = []
+
+    async def request(name, priority):
+        await governor.acquire(10, priority)
+        order.append(name)
+
+    async def scenario():
+        await governor.acquire(10)
+        waiters = [asyncio.create_task(request("alert", 3)),
+                   asyncio.create_task(request("question", INTERACTIVE_PRIORITY))]
+        await asyncio.sleep(0.3)
+        checks_while_blocked = len(checks)
+        governor._release(10)
+        await asyncio.wait_for(waiters[1], 1)
+        governor._release(10)
+        await asyncio.wait_for(waiters[0], 1)
+        return checks_while_blocked
+
+    assert asyncio.run(scenario()) == 3
+    assert order == ["question", "alert"]
+    assert governor.stats()["queue_depth"] == 0
+
+def test_blocked_thread_wakes_on_release_without_polling():
+    governor = RateLimitGovernor(max_concurrency=1)
+    checks = counting(governor)
+    governor.acquire_sync(10)
+    admitted = threading.Event()
+    waiter = threading.Thread(target=lambda: (governor.acquire_sync(10), admitted.set()))
+    waiter.start()
+    time.sleep(0.3)
+    assert not admitted.is_set()
+    assert len(checks) == 2
+
+    governor._release(10)
+    assert admitted.wait(1)
+    waiter.join(1)
+    assert len(checks) == 3
+
+def test_abandoned_waiter_hands_its_turn_on():
+    governor = RateLimitGovernor(max_concurrency=1)
+
+    async def scenario():
+        await governor.acquire(10)
+        first = asyncio.create_task(governor.acquire(10, INTERACTIVE_PRIORITY))
+        second = asyncio.create_task(governor.acquire(10))
+        await asyncio.sleep(0.05)
+        governor._release(10)
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+
+    asyncio.run(scenario())
+    assert governor.stats()["running"] == 1
+    assert governor.stats()["queue_depth"] == 0
+
+def test_rate_limited_request_keeps_its_place_in_line():
+    governor = RateLimitGovernor(max_concurrency=1)
+    order = []
+
+    async def scenario():
+        attempts = []
+
+        async def throttled_once():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                # Let the later request queue up behind this one
+                await asyncio.sleep(0.1)
+                raise openai.error.RateLimitError("slow down", headers={"retry-after": "0.1"})
+            order.append("first")
+
+        async def later():
+            order.append("later")
+
+        first = asyncio.create_task(governor.run(throttled_once, tokens=10))
+        await asyncio.sleep(0.02)
+        second = asyncio.create_task(governor.run(later, tokens=10))
+        await asyncio.wait_for(asyncio.gather(first, second), 2)
+
+    asyncio.run(scenario())
+    assert order == ["first", "later"]
+    assert governor.stats()["throttled"] == 1
+
+def test_alerts_without_a_priority_stay_out_of_the_interactive_lane():
+    assert [alert_lane(priority) for priority in (0, 1, 2, 3)] == [3, 1, 2, 3]
+    assert alert_lane(0) != INTERACTIVE_PRIORITY
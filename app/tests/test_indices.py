@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from elastic.indices import AlertIndices
+
+def test_search_indices_cover_the_range():
+    indices = AlertIndices("alerts")
+    assert indices.search_indices("2026-03-30T12:00:00", "2026-04-01") == \
+        "alerts-2026.03.30,alerts-2026.03.31,alerts-2026.04.01,alerts"
+    hourly = AlertIndices("alerts", granularity="hourly")
+    assert hourly.search_indices("2026-03-20T10:30:00+02:00", "2026-03-20T09:10:00Z") == \
+        "alerts-2026.03.20.08,alerts-2026.03.20.09,alerts"
+
+def test_search_indices_fall_back_to_wildcards():
+    indices = AlertIndices("alerts")
+    # Date math cannot be narrowed
+    assert indices.search_indices("now-1d", "2026-03-20") == "alerts-*,alerts"
+    assert indices.search_indices("2026-03-20", "2026-03-19") == "alerts"
+    # Too many days for one expression: whole months instead
+    assert indices.search_indices("2026-01-15", "2026-03-20") == \
+        "alerts-2026.01.*,alerts-2026.02.*,alerts-2026.03.*,alerts"
+
+def test_expired_partitions():
+    indices = AlertIndices("alerts", retention_days=2)
+    names = ["alerts", "alerts-2026.03.17", "alerts-2026.03.18", "alerts-2026.03.18.23",
+             "alerts-2026.03.19", "other-2026.01.01"]
+    assert indices.expired(names, now=datetime(2026, 3, 21)) == \
+        ["alerts-2026.03.17", "alerts-2026.03.18", "alerts-2026.03.18.23"]
+    assert AlertIndices("alerts", retention_days=0).expired(names) == []
+
+def test_aggregatable_follows_the_profile():
+    rich = AlertIndices("alerts")
+    lean = AlertIndices("alerts", profile="ingest-lean")
+    assert rich.aggregatable("source_port") and rich.aggregatable("priority")
+    assert not lean.aggregatable("source_port")
+    assert lean.aggregatable("priority")
+    assert not rich.aggregatable("message")
+    assert not rich.aggregatable("unknown")
@@ -0,0 +1,17 @@
+import pytest
+
+from elastic.pagination import InvalidCursorError, PageCursor, decode_cursor, encode_cursor, first_page_cursor, query_fingerprint
+
+QUERY = {"query": {"bool": {"must": [{"term": {"priority": 1}}]}}}
+
+def test_first_page_cursor_has_no_point_in_time():
+    cursor = decode_cursor(first_page_cursor(QUERY, 100), QUERY)
+    assert cursor == PageCursor("", [], query_fingerprint(QUERY), 100)
+
+def test_point_in_time_cursor_round_trips():
+    cursor = PageCursor("pit1", ["2026-03-20T10:00:00", 7], query_fingerprint(QUERY))
+    assert decode_cursor(encode_cursor(cursor), QUERY) == cursor
+
+def test_cursor_is_tied_to_its_filters():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(first_page_cursor(QUERY, 100), {"query": {"match_all": {}}})
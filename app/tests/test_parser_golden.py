@@ -0,0 +1,55 @@
+"""
+Golden-file test of :class:`AlertParser`.
+
+Every line of ``alerts_golden.log`` has its expected alert, or ``null`` for a
+line that must be rejected, on the same line of ``alerts_golden.expected.jsonl``.
+The corpus covers both formats, ``gid:sid:rev`` and SnortAI tokens, missing
+classification and priority, short fractional seconds, the year rollover
+and malformed lines (truncated, IPv6, octets above 255, ports above 65535,
+impossible dates). The expected output was checked by hand against the
+lines; when the parser changes on purpose, update it in the same commit.
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from snort import parser as parser_module
+from snort.parser import AlertParser
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+CORPUS = os.path.join(DATA, "alerts_golden.log")
+EXPECTED = os.path.join(DATA, "alerts_golden.expected.jsonl")
+
+# "Now" for the year rollover: shortly after midnight on New Year's Day
+NOW = datetime(2027, 1, 1, 0, 30)
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls.fromtimestamp(NOW.timestamp(), tz)
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f]
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(parser_module, "datetime", FrozenDatetime)
+
+def test_expected_output_covers_the_corpus():
+    assert len(read_lines(EXPECTED)) == len(read_lines(CORPUS))
+
+@pytest.mark.parametrize("number,line,expected",
+                         [(number, line, expected) for number, (line, expected)
+                          in enumerate(zip(read_lines(CORPUS), read_lines(EXPECTED)), start=1)])
+def test_parser_matches_golden_output(frozen_now, number, line, expected):
+    alert = AlertParser().parse(line)
+    assert (None if alert is None else json.loads(alert.json())) == json.loads(expected)
+
+def test_year_rollover(frozen_now):
+    parser = AlertParser()
+    december = parser.parse(read_lines(CORPUS)[9])
+    january = parser.parse(read_lines(CORPUS)[11])
+    assert (december.timestamp.year, january.timestamp.year) == (2026, 2027)
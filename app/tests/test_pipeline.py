@@ -0,0 +1,95 @@
+import asyncio
+
+from models.snort import AlertAnalysis, SnortAlert
+from services.pipeline import AlertPipeline
+
+def make_alert(number: int) -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=2, protocol="TCP",
+        source_ip="10.0.0.1", source_port=40000 + number, destination_ip="10.0.0.2", destination_port=80,
+        message="Possible TCP scan", raw_alert=f"line {number}", alert_id=f"alert-{number}"
+    )
+
+async def never(analysis):
+    pass
+
+def test_dropped_alerts_are_counted_and_released():
+    released = []
+    pipeline = AlertPipeline(analyze=never, store=never, broadcast=never, queue_size=2,
+                             overflow_policy="drop_newest", release=released.extend)
+
+    async def scenario():
+        # Queues only, no workers: everything past the capacity is dropped
+        pipeline.alert_queue = asyncio.Queue(pipeline.queue_size)
+        await pipeline.submit([make_alert(number) for number in range(5)])
+
+    asyncio.run(scenario())
+    assert pipeline.counters["dropped"] == 3
+    assert [alert.alert_id for alert in released] == ["alert-2", "alert-3", "alert-4"]
+
+def test_spill_replay_skips_corrupt_lines(tmp_path):
+    spill_file = tmp_path / "spill.jsonl"
+    spill_file.write_text(make_alert(1).json() + "\n{\"truncated\n" + "not json\n" + make_alert(2).json() + "\n")
+    pipeline = AlertPipeline(analyze=never, store=never, broadcast=never, queue_size=10,
+                             overflow_policy="spill", spill_file=str(spill_file))
+
+    async def scenario():
+        pipeline.alert_queue = asyncio.Queue(pipeline.queue_size)
+        replay = asyncio.create_task(pipeline._replay_spill())
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            if pipeline.alert_queue.qsize() == 2 and not (tmp_path / "spill.jsonl.replay").exists():
+                break
+        replay.cancel()
+
+    asyncio.run(scenario())
+    assert pipeline.counters["replayed"] == 2
+    assert pipeline.counters["spill_corrupt"] == 2
+
+def test_failed_batch_falls_back_to_single_alerts():
+    stored, released = [], []
+
+    async def analyze_batch(alerts):
+        raise RuntimeError("malformed model answer")
+
+    async def analyze(alert):
+        if alert.alert_id == "alert-1":
+            raise RuntimeError("still failing")
+        return AlertAnalysis(alert=alert, analysis="ok", recommendations=[], confidence_score=0.5)
+
+    async def store(analysis):
+        if analysis.alert.alert_id == "alert-2":
+            raise RuntimeError("storage unavailable")
+        stored.append(analysis.alert.alert_id)
+
+    pipeline = AlertPipeline(analyze=analyze, analyze_batch=analyze_batch, store=store, broadcast=never,
+                             analysis_workers=1, release=released.extend)
+
+    async def scenario():
+        await pipeline.start()
+        await pipeline.submit([make_alert(number) for number in range(4)])
+        await pipeline.stop()
+
+    asyncio.run(scenario())
+    assert sorted(stored) == ["alert-0", "alert-3"]
+    assert sorted(alert.alert_id for alert in released) == ["alert-1", "alert-2"]
+    assert pipeline.counters["analysis_batch_errors"] == 1
+    assert (pipeline.counters["analyzed"], pipeline.counters["analysis_errors"]) == (3, 1)
+    assert pipeline.counters["storage_errors"] == 1
+
+def test_spilled_alerts_are_replayed(tmp_path):
+    spill_file = tmp_path / "spill" / "alerts.jsonl"
+    pipeline = AlertPipeline(analyze=never, store=never, broadcast=never, queue_size=1,
+                             overflow_policy="spill", spill_file=str(spill_file))
+
+    async def scenario():
+        pipeline.alert_queue = asyncio.Queue(pipeline.queue_size)
+        await pipeline.submit([make_alert(number) for number in range(3)])
+        assert pipeline.counters["spilled"] == 2
+        pipeline.alert_queue.get_nowait()
+        replay = asyncio.create_task(pipeline._replay_spill())
+        replayed = [(await asyncio.wait_for(pipeline.alert_queue.get(), 5)).alert_id for _ in range(2)]
+        replay.cancel()
+        return replayed
+
+    assert asyncio.run(scenario()) == ["alert-1", "alert-2"]
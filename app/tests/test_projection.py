@@ -0,0 +1,29 @@
+import pytest
+
+from elastic.projection import parse_fields, to_rows
+
+DOCUMENTS = [
+    {"alert": {"timestamp": "2026-03-20T10:00:00", "priority": 1}, "analysis": "scan"},
+    {"alert": {"timestamp": "2026-03-20T10:00:01"}, "confidence_score": 0.5}
+]
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields(" , ") is None
+    assert parse_fields("alert.timestamp, analysis,alert.*") == ["alert.timestamp", "analysis", "alert.*"]
+    with pytest.raises(ValueError, match="alert-id, a b"):
+        parse_fields("alert.priority,alert-id,a b")
+
+def test_rows_follow_the_requested_fields():
+    assert to_rows(DOCUMENTS, ["alert.timestamp", "alert.priority"]) == {
+        "columns": ["alert.timestamp", "alert.priority"],
+        "rows": [["2026-03-20T10:00:00", 1], ["2026-03-20T10:00:01", None]]
+    }
+
+def test_rows_without_explicit_fields_use_every_top_level_key():
+    # A wildcard cannot name its columns up front
+    for fields in (None, ["alert.*"]):
+        assert to_rows(DOCUMENTS, fields) == {
+            "columns": ["alert", "analysis", "confidence_score"],
+            "rows": [[DOCUMENTS[0]["alert"], "scan", None], [DOCUMENTS[1]["alert"], None, 0.5]]
+        }
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from services.cache import QueryCache
+
+def test_concurrent_misses_share_one_load():
+    cache = QueryCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["value"] * 3
+    assert len(loads) == 1
+    assert cache.stats()["coalesced"] == 2
+
+def test_waiters_reload_when_the_first_loader_is_cancelled():
+    cache = QueryCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return len(loads)
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await asyncio.wait_for(asyncio.gather(*waiters), 1)
+
+    # One waiter takes over the load, the other coalesces on it
+    assert asyncio.run(scenario()) == [2, 2]
+    assert len(loads) == 2
+
+def test_cancelled_waiter_leaves_the_shared_load_running():
+    cache = QueryCache()
+
+    async def loader():
+        await asyncio.sleep(0.03)
+        return "value"
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_load("key", loader))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await first
+
+    assert asyncio.run(scenario()) == "value"
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,138 @@
+import asyncio
+import os
+
+from snort import processor as processor_module
+from snort.processor import SnortAlertProcessor
+from snort.tail import AlertFileTailer, TailCheckpoint
+
+LINE = "[03/20-10:00:00.123] [**] [FAILED] Failed to process packet [**] [Classification: Snort Error] [Priority: 1] TCP 192.168.1.1:54321 -> 10.0.0.1:443\n"
+
+def test_monitor_survives_read_errors(tmp_path, monkeypatch):
+    alert_file = tmp_path / "alert"
+    # Opening a directory fails with EISDIR, which is not a FileNotFoundError
+    alert_file.mkdir()
+    monkeypatch.setattr(processor_module.settings, "snort_alert_file", str(alert_file))
+    monkeypatch.setattr(processor_module.settings, "snort_checkpoint_file", "")
+    monkeypatch.setattr(processor_module, "MONITOR_RETRY_INITIAL", 0.05)
+
+    async def scenario():
+        received = []
+
+        async def callback(alerts):
+            received.extend(alerts)
+
+        task = asyncio.create_task(SnortAlertProcessor().monitor_alert_file(callback))
+        await asyncio.sleep(0.2)
+        assert not task.done()
+
+        os.rmdir(alert_file)
+        alert_file.write_text(LINE * 2)
+        for _ in range(100):
+            if len(received) == 2:
+                break
+            await asyncio.sleep(0.05)
+        task.cancel()
+        return received
+
+    received = asyncio.run(scenario())
+    assert [alert.message for alert in received] == ["Failed to process packet"] * 2
+
+def collect(tailer, count):
+    async def scenario():
+        lines = []
+        async for batch in tailer.follow():
+            lines.extend(line for _, line in batch)
+            if len(lines) >= count:
+                return lines
+    return asyncio.run(asyncio.wait_for(scenario(), 10))
+
+def test_tailer_drains_file_rotated_while_stopped(tmp_path):
+    alert_file = tmp_path / "alert"
+    alert_file.write_text("a\nb\n")
+    stat = os.stat(alert_file)
+    checkpoint = TailCheckpoint(str(tmp_path / "alert.checkpoint"))
+    checkpoint.save(stat.st_dev, stat.st_ino, 2)
+
+    # While the service was down: more writes, then rotation
+    with open(alert_file, "a") as f:
+        f.write("c\n")
+    os.rename(alert_file, tmp_path / "alert.1")
+    alert_file.write_text("d\n")
+
+    assert collect(AlertFileTailer(str(alert_file), checkpoint, max_poll_interval=0.05), 3) == ["b", "c", "d"]
+
+def test_checkpoint_waits_for_held_lines(tmp_path):
+    alert_file = tmp_path / "alert"
+    alert_file.write_text("a\nb\nc\n")
+    checkpoint = TailCheckpoint(str(tmp_path / "alert.checkpoint"))
+    tailer = AlertFileTailer(str(alert_file), checkpoint, max_poll_interval=0.05)
+
+    async def scenario():
+        lines = tailer.follow()
+        for offset, line in await lines.__anext__():
+            if line != "b":
+                tailer.hold(line, offset)
+        try:
+            # Asking for more marks the batch handled; nothing else is written
+            await asyncio.wait_for(lines.__anext__(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(scenario())
+    assert checkpoint.load()[2] == 0
+    tailer.release(["c"])
+    assert checkpoint.load()[2] == 0
+    tailer.release(["a"])
+    assert checkpoint.load()[2] == 6
+
+def test_lines_held_across_rotation_checkpoint_the_rotated_file(tmp_path):
+    alert_file = tmp_path / "alert"
+    # The last line of the old file is only finished off once it is rotated
+    alert_file.write_text("a\nb")
+    old = os.stat(alert_file)
+    checkpoint = TailCheckpoint(str(tmp_path / "alert.checkpoint"))
+    tailer = AlertFileTailer(str(alert_file), checkpoint)
+
+    for offset, line in tailer.read_lines():
+        tailer.hold(line, offset)
+    os.rename(alert_file, tmp_path / "alert.1")
+    alert_file.write_text("c\n")
+    rotated = tailer.read_lines()
+    assert rotated == [(2, "b")]
+    for offset, line in rotated:
+        tailer.hold(line, offset)
+    for offset, line in tailer.read_lines():
+        tailer.hold(line, offset)
+
+    tailer.release(["a"])
+    assert checkpoint.load() == (old.st_dev, old.st_ino, 2)
+    tailer._close()
+
+    # A restart drains the rest of the rotated file before the new one
+    assert collect(AlertFileTailer(str(alert_file), checkpoint, max_poll_interval=0.05), 2) == ["b", "c"]
+
+def test_alerts_of_a_failed_batch_are_released(tmp_path, monkeypatch):
+    alert_file = tmp_path / "alert"
+    alert_file.write_text(LINE * 2)
+    monkeypatch.setattr(processor_module.settings, "snort_alert_file", str(alert_file))
+    monkeypatch.setattr(processor_module.settings, "snort_checkpoint_file", str(tmp_path / "alert.checkpoint"))
+    processor = SnortAlertProcessor()
+
+    async def scenario():
+        calls = []
+
+        async def callback(alerts):
+            calls.append(alerts)
+            raise RuntimeError("pipeline stopped")
+
+        task = asyncio.create_task(processor.monitor_alert_file(callback, hold_until_released=True))
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if calls:
+                break
+        task.cancel()
+        return calls
+
+    assert len(asyncio.run(scenario())[0]) == 2
+    assert processor.tailer.held == 0
+    assert TailCheckpoint(str(tmp_path / "alert.checkpoint")).load()[2] == len(LINE) * 2
@@ -0,0 +1,59 @@
+import pytest
+
+from elastic.pagination import InvalidCursorError
+from elastic.timeseries import build_timeseries_query, parse_timeseries_response
+
+QUERY = {"query": {"bool": {"must": []}}}
+
+def terms(*keys):
+    return {"buckets": [{"key": key, "doc_count": 1} for key in keys]}
+
+def summary():
+    return {"alert_type": terms("ALERT"), "priority": terms(2), "protocol": terms("TCP"),
+            "top_source_ips": terms("10.0.0.1")}
+
+def response(composite_buckets, after_key):
+    return {
+        "hits": {"total": {"value": 2}},
+        "aggregations": {
+            "timeline": {"buckets": [{"key": 0, "key_as_string": "2026-03-20T10:00:00", "doc_count": 2, **summary()}]},
+            **summary(),
+            "composite": {"buckets": composite_buckets, "after_key": after_key}
+        }
+    }
+
+def test_bounded_range_gets_a_fixed_interval():
+    body = build_timeseries_query(QUERY, "2026-03-20T10:00:00", "2026-03-20T11:00:00", buckets=60)
+    histogram = body["aggs"]["timeline"]["date_histogram"]
+    assert histogram["fixed_interval"] == "1m"
+    assert histogram["extended_bounds"] == {"min": "2026-03-20T10:00:00", "max": "2026-03-20T11:00:00"}
+    assert body["size"] == 0
+    assert "composite" not in body["aggs"]
+    assert "auto_date_histogram" in build_timeseries_query(QUERY, "now-1d")["aggs"]["timeline"]
+
+def test_composite_pages_follow_the_after_key():
+    first = parse_timeseries_response(
+        response([{"key": {"source_ip": "10.0.0.1"}, "doc_count": 1},
+                  {"key": {"source_ip": "10.0.0.2"}, "doc_count": 1}], {"source_ip": "10.0.0.2"}),
+        interval="1m", composite_field="source_ip", composite_size=2
+    )
+    assert first["composite"]["buckets"] == [{"key": "10.0.0.1", "count": 1}, {"key": "10.0.0.2", "count": 1}]
+    assert first["buckets"][0]["timestamp"] == "2026-03-20T10:00:00"
+    assert first["totals"]["top_source_ips"] == [{"ip": "10.0.0.1", "count": 1}]
+
+    # The cursor of a full page resumes after its last key
+    body = build_timeseries_query(QUERY, composite_field="source_ip", composite_size=2,
+                                  composite_after=first["composite"]["after"])
+    assert body["aggs"]["composite"]["composite"]["after"] == {"source_ip": "10.0.0.2"}
+
+    # A short page is the last one, even if Elasticsearch still reports an after_key
+    last = parse_timeseries_response(
+        response([{"key": {"source_ip": "10.0.0.3"}, "doc_count": 1}], {"source_ip": "10.0.0.3"}),
+        composite_field="source_ip", composite_size=2
+    )
+    assert last["composite"]["after"] is None
+
+def test_malformed_composite_cursor():
+    for cursor in ("not base64!", "WzFd"):
+        with pytest.raises(InvalidCursorError):
+            build_timeseries_query(QUERY, composite_field="source_ip", composite_after=cursor)
@@ -0,0 +1,41 @@
+from ai.triage import TriagePolicy, request_cost
+from models.snort import SnortAlert
+
+def make_alert(priority: int, classification: str = "Misc activity") -> SnortAlert:
+    return SnortAlert(
+        timestamp="2026-03-20T10:00:00", alert_type="ALERT", priority=priority, protocol="TCP",
+        source_ip="10.0.0.1", source_port=40000, destination_ip="10.0.0.2", destination_port=80,
+        message="Possible TCP scan", classification=classification, raw_alert="line"
+    )
+
+def routes(policy, alert, signature, times):
+    return [policy.route(alert, signature)[0].name for _ in range(times)]
+
+def test_priority_novelty_and_repeats_pick_the_tier():
+    policy = TriagePolicy(large_max_priority=1, rules_min_priority=3)
+    assert routes(policy, make_alert(1), "severe", 2) == ["large", "large"]
+    assert routes(policy, make_alert(2), "medium", 2) == ["large", "small"]
+    assert routes(policy, make_alert(3), "low", 2) == ["large", "rules"]
+    assert policy.decisions == {"priority": 2, "novel": 2, "known": 2, "escalated": 0}
+
+def test_missing_priority_is_not_treated_as_most_severe():
+    policy = TriagePolicy(large_max_priority=1, rules_min_priority=3)
+    assert routes(policy, make_alert(0), "unprioritized", 3) == ["large", "small", "small"]
+    assert policy.decisions["priority"] == 0
+
+def test_escalation_and_per_tier_accounting():
+    policy = TriagePolicy(large_model="gpt-4", small_model="gpt-3.5-turbo")
+    policy.route(make_alert(2), "scan", members=5)
+    tier, reason = policy.escalate(members=2)
+    policy.record_request(tier, 0.5, prompt_tokens=1000, completion_tokens=500)
+    large = policy.stats()["tiers"]["large"]
+    assert (tier.name, reason) == ("large", "escalated")
+    assert (large["clusters"], large["alerts"], large["requests"]) == (2, 7, 1)
+    assert large["cost_usd"] == request_cost("gpt-4", 1000, 500) == 0.06
+    assert policy.stats()["known_signatures"] == 1
+
+def test_reusable_tiers_are_the_routed_and_stronger_ones():
+    policy = TriagePolicy()
+    assert policy.reusable_tiers(policy.small) == [policy.large, policy.small]
+    assert policy.reusable_tiers(policy.large) == [policy.large]
+    assert policy.reusable_tiers(policy.rules) == []
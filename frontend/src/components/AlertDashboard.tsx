@@ -47,7 +47,7 @@ const AlertDashboard: React.FC<AlertDashboardProps> = ({ onPrefill }) => {
   useEffect(() => {
     const fetchAlerts = async () => {
       try {
-        const response = await fetch('https://u3jq640fv3.execute-api.us-east-1.amazonaws.com/api/alerts');
+        const response = await fetch('https://u3jq640fv3.execute-api.us-east-1.amazonaws.com/api/alerts?fields=timestamp,alert_type,priority,message,source_ip,destination_ip,protocol');
         if (!response.ok) {
           throw new Error(`API error: ${response.status}`);
         }